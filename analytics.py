@@ -0,0 +1,70 @@
+import os
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+
+from frame_cache import FrameCache
+
+
+@st.cache_resource
+def get_analytics_cache():
+    # Агрегаты по ключу (uid, вид, фильтры) — десятки-сотни строк на запись
+    return FrameCache(
+        max_bytes=int(os.getenv("ANALYTICS_CACHE_MB", "32")) * 1024 * 1024,
+        ttl=int(os.getenv("PURCHASES_CACHE_TTL", "600")),
+    )
+
+
+def _period(date_from, date_to):
+    # Итоги помесячные: период расширяется до целых месяцев
+    clauses, params = [], {}
+    if date_from:
+        clauses.append("AND month >= :date_from")
+        params["date_from"] = date_from.replace(day=1)
+    if date_to:
+        clauses.append("AND month <= :date_to")
+        params["date_to"] = date_to
+    return " ".join(clauses), params
+
+
+def _aggregate(conn, uid, group_by, date_from=None, date_to=None, category=None):
+    period, params = _period(date_from, date_to)
+    if category is not None:
+        period += " AND category = :category"
+        params["category"] = category
+    select = ", ".join(group_by)
+    df = pd.read_sql(
+        text(f"""
+            SELECT {select},
+                   sum(total)     AS total,
+                   sum(purchases) AS purchases
+            FROM purchase_monthly
+            WHERE user_id = :uid {period}
+            GROUP BY {select}
+            ORDER BY {select}
+        """),
+        conn,
+        params={"uid": uid, **params},
+    )
+    if 'month' in df:
+        df['month'] = pd.to_datetime(df['month'])
+    df['total'] = df['total'].astype('float64')
+    return df
+
+
+def load_aggregate(engine, uid, group_by, date_from=None, date_to=None, category=None):
+    """Суммы и число покупок по group_by (month/category/subcategory).
+
+    Читает помесячные итоги purchase_monthly (rollups.py) — сотни строк
+    независимо от длины истории; результат кэшируется на пользователя и фильтр.
+    category сужает выборку до одной категории (drill-down).
+    """
+    group_by = tuple(group_by)
+    key = (uid, 'aggregate', group_by, date_from, date_to, category)
+    cache = get_analytics_cache()
+    df = cache.get(key)
+    if df is None:
+        with engine.connect() as conn:
+            df = cache.put(key, _aggregate(conn, uid, group_by, date_from, date_to, category))
+    return df
@@ -1,23 +1,19 @@
 import streamlit as st
-from itsdangerous import URLSafeSerializer, BadSignature
-import os
+from itsdangerous import BadSignature, SignatureExpired
 from dotenv import load_dotenv
 from streamlit.components.v1 import html, iframe as components_iframe
-import pandas as pd
-from sqlalchemy import create_engine, text
-import locale
 import warnings
 import logging
-#import page_main, page_detail
-
-#main = st.Page(page_main.app, title="Главная")
-#detail = st.Page(page_detail.app, title="Детальная", icon="🔍")
-#current = st.navigation([main, detail])
-#current.run()
+import metrics
+from auth import session_uid
+# Всё тяжёлое (pandas, pyarrow, SQLAlchemy, Altair) — в модулях страниц ниже
 
 
 load_dotenv()
 
+# Замер стадий перезапуска (выборка METRICS_SAMPLE, панель — ?debug=1), см. metrics.py
+rerun = metrics.start_rerun('app', force=metrics.debug_requested(st.query_params))
+
 # Убираем меню, хедер и футер через CSS
 st.markdown(
     """
@@ -63,8 +59,6 @@ st.markdown(
 logging.getLogger("streamlit").setLevel(logging.ERROR)
 
 
-serializer = URLSafeSerializer(os.getenv("FNS_TOKEN", ""), salt="uid-salt")
-
 html("""
 <script>
   window.addEventListener('message', e => {
@@ -76,146 +70,50 @@ html("""
 
 components_iframe(src="https://ai5.space", height=60, scrolling=True)
 
-query_params = st.experimental_get_query_params()
-token = query_params.get("auth", [None])[0] or st.session_state.get("auth_token")
+with metrics.stage('auth'):
+    # Токен из ?auth=... или уже сохранённый в сессии — тогда без JS-запроса
+    token = st.query_params.get("auth") or st.session_state.get("auth_token")
+
+    if not token:
+        try:
+            from streamlit_javascript import st_javascript
+            token_js = st_javascript("window.authToken")
+        except ImportError:
+            token_js = None
+
+        if token_js:
+            # Используем токен в этом же прогоне, без лишнего st.rerun()
+            token = token_js
+        else:
+            st.info("Пожалуйста, выполните логин в iframe выше.")
+            st.stop()
 
-if not token:
     try:
-        from streamlit_javascript import st_javascript
-        token_js = st_javascript("window.authToken")
-    except ImportError:
-        token_js = None
-
-    if token_js:
-        st.session_state.auth_token = token_js
-        st.experimental_rerun()
-    else:
-        st.info("Пожалуйста, выполните логин в iframe выше.")
+        uid = session_uid(token)  # подпись проверяется один раз на сессию, см. auth.py
+    except SignatureExpired:
+        st.error("Срок действия токена истёк, выполните вход заново")
+        st.stop()
+    except BadSignature:
+        st.error("Некорректный или просроченный токен")
         st.stop()
 
-try:
-    uid = serializer.loads(token)
-except BadSignature:
-    st.error("Некорректный или просроченный токен")
-    st.stop()
-
+st.session_state.auth_token = token
 st.session_state["uid"] = uid
 #st.success(f"✅ Logged in as user: {uid}")
 
-# ─── Подключение к БД и локаль ────────────────────────────────────────────────
-engine = create_engine(os.getenv("DATABASE_URL"))
-
-try:
-    locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
-except locale.Error:
-    pass  # если локаль недоступна
-
-# ─── Загрузка данных и подготовка для редактирования ──────────────────────────
-df = pd.read_sql(
-    text("""
-        SELECT id,
-               category,
-               subcategory,
-               price,
-               ts
-        FROM purchases
-        WHERE user_id = :uid
-    """),
-    engine,
-    params={"uid": uid}
-)
-
-# Конвертация и локальное форматирование даты
-df['ts'] = pd.to_datetime(df['ts'], errors='coerce')
-df['Дата'] = df['ts'].dt.strftime('%d.%m.%Y')
-
-# Оставляем только видимые пользователю столбцы
-df = df[['id', 'category', 'subcategory', 'price', 'Дата']]
-df.columns = ['id', 'Категория', 'Подкатегория', 'Цена', 'Дата']
-
-# Сохраняем оригинал в сессии для диффа
-if 'orig_df' not in st.session_state:
-    st.session_state.orig_df = df.copy()
-
-st.write("Отредактируйте любое поле и нажмите 📥 под таблицей")
-edited = st.data_editor(
-    df.drop(columns=['id']),               # id скрываем, но он в orig_df
-    use_container_width=True,
-    key='data_editor'
-)
-# Привяжем id обратно к отредактированному df
-edited['id'] = st.session_state.orig_df['id']
-
-# ─── Сохранение изменений в БД (диффовый алгоритм) ───────────────────────────
-if st.button("📥 Сохранить изменения"):
-    # Подготовка новых и оригинальных табличек
-    new = edited.rename(columns={
-        "Категория": "category",
-        "Подкатегория": "subcategory",
-        "Цена": "price",
-        "Дата": "ts"
-    }).copy()
-    new['ts'] = pd.to_datetime(new['ts'], format='%d %B %Y', errors='coerce')
-    new['user_id'] = uid
-
-    orig = st.session_state.orig_df.rename(columns={
-        "Категория": "category",
-        "Подкатегория": "subcategory",
-        "Цена": "price",
-        "Дата": "ts"
-    }).copy()
-    orig['ts'] = pd.to_datetime(orig['ts'], format='%d %B %Y', errors='coerce')
-    orig['user_id'] = uid
-
-    key = ['id']
-
-    # 1) Новые строки (id == NaN или не в orig)
-    new_rows = new[~new['id'].isin(orig['id'])]
-    # 2) Удалённые (были в orig, нет в new)
-    deleted_ids = orig.loc[~orig['id'].isin(new['id']), 'id'].tolist()
-    # 3) Изменённые: общие id, но есть расхождения
-    common_ids = set(orig['id']).intersection(new['id'])
-    diffs = []
-    for idx in common_ids:
-        o = orig.set_index('id').loc[idx]
-        n = new.set_index('id').loc[idx]
-        if not o[['category','subcategory','price','ts']].equals(n[['category','subcategory','price','ts']]):
-            diffs.append(idx)
-    updated_rows = new.set_index('id').loc[diffs].reset_index()
-
-    # Запись в БД
-    with engine.begin() as conn:
-        # удаляем
-        if deleted_ids:
-            conn.execute(
-                text("DELETE FROM purchases WHERE id = ANY(:ids)"),
-                {"ids": deleted_ids}
-            )
-        # обновляем
-        for _, row in updated_rows.iterrows():
-            conn.execute(
-                text("""
-                    UPDATE purchases
-                       SET category    = :category,
-                           subcategory = :subcategory,
-                           price       = :price,
-                           ts          = :ts
-                     WHERE id = :id
-                """),
-                {
-                    "category": row["category"],
-                    "subcategory": row["subcategory"],
-                    "price": row["price"],
-                    "ts": row["ts"],
-                    "id": row["id"],
-                }
-            )
-        # вставляем новые
-        if not new_rows.empty:
-            new_rows.drop(columns=['id']).to_sql(
-                "purchases", conn, if_exists="append", index=False
-            )
-
-    st.success("✅ Изменения успешно применены в базе!")
-    # Обновляем orig_df
-    st.session_state.orig_df = edited.copy()
+# ─── Страницы ─────────────────────────────────────────────────────────────────
+# Страница выполняется только при показе: её модули (pandas, SQLAlchemy, а для
+# «Детальной» — Altair) импортируются после проверки токена, при первом заходе
+page = st.navigation([
+    st.Page("page_main.py", title="Покупки", icon="🧾", default=True),
+    st.Page("page_detail.py", title="Детальная", icon="🔍", url_path="detail"),
+    st.Page("page_import.py", title="Импорт из файла", icon="📤", url_path="import"),
+])
+page.run()
+
+# ─── Итоги замера перезапуска ────────────────────────────────────────────────
+if rerun is not None and metrics.debug_requested(st.query_params):
+    from db import get_engine
+
+    metrics.debug_panel(rerun, get_engine())
+metrics.finish_rerun()
@@ -0,0 +1,152 @@
+"""Результат запроса сразу в pyarrow.Table: ADBC, connectorx или курсор SQLAlchemy.
+
+ARROW_LOADER выбирает способ: auto (по умолчанию), adbc, connectorx или
+sqlalchemy. В auto для PostgreSQL берётся первый установленный из
+adbc-driver-postgresql и connectorx, иначе — курсор SQLAlchemy: строки
+DBAPI сразу в массивы Arrow, без кадра pandas с object-колонками.
+
+ADBC и connectorx читают своим соединением (не из пула SQLAlchemy) и вне
+транзакции conn: не используйте их там, где нужно видеть свои незакоммиченные
+записи. Параметры подставляются в SQL литералами через компилятор диалекта.
+Такие запросы не видят события SQLAlchemy: их не считает metrics и не
+перехватывает bench.explain_plans (он включает sqlalchemy).
+
+Своих соединений ADBC и connectorx одновременно открыто не больше
+ARROW_POOL_SIZE на процесс (по умолчанию 2): загрузка сверх этого ждёт
+свободного места до DB_POOL_TIMEOUT секунд. Это отдельная от пула SQLAlchemy
+статья бюджета соединений (deploy/dash@.service): на время чтения страница
+держит и соединение пула, через которое читается словарь категорий.
+Соединения ADBC после запроса остаются открытыми для следующих: Streamlit
+выполняет каждое взаимодействие в новом потоке, и соединения «на поток»
+открывались бы заново и не закрывались.
+"""
+import atexit
+import importlib.util
+import os
+import threading
+from contextlib import contextmanager
+
+import pyarrow as pa
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+
+LOADERS = ('adbc', 'connectorx', 'sqlalchemy')
+CHUNK_ROWS = 50_000
+_MODULES = {'adbc': 'adbc_driver_postgresql', 'connectorx': 'connectorx'}
+
+ARROW_POOL_SIZE = int(os.getenv("ARROW_POOL_SIZE") or 2)
+ARROW_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT") or 30)
+
+_own_slots = threading.BoundedSemaphore(ARROW_POOL_SIZE)
+_adbc_lock = threading.Lock()
+_adbc_idle = {}  # URL -> простаивающие соединения ADBC
+
+
+def available(name):
+    return name == 'sqlalchemy' or importlib.util.find_spec(_MODULES[name]) is not None
+
+
+def loader_for(conn):
+    """Способ загрузки для соединения с учётом ARROW_LOADER и установленных пакетов."""
+    name = os.getenv("ARROW_LOADER", "auto").strip().lower()
+    if name == 'auto':
+        if conn.dialect.name != 'postgresql':
+            return 'sqlalchemy'
+        return next(n for n in LOADERS if available(n))
+    if name not in LOADERS:
+        raise ValueError(f"Неизвестный ARROW_LOADER: {name}")
+    if name != 'sqlalchemy' and conn.dialect.name != 'postgresql':
+        raise ValueError(f"ARROW_LOADER={name} работает только с PostgreSQL")
+    return name
+
+
+def _libpq_url(conn):
+    # postgresql+psycopg2://... -> postgresql://..., пароль — как есть
+    return conn.engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+
+
+def _literal_sql(conn, stmt, params):
+    if params:
+        stmt = stmt.bindparams(**params)
+    return str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+
+
+@contextmanager
+def _own_slot():
+    """Место под своё соединение ADBC или connectorx (не больше ARROW_POOL_SIZE)."""
+    if not _own_slots.acquire(timeout=ARROW_POOL_TIMEOUT):
+        raise PoolTimeout(f"Нет свободного соединения для загрузки Arrow за {ARROW_POOL_TIMEOUT} с "
+                          f"(ARROW_POOL_SIZE={ARROW_POOL_SIZE})")
+    try:
+        yield
+    finally:
+        _own_slots.release()
+
+
+@contextmanager
+def _adbc_connection(url):
+    """Соединение ADBC из пула; после запроса возвращается в пул.
+
+    Новое открывается, только когда простаивающих нет, поэтому открытых (занятых
+    и простаивающих) не больше мест _own_slot.
+    """
+    import adbc_driver_postgresql.dbapi
+
+    with _own_slot():
+        with _adbc_lock:
+            idle = _adbc_idle.get(url)
+            connection = idle.pop() if idle else None
+        if connection is None:
+            connection = adbc_driver_postgresql.dbapi.connect(url, autocommit=True)
+        try:
+            yield connection
+        except Exception:
+            # Соединение могло оборваться — в пул его не возвращаем
+            connection.close()
+            raise
+        with _adbc_lock:
+            _adbc_idle.setdefault(url, []).append(connection)
+
+
+@atexit.register
+def _close_adbc():
+    with _adbc_lock:
+        connections = [c for idle in _adbc_idle.values() for c in idle]
+        _adbc_idle.clear()
+    for connection in connections:
+        connection.close()
+
+
+def _read_adbc(conn, stmt, params):
+    with _adbc_connection(_libpq_url(conn)) as connection, connection.cursor() as cur:
+        cur.execute(_literal_sql(conn, stmt, params))
+        return cur.fetch_arrow_table()
+
+
+def _read_connectorx(conn, stmt, params):
+    import connectorx
+
+    with _own_slot():
+        result = connectorx.read_sql(_libpq_url(conn), _literal_sql(conn, stmt, params), return_type='arrow')
+    return result if isinstance(result, pa.Table) else pa.table(result)
+
+
+def _read_sqlalchemy(conn, stmt, params):
+    # Пачками: объекты Python живут только для CHUNK_ROWS строк, дальше — Arrow.
+    # Типы выводятся по пачке; permissive сводит, например, null-пачку со строковой
+    result = conn.execute(stmt, params or {})
+    names = list(result.keys())
+    chunks = [
+        pa.table({name: pa.array(values) for name, values in zip(names, zip(*rows))})
+        for rows in result.partitions(CHUNK_ROWS)
+    ]
+    if not chunks:
+        return pa.table({name: pa.array([], pa.null()) for name in names})
+    return pa.concat_tables(chunks, promote_options='permissive')
+
+
+_READERS = {'adbc': _read_adbc, 'connectorx': _read_connectorx, 'sqlalchemy': _read_sqlalchemy}
+
+
+def read_arrow(conn, stmt, params=None):
+    """pyarrow.Table с результатом text()-запроса stmt."""
+    return _READERS[loader_for(conn)](conn, stmt, params)
@@ -0,0 +1,59 @@
+import os
+import time
+
+import streamlit as st
+from itsdangerous import BadSignature, SignatureExpired, URLSafeSerializer, URLSafeTimedSerializer
+
+SALT = "uid-salt"
+
+
+def _max_age():
+    return int(os.getenv("AUTH_TOKEN_MAX_AGE", str(7 * 24 * 3600)))
+
+
+def _allow_legacy():
+    # Старые токены без метки времени (URLSafeSerializer) — пока ai5.space их выдаёт
+    return os.getenv("AUTH_ALLOW_LEGACY", "1").strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+@st.cache_resource
+def _serializers():
+    secret = os.getenv("FNS_TOKEN", "")
+    return URLSafeTimedSerializer(secret, salt=SALT), URLSafeSerializer(secret, salt=SALT)
+
+
+def issue_token(uid):
+    """Токен с меткой времени (TimestampSigner) для uid."""
+    timed, _ = _serializers()
+    return timed.dumps(uid)
+
+
+def verify_token(token):
+    """(uid, expires_at) по токену; expires_at=None у бессрочных старых токенов.
+
+    Бросает SignatureExpired для просроченных и BadSignature для чужих токенов.
+    """
+    timed, legacy = _serializers()
+    try:
+        uid, signed_at = timed.loads(token, max_age=_max_age(), return_timestamp=True)
+    except SignatureExpired:
+        raise
+    except BadSignature:
+        if not _allow_legacy():
+            raise
+        return legacy.loads(token), None
+    return uid, signed_at.timestamp() + _max_age()
+
+
+def session_uid(token):
+    """uid для токена; проверка подписи — один раз на сессию и токен.
+
+    Результат запоминается в st.session_state до истечения срока токена.
+    """
+    cached = st.session_state.get("auth")
+    if cached and cached["token"] == token and (cached["expires_at"] is None or cached["expires_at"] > time.time()):
+        return cached["uid"]
+    st.session_state.pop("auth", None)
+    uid, expires_at = verify_token(token)
+    st.session_state.auth = {"token": token, "uid": uid, "expires_at": expires_at}
+    return uid
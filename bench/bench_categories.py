@@ -0,0 +1,160 @@
+"""Категории текстом в purchases против кодов словаря purchase_categories.
+
+Одни и те же покупки лежат в двух таблицах: purchases — с category_id, как
+после migrations/0006 (bench.synthetic.create_purchases), и purchases_text —
+прежняя схема с category/subcategory текстом и индексом 0003. Для каждой
+печатается:
+  table, index — размер таблицы и её индексов (PostgreSQL; в SQLite — n/a);
+  group by     — итоги по парам категорий одного пользователя, как в
+                 rollups.rebuild: по тексту против по коду с подписями из
+                 словаря уже к группам;
+  snapshot     — снимок пользователя до компактного кадра: текст ->
+                 dictionary_encode против кодов -> categories.decode_table
+                 (словарь — из кэша, как в работающем воркере);
+  encode       — перевод подписей правок (1% строк) в коды,
+                 categories.encode_frame (у текста перевода нет).
+
+По умолчанию — временная SQLite; для PostgreSQL задайте BENCH_DATABASE_URL.
+Таблицы purchases и purchases_text в этой базе пересоздаются.
+
+Запуск из корня репозитория:
+    python -m bench.bench_categories [--sizes 100000 1000000]
+"""
+import argparse
+import time
+
+from sqlalchemy import text
+
+from arrow_load import read_arrow
+from bench.synthetic import bench_engine, create_purchases, make_purchases
+from categories import decode_table, encode_frame
+from schema import purchases_from_arrow
+
+UID = 1
+REPEAT = 3
+TEXT_TABLE = 'purchases_text'
+
+GROUP_BY = {
+    'text': f"""
+        SELECT COALESCE(category, ''), COALESCE(subcategory, ''), sum(price), count(*)
+        FROM {TEXT_TABLE}
+        WHERE user_id = :uid
+        GROUP BY 1, 2
+    """,
+    'codes': """
+        SELECT COALESCE(c.category, ''), COALESCE(c.subcategory, ''), g.total, g.purchases
+        FROM (SELECT category_id, sum(price) AS total, count(*) AS purchases
+                FROM purchases
+               WHERE user_id = :uid
+               GROUP BY 1) AS g
+        LEFT JOIN purchase_categories AS c ON c.id = g.category_id
+    """,
+}
+
+SNAPSHOT = """
+    SELECT id, {columns}, CAST(price AS DOUBLE PRECISION) AS price, ts, version
+    FROM {table}
+    WHERE user_id = :uid
+    ORDER BY id
+"""
+
+
+def best_of(fn, repeat=REPEAT):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def create_text_table(engine, df):
+    """purchases_text в схеме до 0006: подписи текстом в строке и в индексе."""
+    postgres = engine.dialect.name == 'postgresql'
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TEXT_TABLE}"))
+        conn.execute(text(f"""
+            CREATE TABLE {TEXT_TABLE} (
+                id          BIGINT PRIMARY KEY,
+                user_id     BIGINT NOT NULL,
+                category    TEXT,
+                subcategory TEXT,
+                price       NUMERIC,
+                ts          TIMESTAMP,
+                version     BIGINT NOT NULL DEFAULT 1
+            )
+        """))
+        include = " INCLUDE (category, subcategory, price, version)" if postgres else ""
+        conn.execute(text(f"CREATE INDEX {TEXT_TABLE}_user_ts_idx ON {TEXT_TABLE} (user_id, ts, id){include}"))
+        df.to_sql(TEXT_TABLE, conn, if_exists='append', index=False, chunksize=50_000)
+
+
+def vacuum(engine):
+    # Свежая visibility map: оба варианта читаются index-only scan
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in (TEXT_TABLE, 'purchases', 'purchase_categories'):
+            conn.execute(text(f"VACUUM ANALYZE {table}"))
+
+
+def relation_sizes(conn, table):
+    """(таблица, индексы) в байтах; None вне PostgreSQL."""
+    if conn.dialect.name != 'postgresql':
+        return None, None
+    return tuple(conn.execute(text("SELECT pg_table_size(:t), pg_indexes_size(:t)"), {"t": table}).one())
+
+
+def snapshot(conn, storage):
+    if storage == 'text':
+        table = read_arrow(conn, text(SNAPSHOT.format(columns="category, subcategory", table=TEXT_TABLE)),
+                           {"uid": UID})
+        return purchases_from_arrow(table)
+    table = read_arrow(conn, text(SNAPSHOT.format(columns="category_id", table='purchases')), {"uid": UID})
+    return purchases_from_arrow(decode_table(conn, UID, table))
+
+
+def measure(engine, n):
+    df = make_purchases(n, uid=UID)
+    create_purchases(engine, df)
+    create_text_table(engine, df)
+    vacuum(engine)
+    edits = make_purchases(max(1, n // 100), seed=3, uid=UID).drop(columns=['id', 'version'])
+    rows = {}
+    with engine.connect() as conn:
+        snapshot(conn, 'codes')  # прогрев: словарь пользователя в кэше
+        for storage, table in (('text', TEXT_TABLE), ('codes', 'purchases')):
+            table_bytes, index_bytes = relation_sizes(conn, table)
+            _, group_s = best_of(lambda: conn.execute(text(GROUP_BY[storage]), {"uid": UID}).all())
+            _, snapshot_s = best_of(lambda: snapshot(conn, storage))
+            encode_s = best_of(lambda: encode_frame(conn, UID, edits))[1] if storage == 'codes' else None
+            rows[storage] = (table_bytes, index_bytes, group_s, snapshot_s, encode_s)
+        conn.rollback()
+    return rows
+
+
+def _mib(value):
+    return f"{value / 2**20:.1f}" if value is not None else "n/a"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_categories", description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args(argv)
+
+    engine = bench_engine()
+    print(f"backend: {engine.dialect.name}")
+    print(f"{'rows':>9} {'storage':<7} {'table, MiB':>11} {'index, MiB':>11} {'group by, ms':>13} "
+          f"{'snapshot, ms':>13} {'encode, ms':>11}")
+    for n in args.sizes:
+        for storage, (table_b, index_b, group_s, snapshot_s, encode_s) in measure(engine, n).items():
+            encode = f"{encode_s * 1000:.2f}" if encode_s is not None else "-"
+            print(f"{n:>9,} {storage:<7} {_mib(table_b):>11} {_mib(index_b):>11} {group_s * 1000:>13.1f} "
+                  f"{snapshot_s * 1000:>13.1f} {encode:>11}")
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TEXT_TABLE}"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Бенчмарк диффа для кнопки «Сохранить изменения».
+
+Запуск из корня репозитория:  python -m bench.bench_changeset
+"""
+import sys
+import time
+
+from changeset import COMPARE_COLUMNS, compute_changeset
+from bench.synthetic import edit_purchases, make_purchases
+
+SIZES = [1_000, 100_000, 1_000_000]
+LEGACY_LIMIT = 10_000  # старый цикл дальше не дождаться
+
+
+def legacy_diff(orig, new):
+    # Прежний алгоритм из app.py: set_index на каждой итерации
+    common_ids = set(orig['id']).intersection(new['id'])
+    diffs = []
+    for idx in common_ids:
+        o = orig.set_index('id').loc[idx]
+        n = new.set_index('id').loc[idx]
+        if not o[COMPARE_COLUMNS].equals(n[COMPARE_COLUMNS]):
+            diffs.append(idx)
+    return diffs
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(sizes=SIZES):
+    print(f"{'rows':>10} {'changeset, s':>14} {'legacy, s':>12} {'upd':>7} {'del':>7} {'ins':>7}")
+    for n in sizes:
+        orig = make_purchases(n)
+        new = edit_purchases(orig)
+        changes, elapsed = timed(compute_changeset, orig, new)
+        legacy = '-'
+        if n <= LEGACY_LIMIT:
+            _, legacy_elapsed = timed(legacy_diff, orig, new)
+            legacy = f'{legacy_elapsed:.3f}'
+        print(f'{n:>10} {elapsed:>14.3f} {legacy:>12} {len(changes.updates):>7} '
+              f'{len(changes.deletes):>7} {len(changes.inserts):>7}')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
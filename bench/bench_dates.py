@@ -0,0 +1,42 @@
+"""Форматирование и разбор колонки «Дата»: strftime/to_datetime против datecodec.
+
+Запуск из корня репозитория:  python -m bench.bench_dates [rows]
+"""
+import sys
+import time
+
+import pandas as pd
+
+from bench.synthetic import make_purchases
+from datecodec import format_dates, parse_dates
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main(rows=1_000_000):
+    ts = make_purchases(rows)['ts']
+    print(f"rows={rows:,}")
+
+    _, strftime_s = timed(ts.dt.strftime, '%d.%m.%Y')
+    short, codec_s = timed(format_dates, ts)
+    print(f"format short: strftime {strftime_s:7.3f} s   datecodec {codec_s:7.3f} s")
+
+    _, strftime_l = timed(ts.dt.strftime, '%-d %B %Y')
+    long, codec_l = timed(format_dates, ts, 'long')
+    print(f"format long:  strftime {strftime_l:7.3f} s   datecodec {codec_l:7.3f} s")
+
+    _, to_dt = timed(pd.to_datetime, short, format='%d.%m.%Y', errors='coerce')
+    parsed, codec_p = timed(parse_dates, short)
+    print(f"parse short:  to_datetime {to_dt:7.3f} s   datecodec {codec_p:7.3f} s")
+
+    parsed_long, codec_pl = timed(parse_dates, long)
+    print(f"parse long:   to_datetime      n/a   datecodec {codec_pl:7.3f} s")
+    assert parsed.equals(parsed_long) and (parsed == ts.dt.normalize()).all()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,125 @@
+"""Микробенчмарки горячих путей редактора: загрузка, дифф, сохранение.
+
+На синтетических покупках от 1k до 1M строк меряются:
+  page        — первая страница редактора (pagination.fetch_page, 500 строк);
+  page_last   — последняя страница: OFFSET через всю историю;
+  count       — число строк для списка страниц (pagination.count_rows);
+  diff        — to_editor -> from_editor -> compute_changeset для 1% правок
+                первой страницы (не меньше одной правки каждого вида);
+  save        — apply_changeset_with_rollups этих правок одной транзакцией.
+
+По умолчанию — временная SQLite; для PostgreSQL задайте BENCH_DATABASE_URL.
+Результаты можно сохранить (--json) и сравнить с прошлым прогоном
+(--baseline): медленнее базы больше чем на --tolerance (и на 5 мс) — код
+возврата 1.
+
+Запуск из корня репозитория:
+    python -m bench.bench_hotpaths [--sizes 1000 100000] [--json out.json] [--baseline base.json]
+"""
+import argparse
+import json
+import sys
+import time
+
+from bench.synthetic import (bench_engine, create_purchase_monthly, create_purchases,
+                             edit_purchases, make_purchases)
+from changeset import compute_changeset
+from editor_view import from_editor, to_editor
+from pagination import PageQuery, count_rows, fetch_page
+from rollups import apply_changeset_with_rollups
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+STAGES = ['page', 'page_last', 'count', 'diff', 'save']
+UID = 1
+REPEAT = 3  # берём лучший из повторов для чтений (запись — один раз)
+
+
+def best_of(fn, repeat=REPEAT):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def run_size(engine, n):
+    create_purchases(engine, make_purchases(n, uid=UID))
+    create_purchase_monthly(engine)
+    timings = {}
+
+    query = PageQuery()
+    with engine.connect() as conn:
+        orig, timings['page'] = best_of(lambda: fetch_page(conn, UID, query))
+        last = PageQuery(page=(n - 1) // query.page_size)
+        _, timings['page_last'] = best_of(lambda: fetch_page(conn, UID, last))
+        _, timings['count'] = best_of(lambda: count_rows(conn, UID, query))
+
+    # Правки как из редактора: тот же кадр, 1% изменено, удалено и добавлено
+    edited = to_editor(edit_purchases(orig.drop(columns=['version']).assign(user_id=UID), frac=0.01))
+
+    def diff():
+        return compute_changeset(orig, from_editor(edited, orig, UID))
+
+    changes, timings['diff'] = best_of(diff)
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conflicts = apply_changeset_with_rollups(conn, UID, changes)
+    timings['save'] = time.perf_counter() - start
+    assert not conflicts, conflicts
+    return timings, len(changes)
+
+
+def compare(results, baseline, tolerance, min_delta=0.005):
+    """Строки 'size stage: было -> стало' для замедлений больше tolerance.
+
+    Разница меньше min_delta секунд — шум таймера, не регрессия.
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, seconds in stages.items():
+            before = baseline.get(size, {}).get(stage)
+            if before and seconds > before * (1 + tolerance) and seconds - before > min_delta:
+                regressions.append(f"{size:>8} {stage:<10}: {before:.4f} -> {seconds:.4f} s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_hotpaths", description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    parser.add_argument("--baseline", help="сравнить с сохранёнными результатами")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое замедление (доля)")
+    args = parser.parse_args(argv)
+
+    engine = bench_engine()
+    print(f"backend: {engine.dialect.name}")
+    print(f"{'rows':>8} {'changes':>8} " + ' '.join(f'{stage + ", s":>12}' for stage in STAGES))
+    results = {}
+    for n in args.sizes:
+        timings, changes = run_size(engine, n)
+        results[str(n)] = timings
+        print(f'{n:>8} {changes:>8} ' + ' '.join(f'{timings[stage]:>12.4f}' for stage in STAGES))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'backend': engine.dialect.name, 'results': results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('backend') != engine.dialect.name:
+            print(f"\nбаза снята на {baseline.get('backend')}, сравнение пропущено")
+            return 0
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"\nЗамедление больше {args.tolerance:.0%}:")
+            print('\n'.join(regressions))
+            return 1
+        print(f"\nрегрессий нет (допуск {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Скорость импорта выгрузки (importer.import_purchases): строк в секунду.
+
+Файл — CSV как у банка: «;», дата со временем, сумма с пробелами и запятой.
+Второй прогон того же файла проверяет отсев дублей (поиск по индексу
+user_id, ts). По умолчанию — временная SQLite; для PostgreSQL задайте
+BENCH_DATABASE_URL.
+
+Запуск из корня репозитория:  python -m bench.bench_import [rows ...]
+"""
+import io
+import sys
+
+import pandas as pd
+
+from bench.synthetic import bench_engine, create_purchase_monthly, create_purchases, make_purchases
+from importer import import_purchases
+
+SIZES = [10_000, 100_000]
+UID = 1
+
+
+def bank_csv(n):
+    src = make_purchases(n, seed=5)
+    df = pd.DataFrame({
+        'Дата операции': src['ts'].dt.strftime('%d.%m.%Y %H:%M:%S'),
+        'Категория': src['category'],
+        'Описание': src['subcategory'],
+        'Сумма': src['price'].map(lambda p: f'{p:,.2f}'.replace(',', ' ').replace('.', ',')),
+    })
+    return df.to_csv(sep=';', index=False).encode('utf-8-sig')
+
+
+def main(sizes=SIZES):
+    engine = bench_engine()
+    print(f"backend: {engine.dialect.name}")
+    print(f"{'rows':>8} {'first, s':>9} {'rows/s':>10} {'again, s':>9} {'skipped':>8}")
+    for n in sizes:
+        create_purchases(engine)
+        create_purchase_monthly(engine)
+        data = bank_csv(n)
+        first = import_purchases(engine, UID, io.BytesIO(data), 'bank.csv')
+        again = import_purchases(engine, UID, io.BytesIO(data), 'bank.csv')
+        print(f'{n:>8} {first.seconds:>9.2f} {first.rows_per_second:>10,.0f} '
+              f'{again.seconds:>9.2f} {again.duplicates:>8}')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
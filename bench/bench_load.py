@@ -0,0 +1,174 @@
+"""Загрузка purchases: прежний pd.read_sql против Arrow-загрузчика (arrow_load).
+
+Для каждого размера и способа меряется загрузка всей истории пользователя
+до компактного кадра (запрос страницы без окна LIMIT) — лучшее время из
+повторов и пик памяти процесса сверх уже загруженных модулей, а также
+страница редактора: выборка 500 строк (pagination.fetch_page) и её передача
+в редактор — to_editor и перевод в Arrow, как это делает Streamlit.
+
+Способы: read_sql — прежний путь (object-строки -> compact_purchases,
+object-колонки в редакторе); sqlalchemy, adbc, connectorx — arrow_load с
+соответствующим ARROW_LOADER (adbc и connectorx — если установлены и база
+PostgreSQL). Каждый способ идёт в отдельном процессе: пик RSS не сбросить.
+
+По умолчанию — временная SQLite; для PostgreSQL задайте BENCH_DATABASE_URL.
+
+Запуск из корня репозитория:
+    python -m bench.bench_load [--sizes 10000 100000 1000000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from bench.load_test import rss_bytes
+from bench.synthetic import bench_engine, create_purchases, make_purchases
+
+UID = 1
+REPEAT = 3
+LOADERS = ['read_sql', 'sqlalchemy', 'adbc', 'connectorx']
+
+
+def peak_rss():
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def best_of(fn, repeat=REPEAT):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+# ─── Прежний путь: pd.read_sql и object-колонки ───────────────────────────────
+def read_sql_history(conn, uid):
+    from schema import compact_purchases
+
+    return compact_purchases(pd.read_sql(text("""
+        SELECT p.id, NULLIF(c.category, '') AS category, NULLIF(c.subcategory, '') AS subcategory,
+               price, ts, version
+        FROM purchases AS p
+        LEFT JOIN purchase_categories AS c ON c.id = p.category_id
+        WHERE p.user_id = :uid
+        ORDER BY p.id
+    """), conn, params={"uid": uid}))
+
+
+def read_sql_page(conn, uid):
+    from schema import compact_purchases
+
+    return compact_purchases(pd.read_sql(text("""
+        SELECT p.id, NULLIF(c.category, '') AS category, NULLIF(c.subcategory, '') AS subcategory,
+               price, ts, version
+        FROM purchases AS p
+        LEFT JOIN purchase_categories AS c ON c.id = p.category_id
+        WHERE p.user_id = :uid
+        ORDER BY ts DESC, p.id DESC
+        LIMIT 500
+    """), conn, params={"uid": uid}))
+
+
+def object_editor(frame):
+    # Прежний to_editor: категории и «Дата» — object-колонки Python-строк
+    from datecodec import format_dates
+    from editor_view import EDITOR_COLUMNS
+
+    view = frame[['id', *EDITOR_COLUMNS]].astype({'category': object, 'subcategory': object})
+    view = view.assign(ts=format_dates(frame['ts']).astype(object))
+    return view.rename(columns=EDITOR_COLUMNS)
+
+
+def arrow_history(conn, uid):
+    # Вся история через arrow_load: коды категорий -> словарные колонки, как у страницы
+    from arrow_load import read_arrow
+    from categories import decode_table
+    from schema import purchases_from_arrow
+
+    table = read_arrow(conn, text("""
+        SELECT id, category_id, CAST(price AS DOUBLE PRECISION) AS price, ts, version
+        FROM purchases
+        WHERE user_id = :uid
+        ORDER BY id
+    """), {"uid": uid})
+    return purchases_from_arrow(decode_table(conn, uid, table))
+
+
+# ─── Замер одного способа (в дочернем процессе) ──────────────────────────────
+def measure(url, loader):
+    from streamlit import dataframe_util
+
+    from editor_view import to_editor
+    from pagination import PageQuery, fetch_page
+
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        if loader == 'read_sql':
+            history = lambda: read_sql_history(conn, UID)
+            page = lambda: read_sql_page(conn, UID)
+            editor = object_editor
+        else:
+            os.environ['ARROW_LOADER'] = loader
+            history = lambda: arrow_history(conn, UID)
+            page = lambda: fetch_page(conn, UID, PageQuery())
+            editor = to_editor
+        page()  # прогрев: соединение ADBC, импорт драйвера
+        base = rss_bytes()
+        frame, full = best_of(history)
+        peak = peak_rss()
+        rows = len(frame)
+        del frame
+        page_df, page_s = best_of(page)
+        _, editor_s = best_of(lambda: dataframe_util.convert_pandas_df_to_arrow_bytes(
+            editor(page_df).drop(columns=['id'])))
+    return {'rows': rows, 'full': full, 'peak': max(peak - base, 0), 'page': page_s, 'editor': editor_s}
+
+
+def run_child(url, loader):
+    out = subprocess.run(
+        [sys.executable, '-m', 'bench.bench_load', '--child', loader, '--url', url],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.bench_load", description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--child", choices=LOADERS, help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(args.url, args.child)))
+        return
+
+    from arrow_load import available
+
+    engine = bench_engine()
+    url = engine.url.render_as_string(hide_password=False)
+    postgres = engine.dialect.name == 'postgresql'
+    loaders = [n for n in LOADERS if n in ('read_sql', 'sqlalchemy') or (postgres and available(n))]
+    skipped = [n for n in LOADERS if n not in loaders]
+    print(f"backend: {engine.dialect.name}" + (f"; нет: {', '.join(skipped)}" if skipped else ""))
+    print(f"{'rows':>9} {'loader':<11} {'full, ms':>9} {'peak, MiB':>10} {'page, ms':>9} {'editor, ms':>11}")
+    for n in args.sizes:
+        create_purchases(engine, make_purchases(n, uid=UID))
+        for loader in loaders:
+            r = run_child(url, loader)
+            print(f"{r['rows']:>9,} {loader:<11} {r['full'] * 1000:>9.1f} {r['peak'] / 2**20:>10.1f} "
+                  f"{r['page'] * 1000:>9.1f} {r['editor'] * 1000:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
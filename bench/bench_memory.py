@@ -0,0 +1,77 @@
+"""Память на сессию: прежнее представление purchases против страниц редактора.
+
+Прежде каждая сессия держала всю историю кадром с object-строками, ts и
+строковой «Дата» плюс полную копию в st.session_state.orig_df. Теперь
+страницы (pagination.load_page) лежат в кэше страниц процесса
+(PAGE_CACHE_MB), а сессия держит вид текущей страницы для редактора
+(editor_view) и page_edits: для каждой страницы с несохранёнными правками —
+вид при создании виджета (base) и последнее состояние (edited); orig —
+ссылка на кадр из кэша, без копии.
+
+Запуск из корня репозитория:
+    python -m bench.bench_memory [rows] [sessions] [edited_pages]
+"""
+import sys
+
+from bench.synthetic import bench_engine, create_purchases, make_purchases
+from editor_view import to_editor
+from frame_cache import frame_nbytes
+from pagination import PageQuery, fetch_page
+from schema import memory_report
+
+UID = 1
+
+
+def legacy_session(raw):
+    df = raw[['id', 'category', 'subcategory', 'price', 'ts']].astype(
+        {'category': object, 'subcategory': object})
+    df['Дата'] = df['ts'].dt.strftime('%d.%m.%Y')
+    view = df[['id', 'category', 'subcategory', 'price', 'Дата']]
+    return df, view.copy()  # кадр страницы + orig_df
+
+
+def page_session(pages):
+    """(editor_view, page_edits) сессии, исправившей по ячейке на каждой из pages."""
+    page_edits = {}
+    for query, page in pages.items():
+        base = to_editor(page)
+        edited = base.copy()
+        edited.iloc[0, edited.columns.get_loc('Цена')] += 1
+        page_edits[query] = {'orig': page, 'base': base, 'edited': edited}
+    current = next(iter(page_edits.values()))
+    return current['base'], page_edits
+
+
+def session_nbytes(editor_view, page_edits):
+    # Кадры из кэша страниц (orig) не считаются: они общие для сессий процесса
+    frames = {id(editor_view): editor_view}
+    for entry in page_edits.values():
+        frames.update({id(entry['base']): entry['base'], id(entry['edited']): entry['edited']})
+    return sum(frame_nbytes(frame) for frame in frames.values())
+
+
+def main(rows=100_000, sessions=50, edited_pages=3):
+    raw = make_purchases(rows, uid=UID)
+    df, orig = legacy_session(raw)
+
+    engine = bench_engine()
+    create_purchases(engine, raw)
+    queries = [PageQuery(page=n) for n in range(edited_pages)]
+    with engine.connect() as conn:
+        pages = {query: fetch_page(conn, UID, query) for query in queries}
+    editor_view, page_edits = page_session(pages)
+    first = next(iter(page_edits.values()))
+
+    print(memory_report({'legacy df': df, 'legacy orig_df': orig, 'page': first['orig'],
+                         'editor view': first['base']}).to_string())
+    legacy = frame_nbytes(df) + frame_nbytes(orig)
+    session = session_nbytes(editor_view, page_edits)
+    page = frame_nbytes(first['orig'])
+    print(f"\nrows={rows:,}, sessions={sessions}, страниц с правками на сессию={edited_pages}")
+    print(f"legacy:  {legacy / 2**20:8.2f} MiB на сессию, {legacy * sessions / 2**20:8.1f} MiB всего")
+    print(f"pages:   {session / 2**10:8.1f} KiB на сессию, {session * sessions / 2**20:8.1f} MiB всего "
+          f"(editor_view и page_edits)")
+    print(f"         {page / 2**10:8.1f} KiB на страницу в кэше процесса, не больше PAGE_CACHE_MB")
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,63 @@
+"""Пропускная способность записи Changeset в purchases.
+
+Сравнивает прежний путь (UPDATE на строку + DataFrame.to_sql) с bulk_write.
+По умолчанию — временная SQLite; для PostgreSQL задайте BENCH_DATABASE_URL.
+
+Запуск из корня репозитория:  python -m bench.bench_write [rows ...]
+"""
+import sys
+import time
+
+from sqlalchemy import text
+
+from bench.synthetic import bench_engine, create_purchases, edit_purchases, make_purchases
+from bulk_write import apply_changeset
+from changeset import compute_changeset
+
+SIZES = [1_000, 10_000, 100_000]
+UID = 1
+
+
+def legacy_write(conn, uid, changes):
+    # Прежний путь из app.py
+    if changes.deletes:
+        for chunk_start in range(0, len(changes.deletes), 500):
+            ids = changes.deletes[chunk_start:chunk_start + 500]
+            conn.execute(text(f"DELETE FROM purchases WHERE id IN ({', '.join(map(str, ids))})"))
+    for _, row in changes.updates.iterrows():
+        conn.execute(
+            text("""
+                UPDATE purchases
+                   SET category = :category, subcategory = :subcategory,
+                       price = :price, ts = :ts
+                 WHERE id = :id
+            """),
+            {"category": row["category"], "subcategory": row["subcategory"],
+             "price": row["price"], "ts": row["ts"].to_pydatetime(), "id": int(row["id"])},
+        )
+    if not changes.inserts.empty:
+        changes.inserts.to_sql("purchases", conn, if_exists="append", index=False)
+
+
+def run(engine, writer, orig, changes):
+    create_purchases(engine, orig)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        writer(conn, UID, changes)
+    return time.perf_counter() - start
+
+
+def main(sizes=SIZES):
+    engine = bench_engine()
+    print(f"backend: {engine.dialect.name}")
+    print(f"{'rows':>8} {'changes':>8} {'legacy, s':>10} {'bulk, s':>9} {'bulk rows/s':>12}")
+    for n in sizes:
+        orig = make_purchases(n, uid=UID)
+        changes = compute_changeset(orig, edit_purchases(orig, frac=0.05))
+        legacy = run(engine, legacy_write, orig, changes)
+        bulk = run(engine, apply_changeset, orig, changes)
+        print(f'{n:>8} {len(changes):>8} {legacy:>10.3f} {bulk:>9.3f} {len(changes) / bulk:>12,.0f}')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
@@ -0,0 +1,148 @@
+"""Проверка планов запросов к purchases: чтения пользователя — index-only scan.
+
+Запросы берутся из кода приложения (pagination, export, bulk_write): их
+SQL перехватывается до отправки в БД и проверяется через EXPLAIN, так что
+проверка не расходится с кодом (без --analyze данные не читаются). Для каждого
+запроса ожидается узел по purchases (или её секциям) нужного типа; Seq Scan и Sort
+страницы — ошибка, код возврата 1.
+
+База — DATABASE_URL (только чтение, можно боевую) после python -m migrate.
+Планы зависят от статистики: проверяйте на реальных объёмах и для самого
+крупного пользователя (--uid). С --analyze запросы выполняются (EXPLAIN
+ANALYZE) и печатается Heap Fetches — рост означает, что VACUUM отстаёт и
+index-only scan ходит в таблицу.
+
+Запуск из корня репозитория:
+    python -m bench.explain_plans --uid 42 [--analyze]
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date
+
+from sqlalchemy import create_engine, event, text
+
+from bulk_write import fetch_rows
+from export import iter_frames
+from pagination import PageQuery, count_rows, fetch_options, fetch_page
+
+INDEX_ONLY = {'Index Only Scan'}
+BY_INDEX = {'Index Only Scan', 'Index Scan', 'Bitmap Heap Scan'}
+
+
+class _Captured(Exception):
+    pass
+
+
+def capture_sql(engine, call):
+    """(statement, parameters) первого запроса call(conn) — без его выполнения."""
+    seen = []
+
+    def grab(conn, cursor, statement, parameters, context, executemany):
+        if 'pg_catalog' in statement:
+            return  # pandas сначала проверяет по каталогу, не имя ли это таблицы
+        seen.append((statement, parameters))
+        raise _Captured
+
+    event.listen(engine, 'before_cursor_execute', grab)
+    try:
+        with engine.connect() as conn:
+            call(conn)
+    except _Captured:
+        pass
+    finally:
+        event.remove(engine, 'before_cursor_execute', grab)
+    return seen[0]
+
+
+def checks(uid, ids):
+    """(название, вызов, допустимые типы узла по purchases, запрещён ли Sort)."""
+    return [
+        ("export", lambda c: next(iter_frames(c.engine, uid)), INDEX_ONLY, False),
+        ("page ts desc", lambda c: fetch_page(c, uid, PageQuery(page=10)), INDEX_ONLY, True),
+        # Целые месяцы count и фильтры берут из purchase_monthly; по purchases —
+        # покупки без ts и края периода: capture_sql берёт именно этот, первый запрос
+        ("count undated", lambda c: count_rows(c, uid, PageQuery()), INDEX_ONLY, False),
+        ("count edges", lambda c: count_rows(c, uid, PageQuery(date_from=date(2024, 1, 10),
+                                                               date_to=date(2024, 1, 20))), INDEX_ONLY, False),
+        ("filter options", lambda c: fetch_options(c, uid), INDEX_ONLY, False),
+        ("rows by id", lambda c: fetch_rows(c, uid, ids), BY_INDEX, False),
+    ]
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def check_plan(plan, allowed, no_sort, empty=()):
+    """(узлы по purchases, ошибки) для плана EXPLAIN (FORMAT JSON).
+
+    empty — пустые секции: по ним планировщик законно выбирает Seq Scan.
+    """
+    nodes = list(plan_nodes(plan))
+    scans = [n for n in nodes if n.get('Relation Name', '').startswith('purchases')
+             and n['Relation Name'] not in empty]
+    bad = {}
+    for n in scans:
+        if n['Node Type'] not in allowed:
+            bad.setdefault(n['Node Type'], []).append(n['Relation Name'])
+    # Секций может быть сотни: по одной строке на тип узла
+    problems = [f"{node} on {', '.join(names[:3])}{f' и ещё {len(names) - 3}' if len(names) > 3 else ''}"
+                for node, names in bad.items()]
+    if not scans:
+        problems.append("нет чтения purchases")
+    if no_sort and any(n['Node Type'] in ('Sort', 'Incremental Sort') for n in nodes):
+        problems.append("сортировка вместо порядка индекса")
+    return scans, problems
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(prog="python -m bench.explain_plans", description=__doc__.splitlines()[0])
+    parser.add_argument("--uid", type=int, help="пользователь (по умолчанию — владелец первой строки)")
+    parser.add_argument("--analyze", action="store_true", help="выполнить запросы: EXPLAIN ANALYZE, BUFFERS")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    # ADBC и connectorx идут мимо событий SQLAlchemy — запросы не перехватить
+    os.environ['ARROW_LOADER'] = 'sqlalchemy'
+    engine = create_engine(os.getenv("DATABASE_URL"))
+    with engine.connect() as conn:
+        uid = args.uid or conn.execute(text("SELECT user_id FROM purchases LIMIT 1")).scalar()
+        ids = conn.execute(text("SELECT id FROM purchases WHERE user_id = :uid LIMIT 100"),
+                           {"uid": uid}).scalars().all() or [0]
+        empty = set(conn.execute(text(
+            "SELECT relname FROM pg_class WHERE relname LIKE 'purchases%' AND relkind = 'r' AND relpages = 0"
+        )).scalars())
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if args.analyze else "FORMAT JSON"
+    print(f"uid={uid}")
+
+    failed = 0
+    for name, call, allowed, no_sort in checks(uid, ids):
+        statement, parameters = capture_sql(engine, call)
+        with engine.connect() as conn:
+            raw = conn.exec_driver_sql(f"EXPLAIN ({options}) {statement}", parameters).scalar()
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+        scans, problems = check_plan(plan['Plan'], allowed, no_sort, empty)
+        if len(scans) == 1:
+            nodes = f"{scans[0]['Node Type']} ({scans[0].get('Index Name', '-')})"
+        else:
+            kinds = [n['Node Type'] for n in scans]
+            nodes = ", ".join(f"{kind} × {kinds.count(kind)}" for kind in sorted(set(kinds)))
+        line = f"{'FAIL' if problems else 'ok':<4} {name:<15} {nodes}"
+        if args.analyze:
+            heap = sum(n.get('Heap Fetches', 0) for n in scans)
+            line += f"  {plan['Execution Time']:.1f} ms, heap fetches {heap}"
+        print(line)
+        for problem in problems:
+            print(f"     ! {problem}")
+        failed += bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
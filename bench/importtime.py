@@ -0,0 +1,131 @@
+"""Цена импортов при холодном старте: отчёт в духе `python -X importtime` по страницам.
+
+Для app.py и каждой страницы из его st.navigation берутся импорты верхнего
+уровня модуля (по исходнику, так что отчёт не расходится с кодом) и
+выполняются в чистом процессе под -X importtime после `import streamlit` —
+его сервер загружает до первого прогона. Печатает для каждого входа время
+его импортов и самые дорогие пакеты (cumulative, мс); для страниц — только
+то, что не загрузил app.py.
+
+С --serve запускает `streamlit run app.py` и меряет старт процесса (до
+/_stcore/health) и первый прогон сессии: до первого элемента на экране и до
+конца прогона — без токена (экран входа) и с токеном (страница «Покупки»).
+База для --serve — BENCH_DATABASE_URL или временная SQLite.
+
+Запуск из корня репозитория:
+    python -m bench.importtime [--top 8] [--serve]
+"""
+import argparse
+import ast
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def module_imports(path):
+    """Модули из import/from верхнего уровня файла (без вложенных в функции)."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+    return list(dict.fromkeys(names))
+
+
+def navigation_pages(path):
+    """Файлы страниц из st.Page("...") в app.py."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return [node.args[0].value for node in ast.walk(tree)
+            if isinstance(node, ast.Call) and getattr(node.func, 'attr', None) == 'Page'
+            and node.args and isinstance(node.args[0], ast.Constant)]
+
+
+def importtime(modules, preloaded=()):
+    """{пакет верхнего уровня: cumulative, мкс} для импортов modules после preloaded."""
+    code = ";".join(f"import {m}" for m in ('streamlit', *preloaded))
+    code += ";import sys;sys.stderr.write('--\\n');" + ";".join(f"import {m}" for m in modules)
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                         cwd=ROOT, capture_output=True, text=True, check=True).stderr
+    packages = defaultdict(int)
+    for line in out.split('--\n', 1)[1].splitlines():
+        match = LINE.match(line)
+        if match and len(match.group(3)) == 1:  # прямые импорты, а не их зависимости
+            packages[match.group(4).split('.')[0]] += int(match.group(2))
+    return packages
+
+
+def report(top):
+    app = os.path.join(ROOT, 'app.py')
+    app_modules = module_imports(app)
+    entries = [('app.py', app_modules, ())]
+    entries += [(page, module_imports(os.path.join(ROOT, page)), app_modules) for page in navigation_pages(app)]
+    print(f"{'entry':<16} {'imports, ms':>11}  самые дорогие (cumulative, ms)")
+    for name, modules, preloaded in entries:
+        packages = importtime(modules, preloaded)
+        costly = sorted(packages.items(), key=lambda item: -item[1])[:top]
+        print(f"{name:<16} {sum(packages.values()) / 1000:>11.1f}  "
+              + ", ".join(f"{pkg} {us / 1000:.0f}" for pkg, us in costly))
+
+
+async def first_runs(port, token):
+    from bench.scale_test import Session
+
+    rows = []
+    for label, query in (('без токена', ''), ('с токеном', f"auth={token}")):
+        session = Session(port, query)
+        await session.open()
+        wall = await session.rerun()
+        rows.append((label, session.first_paint, wall))
+        await session.close()
+    return rows
+
+
+def serve(port):
+    from auth import issue_token
+    from bench.load_test import seed
+    from bench.scale_test import start_workers, stop_workers
+    from bench.synthetic import bench_engine
+
+    engine = bench_engine()
+    seed(engine, 1, 20_000)
+    env = dict(os.environ, DATABASE_URL=engine.url.render_as_string(hide_password=False))
+    env.setdefault('FNS_TOKEN', 'bench-secret')
+    os.environ['FNS_TOKEN'] = env['FNS_TOKEN']  # issue_token в этом процессе — тем же секретом
+
+    start = time.perf_counter()
+    procs = start_workers(1, port, env)
+    started = time.perf_counter() - start
+    try:
+        rows = asyncio.run(first_runs(port, issue_token(1)))
+    finally:
+        stop_workers(procs)
+    print(f"\nстарт процесса до /_stcore/health: {started * 1000:.0f} ms")
+    print(f"{'первый прогон':<14} {'первый элемент, ms':>19} {'конец прогона, ms':>18}")
+    for label, paint, wall in rows:
+        print(f"{label:<14} {paint * 1000:>19.1f} {wall * 1000:>18.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.importtime", description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=6, help="пакетов в строке отчёта")
+    parser.add_argument("--serve", action="store_true", help="замерить старт streamlit и первые прогоны")
+    parser.add_argument("--port", type=int, default=8611)
+    args = parser.parse_args(argv)
+    report(args.top)
+    if args.serve:
+        serve(args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Нагрузочный прогон app.py: несколько сессий Streamlit в одном процессе.
+
+Каждая сессия — свой AppTest со своим токеном и uid; сессии параллельно
+листают страницы редактора (каждый перезапуск — новая страница). Печатает
+p50/p99 времени перезапуска, запросы к БД на перезапуск и память на сессию.
+
+База — BENCH_DATABASE_URL или временная SQLite; таблицы purchases и
+purchase_monthly в ней пересоздаются.
+
+Запуск из корня репозитория:
+    python -m bench.load_test [--sessions 8] [--reruns 20] [--rows 20000]
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from bench.synthetic import bench_engine, create_purchase_monthly, create_purchases, make_purchases
+
+APP = str(Path(__file__).resolve().parent.parent / 'app.py')
+
+
+class QueryCounter:
+    """Счётчик выполненных SQL-запросов по всем движкам процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        event.listen(Engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def close(self):
+        event.remove(Engine, 'before_cursor_execute', self._on_execute)
+
+
+def rss_bytes():
+    # Текущий RSS процесса (Linux); в остальных ОС — пик из getrusage
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def seed(engine, sessions, rows):
+    """По rows покупок на каждого из uid 1..sessions."""
+    frames = []
+    for uid in range(1, sessions + 1):
+        df = make_purchases(rows, seed=uid, uid=uid)
+        df['id'] += (uid - 1) * rows
+        frames.append(df)
+    create_purchases(engine, pd.concat(frames, ignore_index=True))
+    create_purchase_monthly(engine)
+
+
+def new_session(uid):
+    from streamlit.testing.v1 import AppTest
+
+    from auth import issue_token
+
+    at = AppTest.from_file(APP, default_timeout=300)
+    at.query_params['auth'] = issue_token(uid)
+    return at
+
+
+def timed_run(at, page=None):
+    start = time.perf_counter()
+    if page is None:
+        at.run()
+    else:
+        at.number_input[0].set_value(page).run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return elapsed
+
+
+def percentiles(samples):
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.load_test", description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--reruns", type=int, default=20, help="перезапусков на сессию")
+    parser.add_argument("--rows", type=int, default=20_000, help="покупок на пользователя")
+    args = parser.parse_args(argv)
+
+    engine = bench_engine()
+    seed(engine, args.sessions, args.rows)
+    # Приложение берёт базу и секрет токенов из окружения (db.py, auth.py)
+    os.environ['DATABASE_URL'] = engine.url.render_as_string(hide_password=False)
+    os.environ.setdefault('FNS_TOKEN', 'bench-secret')
+    print(f"backend: {engine.dialect.name}, sessions={args.sessions}, "
+          f"reruns={args.reruns}, rows/user={args.rows:,}")
+
+    queries = QueryCounter()
+
+    # 1) Первые запуски по очереди: холодный старт, запросы и память на сессию
+    base_rss = rss_bytes()
+    sessions, cold, cold_queries, rss = [], [], [], []
+    for uid in range(1, args.sessions + 1):
+        at = new_session(uid)
+        before = queries.count
+        cold.append(timed_run(at))
+        cold_queries.append(queries.count - before)
+        rss.append(rss_bytes())
+        sessions.append(at)
+
+    # 2) Параллельные перезапуски: каждая сессия листает свои страницы
+    def drive(at):
+        pages = int(at.number_input[0].proto.max)
+        return [timed_run(at, page=1 + i % pages) for i in range(1, args.reruns + 1)]
+
+    before = queries.count
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        warm = [t for times in pool.map(drive, sessions) for t in times]
+    wall = time.perf_counter() - start
+    warm_queries = (queries.count - before) / len(warm)
+    queries.close()
+
+    p50, p99 = percentiles(cold)
+    print(f"\nпервый запуск:   p50 {p50 * 1000:8.1f} мс   p99 {p99 * 1000:8.1f} мс   "
+          f"запросов {np.mean(cold_queries):.1f}")
+    p50, p99 = percentiles(warm)
+    print(f"перезапуск:      p50 {p50 * 1000:8.1f} мс   p99 {p99 * 1000:8.1f} мс   "
+          f"запросов {warm_queries:.1f}   ({len(warm) / wall:.1f} перезапусков/с)")
+    first = rss[0] - base_rss
+    extra = (rss[-1] - rss[0]) / max(1, len(rss) - 1)
+    print(f"память:          первая сессия {first / 2**20:.1f} MiB, "
+          f"каждая следующая {extra / 2**20:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Вес страницы и время до первого байта: index.html и все ресурсы, которые он подключает.
+
+Загружает страницу как браузер (Accept-Encoding: gzip, br, одно keep-alive
+соединение) и печатает по типам ресурсов: байты по сети, байты после
+распаковки, сжатие, Cache-Control и TTFB. «Повторный заход» — байты ресурсов
+без долгого max-age (остальные браузер берёт из кэша). Для ответов без сжатия
+печатается и оценка gzip -5 — столько отдаст nginx с конфигом из репозитория.
+
+Сравнение до/после: один и тот же прогон против Streamlit напрямую и через nginx:
+    python -m bench.page_weight http://127.0.0.1:8511/
+    python -m bench.page_weight https://ai5.space/ [--insecure]
+"""
+import argparse
+import gzip
+import http.client
+import re
+import ssl
+import time
+from collections import defaultdict
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+import numpy as np
+
+LONG_CACHE = 86400  # max-age от суток — повторный заход берёт ресурс из кэша браузера
+
+
+class _Assets(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'script' and attrs.get('src'):
+            self.urls.append(attrs['src'])
+        elif tag == 'link' and attrs.get('href') and attrs.get('rel') in ('stylesheet', 'modulepreload', 'preload', 'icon'):
+            self.urls.append(attrs['href'])
+
+
+class Client:
+    """Одно keep-alive соединение, как у вкладки браузера (HTTP/1.1)."""
+
+    def __init__(self, base, insecure=False):
+        parts = urlsplit(base)
+        if parts.scheme == 'https':
+            context = ssl._create_unverified_context() if insecure else ssl.create_default_context()
+            self.conn = http.client.HTTPSConnection(parts.netloc, context=context, timeout=30)
+        else:
+            self.conn = http.client.HTTPConnection(parts.netloc, timeout=30)
+
+    def get(self, path):
+        start = time.perf_counter()
+        self.conn.request('GET', path, headers={'Accept-Encoding': 'gzip, br'})
+        response = self.conn.getresponse()
+        ttfb = time.perf_counter() - start
+        body = response.read()
+        return response, body, ttfb
+
+
+def kind_of(path):
+    ext = path.rsplit('.', 1)[-1].lower() if '.' in path.rsplit('/', 1)[-1] else 'html'
+    return {'js': 'js', 'css': 'css', 'woff2': 'font', 'woff': 'font', 'ttf': 'font'}.get(ext, ext)
+
+
+def max_age(cache_control):
+    match = re.search(r'max-age=(\d+)', cache_control or '')
+    return int(match.group(1)) if match else 0
+
+
+def decoded_size(body, encoding):
+    if encoding == 'gzip':
+        return len(gzip.decompress(body))
+    if encoding == 'br':
+        try:
+            import brotli
+        except ImportError:
+            return None
+        return len(brotli.decompress(body))
+    return len(body)
+
+
+def measure(base, insecure=False):
+    client = Client(base, insecure)
+    root = urlsplit(base).path or '/'
+    response, body, ttfb = client.get(root)
+    html = body if response.getheader('Content-Encoding') is None else gzip.decompress(body)
+    parser = _Assets()
+    parser.feed(html.decode('utf-8', 'replace'))
+
+    rows = [(root, response, body, ttfb)]
+    for url in dict.fromkeys(parser.urls):
+        path = urlsplit(urljoin(base, url)).path
+        rows.append((path, *client.get(path)))
+
+    results = []
+    for path, resp, data, elapsed in rows:
+        encoding = resp.getheader('Content-Encoding')
+        raw = decoded_size(data, encoding)
+        results.append({
+            'path': path,
+            'kind': kind_of(path),
+            'status': resp.status,
+            'wire': len(data),
+            'raw': raw,
+            'gzip_estimate': len(gzip.compress(data, 5)) if encoding is None else len(data),
+            'encoding': encoding or '-',
+            'max_age': max_age(resp.getheader('Cache-Control')),
+            'ttfb': elapsed,
+        })
+    return results
+
+
+def report(results):
+    by_kind = defaultdict(list)
+    for r in results:
+        by_kind[r['kind']].append(r)
+    print(f"{'type':<6} {'files':>5} {'wire, KB':>9} {'raw, KB':>9} {'gzip-5, KB':>10} "
+          f"{'encoding':>9} {'max-age':>9} {'TTFB p50, ms':>13}")
+    for kind, rows in sorted(by_kind.items()):
+        raw = sum(r['raw'] or 0 for r in rows)
+        encodings = ','.join(sorted({r['encoding'] for r in rows}))
+        ages = sorted({r['max_age'] for r in rows})
+        print(f"{kind:<6} {len(rows):>5} {sum(r['wire'] for r in rows) / 1024:>9.1f} {raw / 1024:>9.1f} "
+              f"{sum(r['gzip_estimate'] for r in rows) / 1024:>10.1f} {encodings:>9} "
+              f"{'/'.join(map(str, ages)):>9} {np.median([r['ttfb'] for r in rows]) * 1000:>13.1f}")
+    first = sum(r['wire'] for r in results)
+    repeat = sum(r['wire'] for r in results if r['max_age'] < LONG_CACHE)
+    estimate = sum(r['gzip_estimate'] for r in results)
+    bad = [r['path'] for r in results if r['status'] != 200]
+    print(f"\nпервый заход: {first / 1024:.1f} KB по сети ({estimate / 1024:.1f} KB со сжатием gzip -5), "
+          f"повторный: {repeat / 1024:.1f} KB; TTFB index.html {results[0]['ttfb'] * 1000:.1f} ms")
+    if bad:
+        print(f"не 200: {', '.join(bad)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.page_weight", description=__doc__.splitlines()[0])
+    parser.add_argument("url", nargs="?", default="http://127.0.0.1:8501/")
+    parser.add_argument("--insecure", action="store_true", help="не проверять TLS-сертификат")
+    args = parser.parse_args(argv)
+    report(measure(args.url, args.insecure))
+
+
+if __name__ == '__main__':
+    main()
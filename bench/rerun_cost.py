@@ -0,0 +1,128 @@
+"""Цена одного действия в редакторе: прогоны скрипта, CPU сервера и трафик.
+
+Запускает один процесс `streamlit run app.py` и сессию по websocket
+(bench.scale_test.Session), которая ведёт себя как вкладка браузера:
+правит ячейку «Цена», листает страницы и сохраняет правки. Печатает на одно
+действие: полных прогонов и прогонов фрагмента, p50 до конца прогона,
+CPU процесса Streamlit и килобайты ForwardMsg. Сохранение — от нажатия до
+конца прогона с итогом: page_main.wait_for_save ждёт запись в том же
+прогоне, без опросов по таймеру.
+
+База — BENCH_DATABASE_URL или временная SQLite; таблицы purchases и
+purchase_monthly в ней пересоздаются.
+
+Сравнение до/после — тот же прогон на двух ревизиях app.py:
+    python -m bench.rerun_cost [--actions 20] [--saves 3] [--rows 20000]
+"""
+import argparse
+import asyncio
+import json
+import os
+
+import numpy as np
+
+from bench.load_test import seed
+from bench.scale_test import Session, start_workers, stop_workers
+from bench.synthetic import bench_engine
+
+SAVE_TIMEOUT = 60
+
+
+def cpu_seconds(pid):
+    """user + system процесса по /proc (Linux)."""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+class Meter:
+    """Накопитель по видам действий: время, CPU, байты, прогоны."""
+
+    def __init__(self, session, pid):
+        self.session = session
+        self.pid = pid
+        self.rows = {}
+
+    async def measure(self, action, coro):
+        session = self.session
+        runs, received, cpu = len(session.runs), session.received, cpu_seconds(self.pid)
+        wall = await coro
+        new_runs = session.runs[runs:]
+        row = self.rows.setdefault(action, {'wall': [], 'cpu': 0.0, 'bytes': 0, 'full': 0, 'fragment': 0, 'n': 0})
+        row['wall'].append(wall)
+        row['cpu'] += cpu_seconds(self.pid) - cpu
+        row['bytes'] += session.received - received
+        row['full'] += sum(full for full, _ in new_runs)
+        row['fragment'] += sum(not full for full, _ in new_runs)
+        row['n'] += 1
+
+    def report(self):
+        print(f"{'action':<7} {'n':>3} {'full runs':>10} {'fragment runs':>14} {'p50, ms':>8} "
+              f"{'CPU, ms':>8} {'KB':>7}")
+        for action, r in self.rows.items():
+            n = r['n']
+            print(f"{action:<7} {n:>3} {r['full'] / n:>10.2f} {r['fragment'] / n:>14.2f} "
+                  f"{np.percentile(r['wall'], 50) * 1000:>8.1f} {r['cpu'] / n * 1000:>8.1f} "
+                  f"{r['bytes'] / n / 1024:>7.1f}")
+
+
+def edit(session, value):
+    # Состояние редактора, как его шлёт фронтенд: правки по номеру строки
+    session.set_state('editor', 'string_value', json.dumps(
+        {'edited_rows': {'0': {'Цена': value}}, 'added_rows': [], 'deleted_rows': []}
+    ))
+    return session.interact('editor')
+
+
+async def save(session):
+    """Нажатие «Сохранить» и ожидание итога (запись ждёт сам прогон скрипта)."""
+    elapsed = await asyncio.wait_for(session.interact(trigger='save'), SAVE_TIMEOUT)
+    if not any('успешно' in text or 'Остальные' in text for text in session.texts):
+        raise RuntimeError(f"сохранение не завершилось: {session.texts}")
+    # После записи редактор пересоздан с новым ключом — правки в нём пусты
+    session.states.pop(session.widgets['editor'][0], None)
+    return elapsed
+
+
+async def drive(port, pid, actions, saves):
+    from auth import issue_token
+
+    session = Session(port, f"auth={issue_token(1)}")
+    await session.open()
+    await session.rerun()  # первый запуск: загрузка в кэш воркера, не считаем
+    meter = Meter(session, pid)
+    for i in range(actions):
+        await meter.measure('edit', edit(session, 100 + i))
+    for i in range(actions):
+        await meter.measure('page', session.rerun(page=1 + (i + 1) % session.pages))
+    for i in range(saves):
+        await edit(session, 1000 + i)
+        await meter.measure('save', save(session))
+    await session.close()
+    meter.report()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.rerun_cost", description=__doc__.splitlines()[0])
+    parser.add_argument("--actions", type=int, default=20, help="правок и смен страницы")
+    parser.add_argument("--saves", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=20_000, help="покупок пользователя")
+    parser.add_argument("--port", type=int, default=8611)
+    args = parser.parse_args(argv)
+
+    engine = bench_engine()
+    seed(engine, 1, args.rows)
+    env = dict(os.environ, DATABASE_URL=engine.url.render_as_string(hide_password=False))
+    env.setdefault('FNS_TOKEN', 'bench-secret')
+    os.environ['FNS_TOKEN'] = env['FNS_TOKEN']  # issue_token в этом процессе — тем же секретом
+    print(f"backend: {engine.dialect.name}, rows={args.rows:,}")
+
+    procs = start_workers(1, args.port, env)
+    try:
+        asyncio.run(drive(args.port, procs[0].pid, args.actions, args.saves))
+    finally:
+        stop_workers(procs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""Масштабирование по воркерам: перезапуски в секунду для 1, 2, 4... процессов Streamlit.
+
+Для каждого числа воркеров запускается столько процессов `streamlit run app.py`
+на портах от --port. Клиенты — сессии по websocket, как вкладки браузера (без
+отрисовки): каждый закреплён за воркером по кругу, как закрепляет nginx, и
+листает страницы редактора. Печатает перезапусков/с, p50/p99 и ускорение
+относительно первого прогона. Рост ограничен числом ядер: один воркер — один GIL.
+
+База — BENCH_DATABASE_URL или временная SQLite; таблицы purchases и
+purchase_monthly в ней пересоздаются.
+
+Запуск из корня репозитория:
+    python -m bench.scale_test [--workers 1 2 4] [--clients 16] [--reruns 10] [--rows 20000]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+
+from bench.load_test import APP, seed
+from bench.synthetic import bench_engine
+
+STARTUP_TIMEOUT = 60
+
+
+class Session:
+    """Сессия Streamlit по websocket /_stcore/stream — протокол фронтенда без отрисовки.
+
+    Как браузер, шлёт при каждом перезапуске состояния всех известных виджетов,
+    а действие с виджетом внутри st.fragment — как перезапуск этого фрагмента.
+    """
+
+    def __init__(self, port, query_string):
+        self.port = port
+        self.query_string = query_string
+        self.widgets = {}         # 'page' / 'editor' / 'save' -> (id виджета, id фрагмента)
+        self.states = {}          # id виджета -> (поле WidgetState, значение)
+        self.pages = 1
+        self.texts = []           # тексты сообщений (st.info/success/...) последнего прогона
+        self.received = 0         # байт ForwardMsg
+        self.runs = []            # (полный ли прогон, статус script_finished)
+        self.sent_at = 0.0
+        self.first_paint = None   # с от последнего send до первого элемента
+        self.ws = None
+
+    async def open(self):
+        import websockets
+
+        self.ws = await websockets.connect(
+            f"ws://127.0.0.1:{self.port}/_stcore/stream",
+            subprotocols=["streamlit"],
+            origin=f"http://127.0.0.1:{self.port}",
+            max_size=None,
+        )
+
+    async def close(self):
+        await self.ws.close()
+
+    def set_state(self, kind, field, value):
+        self.states[self.widgets[kind][0]] = (field, value)
+
+    async def send(self, trigger=None, fragment_id=''):
+        """Перезапуск с текущими состояниями виджетов; trigger — нажатая кнопка."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = self.query_string
+        msg.rerun_script.fragment_id = fragment_id
+        for widget_id, (field, value) in self.states.items():
+            setattr(msg.rerun_script.widget_states.widgets.add(id=widget_id), field, value)
+        if trigger is not None:
+            msg.rerun_script.widget_states.widgets.add(id=self.widgets[trigger][0], trigger_value=True)
+        self.sent_at, self.first_paint = time.perf_counter(), None
+        await self.ws.send(msg.SerializeToString())
+
+    async def finished(self):
+        """Читает ForwardMsg до конца прогона; статус script_finished."""
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        full = True
+        while True:
+            raw = await self.ws.recv()
+            self.received += len(raw)
+            forward = ForwardMsg()
+            forward.ParseFromString(raw)
+            kind = forward.WhichOneof('type')
+            if kind == 'new_session':
+                full = not forward.new_session.fragment_ids_this_run
+                self.texts = []
+            elif kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                if self.first_paint is None:
+                    self.first_paint = time.perf_counter() - self.sent_at
+                self._element(forward.delta.new_element, forward.delta.fragment_id)
+            elif kind == 'script_finished':
+                self.runs.append((full, forward.script_finished))
+                return forward.script_finished
+
+    def _element(self, element, fragment_id):
+        kind = element.WhichOneof('type')
+        if kind == 'exception':
+            raise RuntimeError(element.exception.message)
+        if kind == 'number_input':
+            self.widgets['page'] = (element.number_input.id, fragment_id)
+            self.pages = int(element.number_input.max)
+        elif kind == 'dataframe' and element.dataframe.id:
+            self.widgets['editor'] = (element.dataframe.id, fragment_id)
+        elif kind == 'button':
+            self.widgets['save'] = (element.button.id, fragment_id)
+        elif kind == 'alert':
+            self.texts.append(element.alert.body)
+
+    async def settle(self):
+        """Ждёт конца прогона, включая перезапуски, которые скрипт вызвал сам (st.rerun)."""
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        while await self.finished() == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+            pass
+
+    async def interact(self, kind=None, trigger=None):
+        """Действие с виджетом kind (или нажатие trigger) — как перезапуск его фрагмента."""
+        start = time.perf_counter()
+        widget = self.widgets.get(trigger or kind)
+        await self.send(trigger, widget[1] if widget else '')
+        await self.settle()
+        return time.perf_counter() - start
+
+    async def rerun(self, page=None):
+        """Перезапуск (со сменой страницы редактора); время до script_finished."""
+        if page is not None and 'page' in self.widgets:
+            self.set_state('page', 'int_value', page)
+            return await self.interact('page')
+        return await self.interact()
+
+
+def start_workers(n, base_port, env):
+    procs = [
+        subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', APP,
+             '--server.port', str(base_port + i),
+             '--server.address', '127.0.0.1',
+             '--server.headless', 'true',
+             '--server.fileWatcherType', 'none',
+             '--browser.gatherUsageStats', 'false'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        for i in range(n)
+    ]
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    for i in range(n):
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{base_port + i}/_stcore/health", timeout=1)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    stop_workers(procs)
+                    raise RuntimeError(f"воркер на порту {base_port + i} не запустился")
+                time.sleep(0.2)
+    return procs
+
+
+def stop_workers(procs):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        proc.wait()
+
+
+async def drive(workers, base_port, clients, reruns, users):
+    from auth import issue_token
+
+    sessions = [Session(base_port + i % workers, f"auth={issue_token(1 + i % users)}") for i in range(clients)]
+    for session in sessions:
+        await session.open()
+        await session.rerun()  # первый запуск: загрузка в кэш воркера, не считаем
+
+    async def pages(session):
+        return [await session.rerun(page=1 + i % session.pages) for i in range(1, reruns + 1)]
+
+    start = time.perf_counter()
+    times = [t for result in await asyncio.gather(*(pages(s) for s in sessions)) for t in result]
+    wall = time.perf_counter() - start
+    for session in sessions:
+        await session.close()
+    return times, wall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.scale_test", description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16, help="одновременных сессий")
+    parser.add_argument("--reruns", type=int, default=10, help="перезапусков на сессию")
+    parser.add_argument("--rows", type=int, default=20_000, help="покупок на пользователя")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8611, help="порт первого воркера")
+    args = parser.parse_args(argv)
+
+    engine = bench_engine()
+    seed(engine, args.users, args.rows)
+    env = dict(os.environ, DATABASE_URL=engine.url.render_as_string(hide_password=False))
+    env.setdefault('FNS_TOKEN', 'bench-secret')
+    os.environ['FNS_TOKEN'] = env['FNS_TOKEN']  # issue_token в этом процессе — тем же секретом
+    print(f"backend: {engine.dialect.name}, cpus={os.cpu_count()}, clients={args.clients}, "
+          f"reruns={args.reruns}, rows/user={args.rows:,}")
+    print(f"{'workers':>7} {'reruns/s':>9} {'p50, ms':>9} {'p99, ms':>9} {'speedup':>8}")
+
+    base = None
+    for n in args.workers:
+        procs = start_workers(n, args.port, env)
+        try:
+            times, wall = asyncio.run(drive(n, args.port, args.clients, args.reruns, args.users))
+        finally:
+            stop_workers(procs)
+        rate = len(times) / wall
+        base = base or rate
+        print(f"{n:>7} {rate:>9.1f} {np.percentile(times, 50) * 1000:>9.1f} "
+              f"{np.percentile(times, 99) * 1000:>9.1f} {rate / base:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+CATEGORIES = {
+    'Продукты': ['Молочные', 'Овощи', 'Мясо', 'Хлеб'],
+    'Транспорт': ['Такси', 'Метро', 'Бензин'],
+    'Дом': ['Хозтовары', 'Мебель', 'Ремонт'],
+    'Здоровье': ['Аптека', 'Врач'],
+    'Развлечения': ['Кино', 'Кафе', 'Подписки'],
+}
+
+
+def make_purchases(n, seed=0, uid=1):
+    """Синтетическая история покупок в формате таблицы purchases."""
+    rng = np.random.default_rng(seed)
+    pairs = [(c, s) for c, subs in CATEGORIES.items() for s in subs]
+    pick = rng.integers(0, len(pairs), size=n)
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1, dtype='int64'),
+        'user_id': uid,
+        'category': [pairs[i][0] for i in pick],
+        'subcategory': [pairs[i][1] for i in pick],
+        'price': rng.integers(1_00, 50_000_00, size=n) / 100,
+        'ts': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 5 * 365 * 86400, size=n), unit='s'),
+        'version': np.ones(n, dtype='int64'),
+    })
+
+
+def edit_purchases(df, frac=0.01, seed=1):
+    """Копия df с долей frac изменённых, удалённых и добавленных строк."""
+    rng = np.random.default_rng(seed)
+    k = max(1, int(len(df) * frac))
+    edited = df.copy()
+    changed = rng.choice(len(df), size=k, replace=False)
+    edited.loc[edited.index[changed], 'price'] += 1
+    edited = edited.drop(index=edited.index[rng.choice(len(df), size=k, replace=False)])
+    added = make_purchases(k, seed=seed + 1)
+    added['id'] = np.nan
+    return pd.concat([edited, added], ignore_index=True)
+
+
+def bench_engine():
+    """Движок для бенчмарков: BENCH_DATABASE_URL или временная SQLite.
+
+    Таблица purchases в этой базе пересоздаётся — указывайте только тестовую БД.
+    """
+    import os
+    import tempfile
+
+    from sqlalchemy import create_engine
+
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        url = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    return create_engine(url)
+
+
+def create_purchases(engine, df=None):
+    """Пересоздаёт purchases со словарём категорий и заливает в них df (если передан).
+
+    Подписи df переводятся в коды purchase_categories, как после migrations/0006.
+    """
+    from sqlalchemy import text
+
+    from categories import get_category_cache
+
+    postgres = engine.dialect.name == 'postgresql'
+    id_type = 'BIGSERIAL' if postgres else 'INTEGER'
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS purchases"))
+        conn.execute(text("DROP TABLE IF EXISTS purchase_categories"))
+        conn.execute(text(f"""
+            CREATE TABLE purchase_categories (
+                id          {'SERIAL' if postgres else 'INTEGER'} PRIMARY KEY,
+                user_id     BIGINT NOT NULL,
+                category    TEXT   NOT NULL DEFAULT '',
+                subcategory TEXT   NOT NULL DEFAULT '',
+                UNIQUE (user_id, category, subcategory)
+            )
+        """))
+        conn.execute(text(f"""
+            CREATE TABLE purchases (
+                id          {id_type} PRIMARY KEY,
+                user_id     BIGINT NOT NULL,
+                category    TEXT,
+                subcategory TEXT,
+                category_id INTEGER REFERENCES purchase_categories (id),
+                price       NUMERIC,
+                ts          TIMESTAMP,
+                version     BIGINT NOT NULL DEFAULT 1,
+                updated_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        # Тот же индекс, что в migrations/0008 (в SQLite — без INCLUDE)
+        include = " INCLUDE (category_id, price, version)" if postgres else ""
+        conn.execute(text(f"CREATE INDEX purchases_user_ts_category_idx ON purchases (user_id, ts, id){include}"))
+        if df is not None:
+            dictionary, df = encode_categories(df)
+            dictionary.to_sql('purchase_categories', conn, if_exists='append', index=False)
+            df.to_sql('purchases', conn, if_exists='append', index=False, chunksize=50_000)
+        if postgres:
+            for table in ('purchase_categories', 'purchases'):
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"COALESCE(MAX(id), 0) + 1, false) FROM {table}"
+                ))
+    get_category_cache().clear()  # коды пересозданного словаря не совпадают с прежними
+
+
+def encode_categories(df):
+    """(словарь purchase_categories, df с category_id вместо подписей)."""
+    keys = ['user_id', 'category', 'subcategory']
+    labels = df[keys].assign(**{col: df[col].fillna('').astype(str).str.strip() for col in keys[1:]})
+    codes = labels.groupby(keys, sort=True).ngroup().to_numpy() + 1
+    empty = (labels['category'] == '') & (labels['subcategory'] == '')
+    dictionary = labels.assign(id=codes).loc[~empty].drop_duplicates('id')[['id', *keys]]
+    codes = pd.array(codes, dtype='Int64')
+    codes[empty.to_numpy()] = pd.NA
+    return dictionary, df.drop(columns=keys[1:]).assign(category_id=codes)
+
+
+def create_purchase_monthly(engine):
+    """Создаёт purchase_monthly (migrations/0001) и пересобирает её из purchases."""
+    from pathlib import Path
+
+    from sqlalchemy import text
+
+    from rollups import rebuild
+
+    ddl = (Path(__file__).resolve().parent.parent / 'migrations' / '0001_purchase_monthly.sql').read_text()
+    with engine.begin() as conn:
+        conn.execute(text(ddl))
+        rebuild(conn)
@@ -0,0 +1,245 @@
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from categories import encode_frame
+
+# Колонки, которые пишет редактор; порядок совпадает с COPY и unnest
+WRITE_COLUMNS = ['category', 'subcategory', 'price', 'ts']
+# Они же в purchases: подписи категории — кодом словаря (categories.encode_frame)
+STORED_COLUMNS = ['category_id', 'price', 'ts']
+USER_LOCK_NS = 0x64617368  # 'dash' — первый ключ pg_advisory_xact_lock(int, int) записи uid
+
+_PG_UPDATE = text("""
+    UPDATE purchases AS p
+       SET category_id = v.category_id,
+           price       = v.price,
+           ts          = v.ts,
+           version     = p.version + 1,
+           updated_at  = now()
+      FROM unnest(
+               CAST(:ids AS bigint[]),
+               CAST(:versions AS bigint[]),
+               CAST(:category_id AS integer[]),
+               CAST(:price AS numeric[]),
+               CAST(:ts AS timestamp[])
+           ) AS v(id, version, category_id, price, ts)
+     WHERE p.id = v.id AND p.user_id = :uid
+       AND (v.version IS NULL OR p.version = v.version)
+    RETURNING p.id
+""")
+
+_UPDATE_ONE = text("""
+    UPDATE purchases
+       SET category_id = :category_id,
+           price       = :price,
+           ts          = :ts,
+           version     = version + 1,
+           updated_at  = CURRENT_TIMESTAMP
+     WHERE id = :id AND user_id = :uid
+""")
+
+
+def _values(series):
+    # NaN/NaT -> None, numpy-скаляры и Timestamp -> python-типы для драйвера
+    if pd.api.types.is_datetime64_any_dtype(series):
+        pydatetimes = np.asarray(series.dt.to_pydatetime(), dtype=object)  # без выравнивания по индексу
+        values = pd.Series(pydatetimes, index=series.index, dtype=object)
+    elif series.dtype == 'float32':
+        # компактная цена: без округления в БД уйдёт 12.34000015258789
+        values = series.astype('float64').round(2).astype(object)
+    else:
+        values = series.astype(object)
+    return values.where(series.notna(), None).tolist()
+
+
+def _records(df, columns):
+    return [dict(zip(columns, row)) for row in zip(*(_values(df[col]) for col in columns))]
+
+
+def _is_postgres(conn):
+    return conn.dialect.name == 'postgresql'
+
+
+def _expected(ids, versions):
+    # Прочитанные версии в порядке ids; None — строку пишем без проверки
+    versions = versions or {}
+    return [versions.get(i) for i in ids]
+
+
+def _stale_ids(conn, uid, ids, versions):
+    # Без RETURNING (SQLite, executemany) версии сверяем до записи
+    checked = [i for i in ids if versions and i in versions]
+    if not checked:
+        return set()
+    current = dict(conn.execute(
+        text("SELECT id, version FROM purchases WHERE user_id = :uid AND id IN :ids").bindparams(
+            bindparam('ids', expanding=True)
+        ),
+        {"uid": uid, "ids": checked},
+    ).all())
+    return {i for i in checked if current.get(i) != versions[i]}
+
+
+def lock_rows(conn, uid, ids):
+    """SELECT ... FOR UPDATE строк пользователя до конца транзакции (PostgreSQL).
+
+    Между чтением старых значений (итоги) и проверкой версии строку никто не
+    изменит; в SQLite запись и так сериализована.
+    """
+    ids = [int(i) for i in ids]
+    if not ids or not _is_postgres(conn):
+        return
+    conn.execute(
+        text("""
+            SELECT p.id
+              FROM purchases AS p
+              JOIN unnest(CAST(:ids AS bigint[])) AS l(id) ON p.id = l.id
+             WHERE p.user_id = :uid
+               FOR UPDATE OF p
+        """),
+        {"uid": uid, "ids": ids},
+    )
+
+
+def lock_user(conn, uid):
+    """Сериализует запись одного пользователя между процессами до конца транзакции.
+
+    Очередь записи (write_queue) упорядочивает сохранения uid внутри процесса;
+    при нескольких воркерах сохранения и импорт того же uid ждут друг друга на
+    advisory-блокировке. В SQLite запись и так сериализована.
+    """
+    if not _is_postgres(conn):
+        return
+    conn.execute(
+        text("SELECT pg_advisory_xact_lock(:ns, hashtext(CAST(:uid AS text)))"),
+        {"ns": USER_LOCK_NS, "uid": uid},
+    )
+
+
+def delete_rows(conn, uid, ids, versions=None):
+    """Удаляет строки, чья версия совпала с прочитанной; возвращает id конфликтов."""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return []
+    if _is_postgres(conn):
+        # join с unnest, а не id = ANY(...): иначе планировщик может пойти по
+        # индексу user_id и проверять массив для каждой строки пользователя
+        stmt = text("""
+            DELETE FROM purchases AS p
+             USING unnest(CAST(:ids AS bigint[]), CAST(:versions AS bigint[])) AS d(id, version)
+             WHERE p.id = d.id AND p.user_id = :uid
+               AND (d.version IS NULL OR p.version = d.version)
+            RETURNING p.id
+        """)
+        done = set(conn.execute(
+            stmt, {"uid": uid, "ids": ids, "versions": _expected(ids, versions)}
+        ).scalars())
+        return [i for i in ids if i not in done]
+    stale = _stale_ids(conn, uid, ids, versions)
+    fresh = [i for i in ids if i not in stale]
+    if fresh:
+        stmt = text("DELETE FROM purchases WHERE user_id = :uid AND id IN :ids").bindparams(
+            bindparam('ids', expanding=True)
+        )
+        conn.execute(stmt, {"uid": uid, "ids": fresh})
+    return [i for i in ids if i in stale]
+
+
+def update_rows(conn, uid, rows, versions=None):
+    """Применяет все изменения одним UPDATE ... FROM unnest(...).
+
+    rows — id и STORED_COLUMNS (категории уже кодами). Строка пишется, только
+    если её version в БД равна прочитанной (versions); возвращает id строк,
+    которые с тех пор изменили или удалили.
+    """
+    if rows.empty:
+        return []
+    ids = rows['id'].astype('int64').tolist()
+    if not _is_postgres(conn):
+        # SQLite и прочие: один executemany вместо цикла execute
+        stale = _stale_ids(conn, uid, ids, versions)
+        fresh = rows.loc[~rows['id'].isin(stale)]
+        if not fresh.empty:
+            conn.execute(_UPDATE_ONE, [{**r, "uid": uid} for r in _records(fresh, ['id', *STORED_COLUMNS])])
+        # Удалённые другими строки executemany молча пропускает
+        present = set(conn.execute(
+            text("SELECT id FROM purchases WHERE user_id = :uid AND id IN :ids").bindparams(
+                bindparam('ids', expanding=True)
+            ),
+            {"uid": uid, "ids": ids},
+        ).scalars())
+        return [i for i in ids if i in stale or i not in present]
+    params = {col: _values(rows[col]) for col in STORED_COLUMNS}
+    params.update(uid=uid, ids=ids, versions=_expected(ids, versions))
+    done = set(conn.execute(_PG_UPDATE, params).scalars())
+    return [i for i in ids if i not in done]
+
+
+def _copy(conn, table, columns, buf):
+    dbapi_conn = conn.connection.driver_connection
+    sql = (f"COPY {table} ({', '.join(columns)}) FROM STDIN "
+           "WITH (FORMAT csv, NULL '\\N')")
+    with dbapi_conn.cursor() as cur:
+        if conn.dialect.driver == 'psycopg2':
+            cur.copy_expert(sql, buf)
+        else:  # psycopg 3
+            with cur.copy(sql) as copy:
+                copy.write(buf.getvalue())
+
+
+def insert_rows(conn, rows, table='purchases'):
+    """Вставляет строки через COPY из буфера в памяти (в текущей транзакции)."""
+    if rows.empty:
+        return 0
+    columns = list(rows.columns)
+    if not _is_postgres(conn):
+        placeholders = ', '.join(f':{col}' for col in columns)
+        conn.execute(
+            text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"),
+            _records(rows, columns),
+        )
+        return len(rows)
+    buf = io.StringIO()
+    rows.to_csv(buf, index=False, header=False, na_rep='\\N',
+                quoting=csv.QUOTE_MINIMAL, date_format='%Y-%m-%d %H:%M:%S')
+    buf.seek(0)
+    _copy(conn, table, columns, buf)
+    return len(rows)
+
+
+def apply_changeset(conn, uid, changes):
+    """Записывает Changeset: удаления, изменения и вставки за три запроса.
+
+    Подписи категорий переводятся в коды словаря (новые пары добавляются в
+    него в той же транзакции). Возвращает id строк, не прошедших проверку
+    версии (их правки не записаны).
+    """
+    conflicts = delete_rows(conn, uid, changes.deletes, changes.versions)
+    conflicts += update_rows(conn, uid, encode_frame(conn, uid, changes.updates), changes.versions)
+    insert_rows(conn, encode_frame(conn, uid, changes.inserts))
+    return conflicts
+
+
+def fetch_rows(conn, uid, ids):
+    """Текущие строки пользователя по id (для отчёта о конфликтах)."""
+    if not ids:
+        return pd.DataFrame(columns=['id', *WRITE_COLUMNS, 'version'])
+    return pd.read_sql(
+        text("""
+            SELECT p.id,
+                   NULLIF(c.category, '') AS category,
+                   NULLIF(c.subcategory, '') AS subcategory,
+                   p.price,
+                   p.ts,
+                   p.version
+            FROM purchases AS p
+            LEFT JOIN purchase_categories AS c ON c.id = p.category_id
+            WHERE p.user_id = :uid AND p.id IN :ids
+        """).bindparams(bindparam('ids', expanding=True)),
+        conn,
+        params={"uid": uid, "ids": [int(i) for i in ids]},
+    )
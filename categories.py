@@ -0,0 +1,185 @@
+"""Словарь категорий пользователя: purchase_categories и коды purchases.category_id.
+
+Пара (category, subcategory) хранится один раз на пользователя
+(migrations/0006), строка purchases ссылается на неё целым category_id;
+NULL — без категории и подкатегории. Записи словаря не меняются и не
+удаляются, поэтому карта код -> подписи в кэше процесса может быть только
+неполной, но не неверной: код, которого в ней нет (пару добавил другой
+воркер или загрузчик чеков), перечитывает словарь.
+
+Чтения переводят коды в словарные колонки Arrow (категориальные в pandas),
+запись — категории в коды; и то и другое — массивами, без запроса на строку.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+from sqlalchemy import text
+
+from frame_cache import FrameCache
+
+
+class CategoryMap:
+    """Словарь одного пользователя: коды пар и их подписи.
+
+    categories/subcategories — различные непустые подписи (словари
+    категориальных колонок); category_codes/subcategory_codes — номер подписи
+    каждой пары в них, -1 — пусто.
+    """
+
+    def __init__(self, frame):
+        frame = frame.sort_values('id')
+        self.ids = frame['id'].to_numpy(dtype='int64')
+        self.pairs = pd.MultiIndex.from_arrays([frame['category'].to_numpy(dtype=object),
+                                                frame['subcategory'].to_numpy(dtype=object)])
+        self.categories, self.category_codes = _labels(frame['category'])
+        self.subcategories, self.subcategory_codes = _labels(frame['subcategory'])
+
+    @property
+    def nbytes(self):
+        return int(self.ids.nbytes + self.category_codes.nbytes + self.subcategory_codes.nbytes
+                   + self.pairs.memory_usage(deep=True)
+                   + self.categories.memory_usage(deep=True) + self.subcategories.memory_usage(deep=True))
+
+    def positions(self, codes):
+        """Номер пары в словаре для каждого кода, -1 — NULL; None, если есть неизвестные коды."""
+        if not isinstance(codes, (pa.Array, pa.ChunkedArray)):
+            codes = pa.array(codes, from_pandas=True)
+        codes = codes.cast(pa.int64())
+        present = pc.is_valid(codes).to_numpy(zero_copy_only=False)
+        values = pc.fill_null(codes, 0).to_numpy(zero_copy_only=False)
+        if not len(self.ids):
+            return None if present.any() else np.full(len(values), -1)
+        found = np.minimum(np.searchsorted(self.ids, values), len(self.ids) - 1)
+        if (present & (self.ids[found] != values)).any():
+            return None
+        return np.where(present, found, -1)
+
+    def decode(self, positions):
+        """(category, subcategory) — словарные массивы Arrow для номеров пар."""
+        arrays = []
+        for labels, codes in ((self.categories, self.category_codes),
+                              (self.subcategories, self.subcategory_codes)):
+            indices = codes[np.maximum(positions, 0)] if len(codes) else np.full(len(positions), -1, 'int32')
+            indices = np.where(positions >= 0, indices, -1)
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(indices, pa.int32(), mask=indices < 0),
+                pa.array(labels.to_numpy(dtype=object), pa.string()),
+            ))
+        return tuple(arrays)
+
+    def encode(self, category, subcategory):
+        """(коды Int64, пары, которых нет в словаре) для колонок подписей."""
+        keys = pd.MultiIndex.from_arrays([_label_values(category), _label_values(subcategory)])
+        found = self.pairs.get_indexer(keys) if len(self.pairs) else np.full(len(keys), -1)
+        empty = (keys.get_level_values(0) == '') & (keys.get_level_values(1) == '')
+        missing = keys[(found < 0) & ~empty].unique()
+        ids = self.ids[np.maximum(found, 0)] if len(self.ids) else np.zeros(len(keys), 'int64')
+        codes = pd.array(ids, dtype='Int64')
+        codes[found < 0] = pd.NA
+        return codes, list(missing)
+
+    def ids_for(self, categories=(), subcategories=()):
+        """Коды пар, подходящих под фильтры по подписям."""
+        match = np.ones(len(self.ids), dtype=bool)
+        if categories:
+            match &= self.pairs.get_level_values(0).isin(categories)
+        if subcategories:
+            match &= self.pairs.get_level_values(1).isin(subcategories)
+        return self.ids[match].tolist()
+
+
+def _labels(column):
+    values = column.to_numpy(dtype=object)
+    labels = pd.Index(sorted({v for v in values if v}), dtype=object)
+    codes = labels.get_indexer(values)
+    return labels, codes.astype('int32')
+
+
+def _label_values(values):
+    # Подписи для поиска в словаре: пропуски и пробелы по краям -> ''
+    series = pd.Series(values, copy=False).astype(object)
+    return series.where(series.notna(), '').map(str).str.strip().to_numpy(dtype=object)
+
+
+@st.cache_resource
+def get_category_cache():
+    # Словари пользователей (сотни пар) — кэш по uid, общий для сессий процесса
+    return FrameCache(
+        max_bytes=int(os.getenv("CATEGORY_CACHE_MB", "16")) * 1024 * 1024,
+        ttl=int(os.getenv("PURCHASES_CACHE_TTL", "600")),
+        sizeof=lambda categories: categories.nbytes,
+    )
+
+
+def fetch_categories(conn, uid):
+    rows = conn.execute(
+        text("SELECT id, category, subcategory FROM purchase_categories WHERE user_id = :uid"),
+        {"uid": uid},
+    ).all()
+    return CategoryMap(pd.DataFrame(rows, columns=['id', 'category', 'subcategory']))
+
+
+def category_map(conn, uid, codes=None):
+    """Словарь uid из кэша; перечитывается, если в codes есть коды не из него."""
+    cache = get_category_cache()
+    categories = cache.get(uid)
+    if categories is None or (codes is not None and categories.positions(codes) is None):
+        categories = cache.put(uid, fetch_categories(conn, uid))
+    return categories
+
+
+def load_categories(engine, uid):
+    """Словарь uid для списков выбора редактора; без запроса, если он в кэше."""
+    categories = get_category_cache().get(uid)
+    if categories is None:
+        with engine.connect() as conn:
+            categories = category_map(conn, uid)
+    return categories
+
+
+def decode_table(conn, uid, table):
+    """Table с category_id -> с category и subcategory (словарными) на его месте."""
+    codes = table['category_id']
+    categories = category_map(conn, uid, codes)
+    category, subcategory = categories.decode(categories.positions(codes))
+    i = table.column_names.index('category_id')
+    table = table.remove_column(i)
+    return table.add_column(i, 'category', category).add_column(i + 1, 'subcategory', subcategory)
+
+
+def encode_frame(conn, uid, frame):
+    """Кадр с category/subcategory -> с category_id; новые пары добавляются в словарь.
+
+    Вызывается в транзакции записи. Словарь с только что добавленными парами
+    в кэш не кладётся: при откате транзакции их коды не существовали бы.
+    """
+    if frame.empty:
+        codes, missing = pd.array([], dtype='Int64'), []
+    else:
+        codes, missing = category_map(conn, uid).encode(frame['category'], frame['subcategory'])
+    if missing:
+        conn.execute(
+            text("""
+                INSERT INTO purchase_categories (user_id, category, subcategory)
+                VALUES (:uid, :category, :subcategory)
+                ON CONFLICT (user_id, category, subcategory) DO NOTHING
+            """),
+            [{"uid": uid, "category": c, "subcategory": s} for c, s in missing],
+        )
+        categories = fetch_categories(conn, uid)
+        codes, _ = categories.encode(frame['category'], frame['subcategory'])
+    i = frame.columns.get_loc('category')
+    out = frame.drop(columns=['category', 'subcategory'])
+    out.insert(i, 'category_id', codes)
+    return out
+
+
+def add_category(engine, uid, category, subcategory=''):
+    """Новая пара в словаре uid (для выбора в редакторе)."""
+    with engine.begin() as conn:
+        encode_frame(conn, uid, pd.DataFrame({'category': [category], 'subcategory': [subcategory]}))
+    get_category_cache().invalidate(uid)
@@ -0,0 +1,113 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# Колонки purchases, которые пользователь может менять в редакторе
+COMPARE_COLUMNS = ['category', 'subcategory', 'price', 'ts']
+
+
+@dataclass
+class Changeset:
+    """Разница между снимком из БД и отредактированной таблицей."""
+    inserts: pd.DataFrame                 # новые строки, без id
+    deletes: list = field(default_factory=list)  # id удалённых строк
+    updates: pd.DataFrame = None          # изменённые строки вместе с id
+    versions: dict = field(default_factory=dict)  # id -> version, с которой строку читали
+
+    @property
+    def empty(self):
+        return self.inserts.empty and not self.deletes and self.updates.empty
+
+    def __len__(self):
+        return len(self.inserts) + len(self.deletes) + len(self.updates)
+
+
+def _column_changed(old, new):
+    # Категориальные колонки с разным набором категорий напрямую не сравниваются
+    if isinstance(old.dtype, pd.CategoricalDtype) or isinstance(new.dtype, pd.CategoricalDtype):
+        old = old.astype(object)
+        new = new.astype(object)
+    # Цены сравниваем в копейках: float32 из компактной схемы и float64 из
+    # редактора (12.34 != 12.34), а в самом float32 правка на копейку у
+    # больших сумм теряется
+    elif old.dtype == 'float32' or new.dtype == 'float32':
+        old = (pd.to_numeric(old, errors='coerce').astype('float64') * 100).round()
+        new = (pd.to_numeric(new, errors='coerce').astype('float64') * 100).round()
+    both_missing = old.isna().to_numpy() & new.isna().to_numpy()
+    differs = (old != new).to_numpy()
+    return differs & ~both_missing
+
+
+def compute_changeset(orig, new, columns=COMPARE_COLUMNS, key='id'):
+    """Считает вставки, удаления и изменения за один выровненный проход.
+
+    NaN/NaT с обеих сторон считаются равными; строки без id — новые.
+    Если в orig есть version, для удалённых и изменённых строк запоминается
+    прочитанная версия — запись в БД проверит, что строку с тех пор не меняли.
+    """
+    orig_ids = orig[key]
+    new_ids = new[key]
+
+    # 1) Новые строки (id == NaN или не в orig)
+    is_new = new_ids.isna() | ~new_ids.isin(orig_ids.dropna())
+    inserts = new.loc[is_new].drop(columns=[key])
+
+    # 2) Удалённые (были в orig, нет в new)
+    gone = orig_ids.notna() & ~orig_ids.isin(new_ids.dropna())
+    deletes = orig_ids[gone].astype('int64').tolist()
+
+    # 3) Изменённые: общие id, сравниваем сразу все строки по колонкам
+    common = new.loc[~is_new]
+    common = common.loc[~common[key].duplicated()]
+    before = (
+        orig.loc[orig_ids.notna(), [key, *columns]]
+            .drop_duplicates(subset=key)
+            .set_index(key)
+            .reindex(common[key])
+    )
+    changed = np.zeros(len(common), dtype=bool)
+    for col in columns:
+        changed |= _column_changed(before[col], common[col].set_axis(before.index))
+    updates = common.loc[changed].reset_index(drop=True)
+    updates[key] = updates[key].astype('int64')
+
+    # 4) Версии строк на момент чтения (для оптимистичной блокировки)
+    versions = {}
+    if 'version' in orig:
+        read = orig.loc[orig_ids.notna()].drop_duplicates(subset=key).set_index(key)['version']
+        versions = read.reindex([*deletes, *updates[key]]).dropna().astype('int64').to_dict()
+
+    return Changeset(inserts=inserts, deletes=deletes, updates=updates, versions=versions)
+
+
+def touched_ids(changes, key='id'):
+    """id строк, которые changeset меняет или удаляет."""
+    return {*changes.deletes, *changes.updates[key].tolist()}
+
+
+def merge_changesets(changesets, key='id'):
+    """Сводит несколько Changeset в один; более поздние правки одного id побеждают.
+
+    Годится для правок одного редактора; сохранения разных вкладок с общими
+    id сливать нельзя — см. write_queue.
+
+    Для версии строки берётся самая ранняя прочитанная: если строку меняли
+    после первого чтения, запись всё равно уйдёт в конфликт.
+    """
+    changesets = list(changesets)
+    if not changesets:
+        empty = pd.DataFrame(columns=[key, *COMPARE_COLUMNS])
+        return Changeset(inserts=empty.drop(columns=[key]), deletes=[], updates=empty)
+    deletes = list(dict.fromkeys(i for c in changesets for i in c.deletes))
+    updates = pd.concat([c.updates for c in changesets], ignore_index=True)
+    updates = updates.drop_duplicates(subset=key, keep='last')
+    updates = updates.loc[~updates[key].isin(deletes)].reset_index(drop=True)
+    inserts = pd.concat([c.inserts for c in changesets], ignore_index=True)
+    versions = {}
+    for c in changesets:
+        for i, version in c.versions.items():
+            versions.setdefault(i, version)
+    touched = {*deletes, *updates[key]}
+    versions = {i: v for i, v in versions.items() if i in touched}
+    return Changeset(inserts=inserts, deletes=deletes, updates=updates, versions=versions)
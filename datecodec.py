@@ -0,0 +1,90 @@
+import re
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from schema import TEXT
+
+# Названия месяцев зашиты в код: locale.setlocale глобален для процесса
+# и не потокобезопасен, а Streamlit выполняет сессии в разных потоках
+MONTHS_GENITIVE = [
+    'января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+    'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря',
+]
+_MONTH_PREFIXES = {
+    'янв': 1, 'фев': 2, 'мар': 3, 'апр': 4, 'май': 5, 'мая': 5,
+    'июн': 6, 'июл': 7, 'авг': 8, 'сен': 9, 'окт': 10, 'ноя': 11, 'дек': 12,
+}
+
+_FORMATTERS = {
+    'short': lambda d: f'{d.day:02d}.{d.month:02d}.{d.year}',           # 14.06.2025
+    'long': lambda d: f'{d.day} {MONTHS_GENITIVE[d.month - 1]} {d.year}',  # 14 июня 2025
+}
+
+_DMY = re.compile(r'^\s*(\d{1,2})[./-](\d{1,2})[./-](\d{4})\s*$')
+_ISO = re.compile(r'^\s*(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T].*)?$')
+_WORDS = re.compile(r'^\s*(\d{1,2})\s+([а-яё]+)\.?\s+(\d{4})(?:\s*г\.?)?\s*$', re.IGNORECASE)
+
+
+def format_dates(ts, style='short'):
+    """Даты Series[datetime64] в строки ('short' — 14.06.2025, 'long' — 14 июня 2025).
+
+    Форматируется только каждый уникальный день, остальное — выборка по кодам
+    в Arrow; результат — строки TEXT (на pyarrow), NaT -> пропуск.
+    """
+    fmt = _FORMATTERS[style]
+    codes, days = pd.factorize(pd.to_datetime(ts).dt.normalize())
+    labels = pa.array([fmt(d) for d in days] + [None], pa.string())
+    codes[codes < 0] = len(days)  # NaT -> последняя метка (None)
+    return pd.Series(pd.array(labels.take(codes), dtype=TEXT), index=ts.index)
+
+
+def _parse_one(text):
+    for pattern, order in ((_DMY, 'dmy'), (_ISO, 'ymd'), (_WORDS, 'dmy')):
+        match = pattern.match(text)
+        if not match:
+            continue
+        first, second, third = match.groups()
+        if order == 'ymd':
+            year, month, day = int(first), int(second), int(third)
+        else:
+            day, year = int(first), int(third)
+            month = int(second) if second.isdigit() else _MONTH_PREFIXES.get(second[:3].lower())
+        try:
+            return date(year, month, day)
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def parse_dates(values):
+    """Строки дат в Series[datetime64]; понимает оба формата format_dates и ISO.
+
+    Каждая уникальная строка разбирается один раз; нераспознанное -> NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values.astype(object))
+    parsed = pd.to_datetime(
+        [_parse_one(v) if isinstance(v, str) else v for v in uniques], errors='coerce'
+    )
+    return pd.Series(np.append(parsed.to_numpy(), np.datetime64('NaT'))[codes],
+                     index=values.index, dtype='datetime64[ns]')
+
+
+def unparsed_dates(values, parsed=None):
+    """Маска непустых строк, которые parse_dates не разобрал (31.02.2025, опечатки)."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.Series(False, index=values.index)
+    parsed = parse_dates(values) if parsed is None else parsed
+    filled = values.astype('string').str.strip().fillna('') != ''
+    return (filled & parsed.isna()).astype(bool)
+
+
+def restore_time(parsed, original):
+    """Возвращает время суток из original там, где дата в редакторе не менялась."""
+    original = pd.to_datetime(original)
+    keep = parsed.notna() & (parsed == original.dt.normalize())
+    return original.where(keep, parsed)
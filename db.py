@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+
+import streamlit as st
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+import metrics
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    return value.strip().lower() in ('1', 'true', 'yes', 'on') if value else default
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool, который считает выдачи соединений и время ожидания."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._metrics_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+
+def create_pooled_engine(url=None):
+    """Движок с ограниченным пулом; параметры пула берутся из окружения.
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE (секунды)
+    и DB_POOL_PRE_PING (1/0).
+    """
+    engine = create_engine(
+        url or os.getenv("DATABASE_URL"),
+        poolclass=MeteredQueuePool,
+        pool_size=_env_int("DB_POOL_SIZE", 5),
+        max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+        pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+        pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+        pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+    )
+    event.listen(engine, "before_cursor_execute", metrics.count_query)  # запросы стадий, см. metrics.py
+    return engine
+
+
+@st.cache_resource
+def get_engine():
+    # Один движок и один пул на процесс, общий для всех сессий и перезапусков скрипта
+    engine = create_pooled_engine()
+    if engine.dialect.name == 'postgresql':
+        # Записи других воркеров и загрузчиков сбрасывают кэши этого процесса
+        from invalidation import Listener
+        Listener(engine.url).start()
+    return engine
+
+
+def pool_metrics(engine=None):
+    """Снимок состояния пула: занятые соединения, выдачи и ожидание."""
+    pool = (engine or get_engine()).pool
+    metrics = {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checked_in": pool.checkedin(),
+    }
+    if isinstance(pool, MeteredQueuePool):
+        metrics.update(
+            checkouts=pool.checkouts,
+            timeouts=pool.timeouts,
+            wait_total_s=round(pool.wait_total, 6),
+            wait_max_s=round(pool.wait_max, 6),
+            wait_avg_s=round(pool.wait_total / pool.checkouts, 6) if pool.checkouts else 0.0,
+        )
+    return metrics
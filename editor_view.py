@@ -0,0 +1,67 @@
+import pandas as pd
+
+from datecodec import format_dates, parse_dates, restore_time, unparsed_dates
+from schema import text_column
+
+# Колонки purchases -> заголовки редактора
+EDITOR_COLUMNS = {
+    'category': 'Категория',
+    'subcategory': 'Подкатегория',
+    'price': 'Цена',
+    'ts': 'Дата',
+}
+
+CONFLICT_LABELS = {
+    'action': {'update': 'изменение', 'delete': 'удаление'},
+    'state': {'changed': 'изменена', 'deleted': 'удалена'},
+}
+
+
+def to_editor(frame, date_style='short'):
+    """Вид для st.data_editor: русские заголовки и строковая «Дата».
+
+    Строится при показе страницы из компактного кадра; категории — текст,
+    а выпадающие списки задаёт страница из словаря категорий (categories.py):
+    у категориальной колонки редактор не дал бы выбрать подпись не из этой
+    страницы. Текстовые колонки — на pyarrow (schema.TEXT): Streamlit
+    передаёт их фронтенду как есть, без перекодирования object-строк в Arrow.
+    """
+    view = frame[['id', *EDITOR_COLUMNS]].assign(
+        category=text_column(frame['category']),
+        subcategory=text_column(frame['subcategory']),
+        ts=format_dates(frame['ts'], date_style),
+    )
+    return view.rename(columns=EDITOR_COLUMNS)
+
+
+def invalid_dates(edited):
+    """Строки вида редактора, чья «Дата» не пустая, но не разбирается."""
+    return edited.loc[unparsed_dates(edited[EDITOR_COLUMNS['ts']]).to_numpy()]
+
+
+def from_editor(edited, orig, uid):
+    """Обратно в колонки purchases; время суток берётся из orig, если дата не менялась.
+
+    Нераспознанная дата — ValueError: иначе она ушла бы в БД как NULL, а
+    покупка выпала бы из помесячных итогов. Пустая «Дата» остаётся пропуском.
+    """
+    new = edited.rename(columns={label: col for col, label in EDITOR_COLUMNS.items()})
+    parsed = parse_dates(new['ts'])
+    bad = unparsed_dates(new['ts'], parsed)
+    if bad.any():
+        raise ValueError(f"Не распознаны даты: {', '.join(map(str, new.loc[bad, 'ts'].unique()[:5]))}")
+    before = new['id'].map(orig.set_index('id')['ts'])
+    new = new.assign(ts=restore_time(parsed, before), user_id=uid)
+    return new
+
+
+def conflicts_view(report, date_style='short'):
+    """Отчёт persist.conflict_report для st.dataframe: что не записано и что в БД сейчас."""
+    view = report.assign(
+        action=report['action'].map(CONFLICT_LABELS['action']),
+        state=report['state'].map(CONFLICT_LABELS['state']),
+        ts=format_dates(pd.to_datetime(report['ts']), date_style),
+    )
+    return view[['id', 'action', 'state', *EDITOR_COLUMNS]].rename(columns={
+        'action': 'Ваша правка', 'state': 'Строка в базе', **EDITOR_COLUMNS,
+    })
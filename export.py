@@ -0,0 +1,139 @@
+"""Выгрузка покупок пользователя в CSV или Parquet кусками.
+
+Строки читаются серверным курсором (stream_results, partitions) по
+EXPORT_CHUNK_ROWS за раз и сразу превращаются в байты ответа: память на одну
+выгрузку не зависит от длины истории. HTTP-доступ — export_server.py.
+"""
+import io
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+from editor_view import EDITOR_COLUMNS
+
+EXPORT_COLUMNS = ['id', 'category', 'subcategory', 'price', 'ts']
+
+# Схема Parquet одна на все куски (типы не «плывут» от куска к куску)
+PARQUET_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('category', pa.string()),
+    ('subcategory', pa.string()),
+    ('price', pa.float64()),
+    ('ts', pa.timestamp('us')),
+])
+
+MEDIA_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def _chunk_rows():
+    return int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+
+
+def iter_frames(engine, uid, chunk_rows=None):
+    """Покупки uid по id кусками DataFrame; соединение занято до конца выгрузки."""
+    chunk_rows = chunk_rows or _chunk_rows()
+    with engine.connect() as conn:
+        # stream_results — серверный курсор; размер куска задаём явно в partitions()
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunk_rows).execute(
+            text("""
+                SELECT p.id,
+                       NULLIF(c.category, '') AS category,
+                       NULLIF(c.subcategory, '') AS subcategory,
+                       CAST(p.price AS DOUBLE PRECISION) AS price,  -- float, не Decimal на строку
+                       p.ts
+                FROM purchases AS p
+                LEFT JOIN purchase_categories AS c ON c.id = p.category_id
+                WHERE p.user_id = :uid
+                ORDER BY p.id
+            """),
+            {"uid": uid},
+        )
+        for rows in result.partitions(chunk_rows):
+            df = pd.DataFrame(rows, columns=EXPORT_COLUMNS)
+            yield df.assign(
+                price=pd.to_numeric(df['price'], errors='coerce').astype('float64').round(2),
+                ts=pd.to_datetime(df['ts'], errors='coerce'),
+            )
+
+
+def _to_arrow(df):
+    return pa.Table.from_pandas(df, schema=PARQUET_SCHEMA, preserve_index=False)
+
+
+def _csv_table(table):
+    # Дата и десятичная запятая форматируются в pyarrow (векторно, без
+    # построчного strftime в pandas.to_csv)
+    return pa.table({
+        'id': table['id'],
+        **{EDITOR_COLUMNS[col]: table[col] for col in ('category', 'subcategory')},
+        EDITOR_COLUMNS['price']: pc.replace_substring(pc.cast(table['price'], pa.string()), '.', ','),
+        # до секунд: иначе %S в arrow выводит и микросекунды
+        EDITOR_COLUMNS['ts']: pc.strftime(pc.cast(table['ts'], pa.timestamp('s'), safe=False),
+                                          format='%d.%m.%Y %H:%M:%S'),
+    })
+
+
+def csv_chunks(frames):
+    """CSV для Excel и обратного импорта (importer.py): «;», десятичная запятая, BOM."""
+    header = True
+    for df in frames:
+        buf = io.BytesIO()
+        if header:
+            buf.write('\ufeff'.encode('utf-8'))
+        pa_csv.write_csv(_csv_table(_to_arrow(df)), buf,
+                         pa_csv.WriteOptions(include_header=header, delimiter=';'))
+        yield buf.getvalue()
+        header = False
+    if header:  # пустая история — только заголовок
+        yield ('\ufeff' + ';'.join(['"id"', *(f'"{c}"' for c in EDITOR_COLUMNS.values())]) + '\n').encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    # Поток только на запись: отдаёт накопленные байты, но помнит общую
+    # позицию — по ней ParquetWriter пишет смещения row group в футер
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+
+def parquet_chunks(frames):
+    """Parquet: каждый кусок — отдельная row group, отдаётся сразу после записи."""
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, PARQUET_SCHEMA, compression='zstd') as writer:
+        for df in frames:
+            writer.write_table(_to_arrow(df))
+            yield sink.drain()
+    yield sink.drain()  # футер
+
+
+def export_chunks(engine, uid, fmt, chunk_rows=None):
+    """Байты выгрузки в формате fmt ('csv' или 'parquet') кусками."""
+    frames = iter_frames(engine, uid, chunk_rows)
+    if fmt == 'csv':
+        return csv_chunks(frames)
+    if fmt == 'parquet':
+        return parquet_chunks(frames)
+    raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
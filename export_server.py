@@ -0,0 +1,61 @@
+"""HTTP-выгрузка покупок: GET /export/purchases.{csv,parquet}?auth=<токен>.
+
+Отдельный процесс рядом со Streamlit (nginx проксирует /export сюда):
+
+    python -m export_server [--host 127.0.0.1] [--port 8502]
+
+Ответ отдаётся потоком (chunked) по мере чтения серверного курсора; генератор
+работает в пуле потоков Starlette, поэтому медленная выгрузка не задерживает
+другие запросы.
+"""
+import argparse
+
+from itsdangerous import BadSignature, SignatureExpired
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from auth import verify_token
+from db import create_pooled_engine
+from export import MEDIA_TYPES, export_chunks
+
+
+async def export_purchases(request):
+    fmt = request.path_params['fmt']
+    if fmt not in MEDIA_TYPES:
+        return PlainTextResponse("Неизвестный формат", status_code=404)
+    try:
+        uid, _ = verify_token(request.query_params.get('auth', ''))
+    except SignatureExpired:
+        return PlainTextResponse("Срок действия токена истёк", status_code=401)
+    except BadSignature:
+        return PlainTextResponse("Некорректный токен", status_code=403)
+    return StreamingResponse(
+        export_chunks(request.app.state.engine, uid, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="purchases.{fmt}"'},
+    )
+
+
+def create_app(engine=None):
+    app = Starlette(routes=[Route("/export/purchases.{fmt}", export_purchases)])
+    app.state.engine = engine or create_pooled_engine()
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(prog="python -m export_server", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    # access_log выключен: токен передаётся в query string и попал бы в лог
+    uvicorn.run(create_app(), host=args.host, port=args.port, access_log=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def frame_nbytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class FrameCache:
+    """Потокобезопасный LRU-кэш DataFrame'ов с TTL и лимитом по памяти.
+
+    Ключ — uid или кортеж, начинающийся с uid: invalidate(uid) сбрасывает все
+    записи пользователя. Для значений, которые не являются DataFrame, размер
+    считает sizeof. Просроченную запись get() не отдаёт; место она занимает,
+    пока её не заменит put() или не вытеснит LRU.
+    """
+
+    def __init__(self, max_bytes, ttl, sizeof=frame_nbytes):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # key -> (frame, nbytes, expires_at)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[2] < time.monotonic():
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, frame):
+        nbytes = self.sizeof(frame)
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            if nbytes > self.max_bytes:
+                return frame  # такой кадр вытеснил бы всех остальных
+            self._items[key] = (frame, nbytes, time.monotonic() + self.ttl)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._items)))
+        return frame
+
+    def invalidate(self, uid):
+        with self._lock:
+            for key in [k for k in self._items if k == uid or (isinstance(k, tuple) and k[0] == uid)]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+    def _drop(self, key):
+        _, nbytes, _ = self._items.pop(key)
+        self._bytes -= nbytes
@@ -0,0 +1,247 @@
+"""Потоковый импорт выгрузок банка и ФНС в purchases.
+
+Файл читается кусками по IMPORT_CHUNK_ROWS строк; каждый кусок нормализуется,
+заливается COPY во временную таблицу import_staging и переносится в purchases
+одним INSERT ... SELECT без строк, которые уже были у пользователя до импорта;
+категории — кодами словаря purchase_categories (categories.py).
+Весь импорт — одна транзакция; помесячные итоги правятся по вставленным id.
+"""
+import csv
+import io
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from bulk_write import WRITE_COLUMNS, insert_rows, lock_user
+from datecodec import parse_dates
+from invalidation import mark_origin
+from rollups import add_purchases
+
+# Заголовки выгрузок -> колонки purchases (сравнение без регистра и пробелов по краям)
+COLUMN_ALIASES = {
+    'category': ['category', 'категория', 'категория покупки'],
+    'subcategory': ['subcategory', 'подкатегория', 'описание', 'наименование', 'name'],
+    'price': ['price', 'цена', 'сумма', 'сумма операции', 'sum', 'amount'],
+    'ts': ['ts', 'дата', 'дата операции', 'дата и время', 'date', 'datetime'],
+}
+REQUIRED_COLUMNS = ['price', 'ts']
+
+# Форматы времени, которые пробуем векторно до разбора по одной строке
+_TS_FORMATS = ['%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', 'ISO8601']
+
+
+def _chunk_rows():
+    return int(os.getenv("IMPORT_CHUNK_ROWS", "50000"))
+
+
+@dataclass
+class ImportStats:
+    """Итог импорта (и промежуточный — для прогресса)."""
+    read: int = 0        # строк прочитано из файла
+    rejected: int = 0    # без цены или даты
+    duplicates: int = 0  # уже были у пользователя
+    inserted: int = 0
+    seconds: float = 0.0
+    fraction: float = None   # доля прочитанного файла, если её можно оценить
+    samples: list = field(default_factory=list)  # несколько отброшенных строк для показа
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.seconds if self.seconds else 0.0
+
+
+def _rename(df):
+    lookup = {alias: col for col, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    df = df.rename(columns=lambda c: lookup.get(str(c).strip().lower(), c))
+    missing = [c for c in REQUIRED_COLUMNS if c not in df]
+    if missing:
+        raise ValueError(f"В файле нет колонок: {', '.join(missing)}")
+    return df
+
+
+def read_chunks(file, name, chunk_rows=None):
+    """Куски DataFrame из CSV (; или ,) или Excel (.xlsx, нужен openpyxl)."""
+    chunk_rows = chunk_rows or _chunk_rows()
+    if name.lower().endswith(('.xlsx', '.xlsm')):
+        yield from _excel_chunks(file, chunk_rows)
+        return
+    # Разделитель угадываем по началу файла, дальше читает быстрый C-парсер
+    head = file.read(64 * 1024)
+    file.seek(0)
+    if isinstance(head, bytes):
+        head = head.decode('utf-8-sig', errors='ignore')
+    try:
+        sep = csv.Sniffer().sniff(head, delimiters=';,\t').delimiter
+    except csv.Error:
+        sep = ','
+    reader = pd.read_csv(file, sep=sep, dtype=str, chunksize=chunk_rows, encoding='utf-8-sig')
+    for chunk in reader:
+        yield _rename(chunk)
+
+
+def _excel_chunks(file, chunk_rows):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as exc:
+        raise ValueError("Для импорта Excel установите openpyxl") from exc
+    # read_only: строки листа читаются потоком, а не всей книгой в память
+    sheet = load_workbook(file, read_only=True, data_only=True).active
+    rows = sheet.iter_rows(values_only=True)
+    header = [str(h) if h is not None else '' for h in next(rows, [])]
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == chunk_rows:
+            yield _rename(pd.DataFrame(batch, columns=header))
+            batch = []
+    if batch:
+        yield _rename(pd.DataFrame(batch, columns=header))
+
+
+def parse_price(values):
+    """'1 234,50 ₽' -> 1234.5; нераспознанное -> NaN."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype('float64')
+    cleaned = (values.astype(str)
+               .str.replace(r'[\s ₽]|руб\.?', '', regex=True)
+               .str.replace(',', '.', regex=False))
+    return pd.to_numeric(cleaned, errors='coerce').round(2)
+
+
+def parse_ts(values):
+    """Дата со временем или без: векторные форматы, затем datecodec.parse_dates."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values.astype(object))
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
+    for fmt in _TS_FORMATS:
+        todo = parsed.isna()
+        if not todo.any():
+            break
+        parsed[todo] = pd.to_datetime(uniques[todo], format=fmt, errors='coerce')
+    todo = parsed.isna()
+    if todo.any():
+        parsed[todo] = parse_dates(uniques[todo])
+    return pd.Series(np.append(parsed.to_numpy(), np.datetime64('NaT'))[codes],
+                     index=values.index, dtype='datetime64[ns]')
+
+
+def _text(values):
+    # Обрезка пробелов; пустые строки -> None
+    stripped = values.astype('string').str.strip()
+    stripped = stripped.mask(stripped == '')
+    return stripped.astype(object).where(stripped.notna(), None)
+
+
+def normalize_chunk(chunk):
+    """(строки для вставки, отброшенные строки) в колонках WRITE_COLUMNS."""
+    rows = pd.DataFrame({
+        **{col: _text(chunk[col]) if col in chunk else pd.Series(None, index=chunk.index, dtype=object)
+           for col in ('category', 'subcategory')},
+        'price': parse_price(chunk['price']),
+        'ts': parse_ts(chunk['ts']),
+    }, index=chunk.index)[WRITE_COLUMNS]
+    valid = rows['price'].notna() & rows['ts'].notna()
+    return rows.loc[valid], chunk.loc[~valid]
+
+
+def _create_staging(conn):
+    on_commit = "ON COMMIT DROP" if conn.dialect.name == 'postgresql' else ""
+    conn.execute(text("DROP TABLE IF EXISTS import_staging"))
+    conn.execute(text(f"""
+        CREATE TEMP TABLE import_staging (
+            category    TEXT,
+            subcategory TEXT,
+            price       NUMERIC,
+            ts          TIMESTAMP
+        ) {on_commit}
+    """))
+
+
+def _move_staged(conn, uid, before_id):
+    # Новые пары категорий — в словарь одним INSERT ... SELECT DISTINCT
+    conn.execute(
+        text("""
+            INSERT INTO purchase_categories (user_id, category, subcategory)
+            SELECT DISTINCT :uid, COALESCE(category, ''), COALESCE(subcategory, '')
+              FROM import_staging
+             WHERE category IS NOT NULL OR subcategory IS NOT NULL
+            ON CONFLICT (user_id, category, subcategory) DO NOTHING
+        """),
+        {"uid": uid},
+    )
+    # Дубли — только с покупками, что были до импорта: одинаковые позиции
+    # одного чека внутри файла остаются. COALESCE вместо IS NOT DISTINCT FROM:
+    # так PostgreSQL выбирает hash anti join, а не перебор по индексу user_id
+    ids = conn.execute(
+        text("""
+            INSERT INTO purchases (user_id, category_id, price, ts)
+            SELECT :uid, c.id, s.price, s.ts
+              FROM import_staging AS s
+              LEFT JOIN purchase_categories AS c
+                ON c.user_id = :uid
+               AND c.category = COALESCE(s.category, '')
+               AND c.subcategory = COALESCE(s.subcategory, '')
+             WHERE NOT EXISTS (
+                   SELECT 1
+                     FROM purchases AS p
+                    WHERE p.user_id = :uid
+                      AND p.id <= :before_id
+                      AND p.ts = s.ts
+                      AND p.price = s.price
+                      AND COALESCE(p.category_id, 0) = COALESCE(c.id, 0)
+             )
+            RETURNING id
+        """),
+        {"uid": uid, "before_id": before_id},
+    ).scalars().all()
+    clear = "TRUNCATE import_staging" if conn.dialect.name == 'postgresql' else "DELETE FROM import_staging"
+    conn.execute(text(clear))
+    return ids
+
+
+def import_purchases(engine, uid, file, name, progress=None, chunk_rows=None):
+    """Импортирует файл покупок для uid; progress(stats) вызывается после каждого куска.
+
+    Возвращает ImportStats. Ошибка в любом куске откатывает весь импорт.
+    """
+    stats = ImportStats()
+    size = file_size(file)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        lock_user(conn, uid)   # импорт и сохранения uid из других воркеров — по очереди
+        mark_origin(conn)
+        before_id = conn.execute(text("SELECT COALESCE(max(id), 0) FROM purchases")).scalar()
+        _create_staging(conn)
+        for chunk in read_chunks(file, name, chunk_rows):
+            rows, rejected = normalize_chunk(chunk)
+            insert_rows(conn, rows, table='import_staging')  # COPY в PostgreSQL
+            ids = _move_staged(conn, uid, before_id)
+            add_purchases(conn, uid, ids)
+
+            stats.read += len(chunk)
+            stats.rejected += len(rejected)
+            stats.inserted += len(ids)
+            stats.duplicates += len(rows) - len(ids)
+            stats.samples.extend(rejected.head(5 - len(stats.samples)).to_dict('records'))
+            stats.seconds = time.perf_counter() - start
+            if size and not name.lower().endswith(('.xlsx', '.xlsm')):
+                stats.fraction = min(file.tell() / size, 1.0)
+            if progress:
+                progress(stats)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def file_size(file):
+    """Размер загруженного файла в байтах (для оценки прогресса)."""
+    if hasattr(file, 'size'):
+        return file.size
+    if isinstance(file, io.BytesIO):
+        return len(file.getbuffer())
+    return 0
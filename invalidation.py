@@ -0,0 +1,95 @@
+"""Сброс кэшей пользователя во всех воркерах через PostgreSQL LISTEN/NOTIFY.
+
+Кэши страниц и итогов живут в памяти процесса. Триггер на purchases
+(migrations/0005) после каждой записи шлёт в канал dash_invalidate строку
+«uid origin»; слушатель в каждом воркере сбрасывает кэши этого uid. Записи
+приложения помечаются origin своего процесса (mark_origin): свой процесс
+сбрасывает кэши сам после записи и уведомление пропускает. Загрузчики
+чеков origin не ставят — их записи сбрасывают кэши везде.
+"""
+import logging
+import os
+import select
+import socket
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from analytics import get_analytics_cache
+from pagination import get_page_cache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'dash_invalidate'
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}"
+RETRY_SECONDS = 5
+
+
+def mark_origin(conn):
+    """Помечает записи этой транзакции как сделанные текущим процессом."""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("SELECT set_config('dash.origin', :origin, true)"), {"origin": ORIGIN})
+
+
+def invalidate_user(uid=None):
+    """Сбрасывает кэши uid (все — при None)."""
+    for cache in (get_page_cache(), get_analytics_cache()):
+        if uid is None:
+            cache.clear()
+        else:
+            cache.invalidate(uid)
+
+
+def handle(payload):
+    uid, _, origin = payload.partition(' ')
+    if origin != ORIGIN:
+        invalidate_user(int(uid))
+
+
+class Listener(threading.Thread):
+    """Поток с отдельным соединением (вне пула), ждущий уведомлений канала."""
+
+    def __init__(self, url):
+        super().__init__(name='invalidation', daemon=True)
+        # Свой движок без пула: соединение занято LISTEN всё время жизни процесса
+        self.engine = create_engine(url, poolclass=NullPool)
+        self.received = 0
+
+    def run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Слушатель %s отключился, переподключение", CHANNEL)
+                time.sleep(RETRY_SECONDS)
+
+    def _listen(self):
+        raw = self.engine.raw_connection()
+        try:
+            dbapi_conn = raw.driver_connection
+            dbapi_conn.autocommit = True
+            with dbapi_conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+            # Пока соединения не было, уведомления терялись — сбрасываем всё
+            invalidate_user()
+            if self.engine.dialect.driver == 'psycopg2':
+                while True:
+                    if select.select([dbapi_conn], [], [], 60) != ([], [], []):
+                        dbapi_conn.poll()
+                        while dbapi_conn.notifies:
+                            self._handle(dbapi_conn.notifies.pop(0).payload)
+            else:  # psycopg 3
+                for notify in dbapi_conn.notifies():
+                    self._handle(notify.payload)
+        finally:
+            raw.close()
+
+    def _handle(self, payload):
+        self.received += 1
+        try:
+            handle(payload)
+        except ValueError:
+            logger.warning("Непонятное уведомление %s: %r", CHANNEL, payload)
+
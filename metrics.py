@@ -0,0 +1,275 @@
+"""Замеры стадий перезапуска: время, строки и SQL-запросы.
+
+    rerun = metrics.start_rerun('app')
+    with metrics.stage('load') as s:
+        df = load_page(...)
+        s.rows = len(df)
+    ...
+    metrics.finish_rerun()
+
+Тело st.fragment оборачивается в metrics.fragment(...): перезапуски одного
+фрагмента замеряются отдельно. Замеряется доля METRICS_SAMPLE перезапусков
+(0 — выключено, 1 — все), а также каждый перезапуск с открытой панелью
+отладки. Итоги по стадиям копятся в процессе и отдаются в формате
+Prometheus: файлом METRICS_TEXTFILE (для textfile-коллектора node_exporter;
+у каждого воркера свой файл и метка worker из DASH_WORKER) и в панели
+отладки. METRICS_LOG=1 пишет строку на каждый замеренный перезапуск в лог
+«metrics».
+"""
+import contextlib
+import logging
+import os
+import random
+import threading
+import time
+
+import streamlit as st
+
+logger = logging.getLogger("metrics")
+
+STAGES = ['auth', 'load', 'transform', 'render', 'diff', 'write']
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TEXTFILE_INTERVAL = 15  # секунд между перезаписями METRICS_TEXTFILE
+
+
+def _env_flag(name):
+    return os.getenv(name, "").strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def sample_rate():
+    return float(os.getenv("METRICS_SAMPLE", "0"))
+
+
+class Registry:
+    """Накопительные гистограммы по стадиям, общие для процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self.reruns = 0
+
+    def observe(self, stage, seconds, rows=0, queries=0):
+        with self._lock:
+            s = self._stages.setdefault(stage, {
+                "count": 0, "sum": 0.0, "rows": 0, "queries": 0, "buckets": [0] * len(BUCKETS),
+            })
+            s["count"] += 1
+            s["sum"] += seconds
+            s["rows"] += rows or 0
+            s["queries"] += queries
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    s["buckets"][i] += 1
+
+    def count_rerun(self):
+        with self._lock:
+            self.reruns += 1
+
+    def prometheus(self):
+        """Текст в формате экспозиции Prometheus."""
+        with self._lock:
+            stages = {name: {**s, "buckets": list(s["buckets"])} for name, s in self._stages.items()}
+            reruns = self.reruns
+        # Несколько воркеров на хосте пишут каждый свой файл; метка их различает
+        worker = f'worker="{os.environ["DASH_WORKER"]}",' if os.getenv("DASH_WORKER") else ""
+        lines = [
+            "# HELP dash_stage_seconds Время стадии перезапуска",
+            "# TYPE dash_stage_seconds histogram",
+        ]
+        for name, s in stages.items():
+            for bound, n in zip(BUCKETS, s["buckets"]):
+                lines.append(f'dash_stage_seconds_bucket{{{worker}stage="{name}",le="{bound}"}} {n}')
+            lines.append(f'dash_stage_seconds_bucket{{{worker}stage="{name}",le="+Inf"}} {s["count"]}')
+            lines.append(f'dash_stage_seconds_sum{{{worker}stage="{name}"}} {s["sum"]:.6f}')
+            lines.append(f'dash_stage_seconds_count{{{worker}stage="{name}"}} {s["count"]}')
+        lines += ["# HELP dash_stage_rows_total Строк обработано стадией",
+                  "# TYPE dash_stage_rows_total counter"]
+        lines += [f'dash_stage_rows_total{{{worker}stage="{name}"}} {s["rows"]}' for name, s in stages.items()]
+        lines += ["# HELP dash_stage_queries_total SQL-запросов за стадию",
+                  "# TYPE dash_stage_queries_total counter"]
+        lines += [f'dash_stage_queries_total{{{worker}stage="{name}"}} {s["queries"]}' for name, s in stages.items()]
+        lines += ["# HELP dash_reruns_sampled_total Замеренных перезапусков",
+                  "# TYPE dash_reruns_sampled_total counter",
+                  f"dash_reruns_sampled_total{{{worker.rstrip(',')}}} {reruns}"]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+_local = threading.local()
+_textfile_lock = threading.Lock()
+_textfile_written = 0.0
+
+
+def count_query(*args):
+    # Слушатель before_cursor_execute движка приложения (его подключает
+    # db.create_pooled_engine — metrics не импортирует SQLAlchemy сам).
+    # Запросы считаются в потоке скрипта; фоновые сохранения сюда не попадают
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun.queries += 1
+
+
+class StageRecord:
+    """Время, строки и запросы одной стадии; rows заполняет вызывающий код."""
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.rows = None
+        self.queries = 0
+
+
+class Rerun:
+    """Замер одного перезапуска страницы."""
+
+    def __init__(self, page):
+        self.page = page
+        self.stages = []
+        self.queries = 0
+        self.started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # Несколько блоков одной стадии (например, load до и после виджетов
+        # фильтра) складываются в одну запись
+        record = next((r for r in self.stages if r.name == name), None)
+        if record is None:
+            record = StageRecord(name)
+            self.stages.append(record)
+        queries = self.queries
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds += time.perf_counter() - start
+            record.queries += self.queries - queries
+
+    def summary(self):
+        parts = [f"page={self.page}", f"total={(time.perf_counter() - self.started) * 1000:.0f}ms"]
+        for s in self.stages:
+            rows = f"/{s.rows}rows" if s.rows is not None else ""
+            parts.append(f"{s.name}={s.seconds * 1000:.1f}ms/{s.queries}q{rows}")
+        return " ".join(parts)
+
+
+def start_rerun(page, force=False):
+    """Начинает замер перезапуска; None, если он не попал в выборку."""
+    rate = sample_rate()
+    rerun = Rerun(page) if force or (rate > 0 and random.random() < rate) else None
+    _local.rerun = rerun
+    _local.active = True   # прогон идёт, даже если не попал в выборку
+    return rerun
+
+
+def current():
+    return getattr(_local, "rerun", None)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Замер стадии текущего перезапуска; вне выборки — пустая запись без замера."""
+    rerun = current()
+    if rerun is None:
+        yield StageRecord(name)
+        return
+    with rerun.stage(name) as record:
+        yield record
+
+
+def observe(name, seconds, rows=0):
+    """Замер вне перезапуска (фоновая запись) — сразу в реестр, с той же выборкой."""
+    rate = sample_rate()
+    if rate > 0 and random.random() < rate:
+        REGISTRY.observe(name, seconds, rows)
+
+
+def finish_rerun():
+    """Итоги перезапуска — в реестр, лог и METRICS_TEXTFILE.
+
+    Вызывать в конце скрипта и перед st.rerun(): после st.stop() замер теряется.
+    """
+    rerun = current()
+    _local.rerun = None
+    _local.active = False
+    if rerun is None:
+        return None
+    for record in rerun.stages:
+        REGISTRY.observe(record.name, record.seconds, record.rows, record.queries)
+    REGISTRY.count_rerun()
+    if _env_flag("METRICS_LOG"):
+        logger.info("rerun %s", rerun.summary())
+    _write_textfile()
+    return rerun
+
+
+@contextlib.contextmanager
+def fragment(page, force=False):
+    """Замер тела st.fragment; отдаёт свой Rerun или None.
+
+    Внутри полного прогона фрагмент — часть его замера (None). Перезапуск
+    одного фрагмента скрипт сверху не проходит, поэтому замеряется здесь
+    отдельно, с меткой page.
+    """
+    if getattr(_local, "active", False):
+        yield None
+        return
+    rerun = start_rerun(page, force)
+    try:
+        yield rerun
+    finally:
+        finish_rerun()
+
+
+def _write_textfile():
+    global _textfile_written
+    path = os.getenv("METRICS_TEXTFILE")
+    if not path:
+        return
+    with _textfile_lock:
+        now = time.monotonic()
+        if now - _textfile_written < TEXTFILE_INTERVAL:
+            return
+        _textfile_written = now
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(REGISTRY.prometheus())
+        os.replace(tmp, path)  # коллектор не увидит файл наполовину записанным
+
+
+def debug_requested(query_params):
+    """Панель отладки: разрешена METRICS_DEBUG=1 и включена ?debug=1."""
+    return _env_flag("METRICS_DEBUG") and query_params.get("debug") == "1"
+
+
+def debug_panel(rerun, engine):
+    """Стадии этого перезапуска, пул соединений, кэши и накопленные метрики."""
+    import pandas as pd
+
+    from analytics import get_analytics_cache
+    from categories import get_category_cache
+    from db import pool_metrics
+    from pagination import get_page_cache
+    from write_queue import get_write_queue
+
+    with st.expander("🛠 Отладка: стадии перезапуска", expanded=True):
+        st.dataframe(pd.DataFrame(
+            [{"стадия": r.name, "мс": round(r.seconds * 1000, 1), "строк": r.rows, "запросов": r.queries}
+             for r in rerun.stages]
+        ), hide_index=True)
+        st.caption(f"Всего: {(time.perf_counter() - rerun.started) * 1000:.0f} мс, "
+                   f"запросов: {rerun.queries}")
+        caches = {
+            "pages": get_page_cache().stats(),
+            "analytics": get_analytics_cache().stats(),
+            "categories": get_category_cache().stats(),
+        }
+        st.json({"pool": pool_metrics(engine), "caches": caches, "save_queue": get_write_queue().stats()},
+                expanded=False)
+        st.code(REGISTRY.prometheus(), language="text")
+
+
+if _env_flag("METRICS_LOG") and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
@@ -0,0 +1,235 @@
+"""Миграции схемы PostgreSQL: migrations/NNNN_*.sql по порядку, учёт в schema_migrations.
+
+    python -m migrate                    # применить новые миграции
+    python -m migrate status             # применённые и ожидающие
+    python -m migrate partition hash [--partitions 16] [--apply]
+    python -m migrate partition month [--ahead 12] [--apply]
+
+Каждая миграция — своя транзакция вместе с записью в schema_migrations.
+Файл, первая строка которого «-- migrate: no-transaction», выполняется вне
+транзакции (для CREATE INDEX CONCURRENTLY) и должен содержать один оператор.
+0001 и 0002 идемпотентны, поэтому на базе, где их применяли вручную, первый
+запуск проходит без ошибок. Параллельные запуски (dash-migrate.service и
+ручной) ждут друг друга на advisory-блокировке.
+
+partition печатает SQL перевода purchases на секционирование; --apply
+выполняет его одной транзакцией под ACCESS EXCLUSIVE — это простой записи
+на всё время копирования, запускайте в окно обслуживания.
+"""
+import argparse
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy import text
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / 'migrations'
+NO_TRANSACTION = '-- migrate: no-transaction'
+LOCK_KEY = 0x6d696772  # 'migr' — ключ pg_advisory_lock для запусков migrate
+COVERING_INDEX = "(user_id, ts, id) INCLUDE (category_id, price, version)"
+
+
+def migration_files():
+    """[(version, path)] по порядку имён файлов; version — имя без .sql."""
+    return [(path.stem, path) for path in sorted(MIGRATIONS_DIR.glob('[0-9][0-9][0-9][0-9]_*.sql'))]
+
+
+def _ensure_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    TEXT        PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """))
+
+
+def applied_versions(conn):
+    _ensure_table(conn)
+    return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def pending(engine):
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    return [(version, path) for version, path in migration_files() if version not in done]
+
+
+def _run_script(conn, sql):
+    # Курсор DBAPI без параметров: «%» в комментариях не считается плейсхолдером
+    with conn.connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+def _apply(engine, version, path):
+    sql = path.read_text()
+    if sql.lstrip().startswith(NO_TRANSACTION):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            _run_script(conn, sql)
+            conn.execute(text("INSERT INTO schema_migrations (version) VALUES (:v)"), {"v": version})
+    else:
+        with engine.begin() as conn:
+            _run_script(conn, sql)
+            conn.execute(text("INSERT INTO schema_migrations (version) VALUES (:v)"), {"v": version})
+
+
+def migrate(engine, log=print):
+    """Применяет ожидающие миграции; возвращает список применённых версий."""
+    if engine.dialect.name != 'postgresql':
+        raise ValueError("Миграции написаны для PostgreSQL")
+    # Сессионная блокировка на отдельном соединении: держится между транзакциями миграций
+    with engine.connect() as lock:
+        lock.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+        lock.commit()
+        try:
+            applied = []
+            for version, path in pending(engine):
+                log(f"применяется {version}")
+                _apply(engine, version, path)
+                applied.append(version)
+            return applied
+        finally:
+            lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+            lock.commit()
+
+
+# ─── Секционирование purchases ───────────────────────────────────────────────
+def _months(first, last):
+    month = date(first.year, first.month, 1)
+    while month <= last:
+        following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        yield month, following
+        month = following
+
+
+def partition_sql(conn, kind, partitions=16, ahead=12):
+    """SQL перевода purchases в секционированную таблицу с копированием данных.
+
+    hash  — PARTITION BY HASH (user_id), первичный ключ (user_id, id): все
+            запросы фильтруют по user_id и читают одну секцию.
+    month — PARTITION BY RANGE (ts) по месяцам от первой покупки до ahead
+            месяцев вперёд и секция DEFAULT (покупки без ts и вне диапазона).
+            Ключ секционирования должен входить в первичный ключ, а ts может
+            быть NULL, поэтому id уникален только благодаря последовательности
+            (индекс по id — не уникальный). Чтения пользователя обходят все
+            секции, а из-за DEFAULT страница по ts сортируется поверх них —
+            для этого приложения предпочтительнее hash. Секции новых месяцев
+            создаются вручную.
+    Старая таблица остаётся как purchases_unpartitioned — удалите её после проверки.
+    """
+    seq = conn.execute(text("SELECT pg_get_serial_sequence('purchases', 'id')")).scalar()
+    lines = [
+        "LOCK TABLE purchases IN ACCESS EXCLUSIVE MODE;",
+    ]
+    if kind == 'hash':
+        lines.append("CREATE TABLE purchases_new (LIKE purchases INCLUDING DEFAULTS) PARTITION BY HASH (user_id);")
+        parts = {
+            f"purchases_h{i:02d}": f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"
+            for i in range(partitions)
+        }
+        keys = ["ALTER TABLE purchases_new ADD PRIMARY KEY (user_id, id);"]
+    elif kind == 'month':
+        first = conn.execute(text("SELECT min(ts) FROM purchases")).scalar() or date.today()
+        today = date.today()
+        last = date(today.year + (today.month - 1 + ahead) // 12, (today.month - 1 + ahead) % 12 + 1, 1)
+        lines.append("CREATE TABLE purchases_new (LIKE purchases INCLUDING DEFAULTS) PARTITION BY RANGE (ts);")
+        parts = {
+            f"purchases_m{start:%Y%m}": f"FOR VALUES FROM ('{start}') TO ('{end}')"
+            for start, end in _months(first, last)
+        }
+        parts["purchases_default"] = "DEFAULT"
+        keys = ["CREATE INDEX purchases_new_id_idx ON purchases_new (id);"]
+    else:
+        raise ValueError(f"Неизвестный вид секционирования: {kind}")
+    lines += [f"CREATE TABLE {name} PARTITION OF purchases_new {bounds};" for name, bounds in parts.items()]
+    # Индексы — после копирования: так заливка быстрее
+    lines += [
+        "INSERT INTO purchases_new SELECT * FROM purchases;",
+        *keys,
+        f"CREATE INDEX purchases_new_user_ts_idx ON purchases_new {COVERING_INDEX};",
+        "ALTER TABLE purchases_new ADD FOREIGN KEY (category_id) REFERENCES purchase_categories (id);",
+        "DROP TRIGGER IF EXISTS purchases_bump_version ON purchases;",
+        "DROP TRIGGER IF EXISTS purchases_encode_category ON purchases;",
+        *[f"DROP TRIGGER IF EXISTS purchases_{kind}_{event} ON purchases;"
+          for kind in ('notify', 'rollup') for event in ('insert', 'update', 'delete')],
+        "ALTER TABLE purchases RENAME TO purchases_unpartitioned;",
+        "ALTER INDEX IF EXISTS purchases_user_ts_category_idx RENAME TO purchases_unpartitioned_user_ts_category_idx;",
+        "ALTER TABLE purchases_new RENAME TO purchases;",
+        "ALTER INDEX purchases_new_user_ts_idx RENAME TO purchases_user_ts_category_idx;",
+    ]
+    if seq:
+        # Иначе последовательность id удалится вместе со старой таблицей
+        lines.append(f"ALTER SEQUENCE {seq} OWNED BY purchases.id;")
+    lines.append("CREATE TRIGGER purchases_bump_version BEFORE UPDATE ON purchases "
+                 "FOR EACH ROW EXECUTE FUNCTION purchases_bump_version();")
+    # Текст от загрузчиков чеков -> словарь категорий (0006)
+    lines.append("CREATE TRIGGER purchases_encode_category BEFORE INSERT OR UPDATE OF category, subcategory "
+                 "ON purchases FOR EACH ROW WHEN (NEW.category IS NOT NULL OR NEW.subcategory IS NOT NULL) "
+                 "EXECUTE FUNCTION purchases_encode_category();")
+    # Уведомления для сброса кэшей воркеров (0005)
+    lines += [
+        f"CREATE TRIGGER purchases_notify_{event.lower()} AFTER {event} ON purchases "
+        f"REFERENCING {'OLD' if event == 'DELETE' else 'NEW'} TABLE AS {'old' if event == 'DELETE' else 'new'}_rows "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION purchases_notify();"
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    ]
+    # Итоги для записей загрузчиков чеков (0010)
+    rollup_tables = {'INSERT': 'NEW TABLE AS new_rows', 'UPDATE': 'OLD TABLE AS old_rows NEW TABLE AS new_rows',
+                     'DELETE': 'OLD TABLE AS old_rows'}
+    lines += [
+        f"CREATE TRIGGER purchases_rollup_{event.lower()} AFTER {event} ON purchases "
+        f"REFERENCING {tables} FOR EACH STATEMENT EXECUTE FUNCTION purchases_rollup();"
+        for event, tables in rollup_tables.items()
+    ]
+    # Параметры autovacuum из 0004 у секционированной таблицы задаются каждой секции
+    lines += [
+        f"ALTER TABLE {name} SET (autovacuum_vacuum_scale_factor = 0.01, "
+        f"autovacuum_vacuum_insert_scale_factor = 0.01, autovacuum_analyze_scale_factor = 0.01);"
+        for name in parts
+    ]
+    lines.append("ANALYZE purchases;")
+    return "\n".join(lines)
+
+
+def partition(engine, kind, partitions=16, ahead=12, apply=False):
+    """Возвращает SQL секционирования; с apply=True ещё и выполняет его."""
+    if pending(engine):
+        raise ValueError("Сначала примените миграции: python -m migrate")
+    with engine.begin() as conn:
+        sql = partition_sql(conn, kind, partitions, ahead)
+        if apply:
+            _run_script(conn, sql)
+    return sql
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    from db import create_pooled_engine
+
+    parser = argparse.ArgumentParser(prog="python -m migrate", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("up", help="применить новые миграции (по умолчанию)")
+    commands.add_parser("status", help="применённые и ожидающие миграции")
+    partition_cmd = commands.add_parser("partition", help="секционировать purchases")
+    partition_cmd.add_argument("kind", choices=["hash", "month"])
+    partition_cmd.add_argument("--partitions", type=int, default=16, help="секций для hash")
+    partition_cmd.add_argument("--ahead", type=int, default=12, help="месяцев вперёд для month")
+    partition_cmd.add_argument("--apply", action="store_true", help="выполнить, а не только напечатать")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    engine = create_pooled_engine()
+    if args.command == "status":
+        waiting = {version for version, _ in pending(engine)}
+        for version, _ in migration_files():
+            print(f"{'ожидает   ' if version in waiting else 'применена '} {version}")
+    elif args.command == "partition":
+        print(partition(engine, args.kind, args.partitions, args.ahead, args.apply))
+        if args.apply:
+            print("-- выполнено; старая таблица: purchases_unpartitioned")
+    else:
+        applied = migrate(engine)
+        print(f"применено миграций: {len(applied)}")
+
+
+if __name__ == '__main__':
+    main()
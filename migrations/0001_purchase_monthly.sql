@@ -0,0 +1,13 @@
+-- Помесячные итоги покупок пользователя: аналитика читает сотни строк вместо всей истории.
+-- Поддерживается инкрементально при сохранении (rollups.py), полная пересборка:
+--   python -m rollups rebuild [--uid UID]
+-- Покупки без ts в итоги не попадают; пустые категории хранятся как ''.
+CREATE TABLE IF NOT EXISTS purchase_monthly (
+    user_id     BIGINT  NOT NULL,
+    month       DATE    NOT NULL,
+    category    TEXT    NOT NULL DEFAULT '',
+    subcategory TEXT    NOT NULL DEFAULT '',
+    total       NUMERIC NOT NULL DEFAULT 0,
+    purchases   BIGINT  NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month, category, subcategory)
+);
@@ -0,0 +1,24 @@
+-- Версия строки purchases для оптимистичной блокировки: редактор пишет
+-- UPDATE/DELETE только если version в БД совпадает с прочитанной, иначе
+-- строка возвращается пользователю как конфликт (bulk_write.py).
+-- Триггер повышает version при любом UPDATE — и из приложения, и из загрузчиков
+-- чеков, которые о версиях не знают.
+ALTER TABLE purchases
+    ADD COLUMN IF NOT EXISTS version    BIGINT      NOT NULL DEFAULT 1,
+    ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION purchases_bump_version() RETURNS trigger AS $$
+BEGIN
+    -- Приложение само пишет version = version + 1; повторно не повышаем
+    IF NEW.version IS NOT DISTINCT FROM OLD.version THEN
+        NEW.version := OLD.version + 1;
+    END IF;
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS purchases_bump_version ON purchases;
+CREATE TRIGGER purchases_bump_version
+    BEFORE UPDATE ON purchases
+    FOR EACH ROW EXECUTE FUNCTION purchases_bump_version();
@@ -0,0 +1,12 @@
+-- migrate: no-transaction
+-- Покрывающий индекс для всех чтений purchases по пользователю: снимок
+-- редактора, отпечаток count/checksum, страницы (ORDER BY ts, id), count и
+-- список фильтров читаются index-only scan без обращения к таблице.
+-- id — последний ключ, чтобы порядок «ts, id» страницы отдавал сам индекс;
+-- version — в INCLUDE, её читают снимок и страницы. Этот же индекс ищет
+-- дубли при импорте (user_id, ts).
+-- CONCURRENTLY не блокирует запись на время построения. Если построение
+-- прервалось, индекс остаётся INVALID: DROP INDEX purchases_user_ts_idx
+-- и снова python -m migrate.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS purchases_user_ts_idx
+    ON purchases (user_id, ts, id) INCLUDE (category, subcategory, price, version);
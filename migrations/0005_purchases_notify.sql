@@ -0,0 +1,38 @@
+-- Уведомление о записи в purchases для сброса кэшей во всех воркерах
+-- (invalidation.py): на каждый затронутый user_id — NOTIFY dash_invalidate
+-- с «uid origin». origin ставит приложение (set_config('dash.origin', ...,
+-- true)); у загрузчиков чеков он пустой. Триггеры на оператор, а не на строку:
+-- импорт в 100k строк даёт одно уведомление, а не 100k.
+CREATE OR REPLACE FUNCTION purchases_notify() RETURNS trigger AS $$
+DECLARE
+    origin TEXT := coalesce(current_setting('dash.origin', true), '');
+    uid    BIGINT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        FOR uid IN SELECT DISTINCT user_id FROM old_rows LOOP
+            PERFORM pg_notify('dash_invalidate', uid || ' ' || origin);
+        END LOOP;
+    ELSE
+        FOR uid IN SELECT DISTINCT user_id FROM new_rows LOOP
+            PERFORM pg_notify('dash_invalidate', uid || ' ' || origin);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Таблицы переходов допускаются только у триггера на одно событие
+DROP TRIGGER IF EXISTS purchases_notify_insert ON purchases;
+CREATE TRIGGER purchases_notify_insert
+    AFTER INSERT ON purchases REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION purchases_notify();
+
+DROP TRIGGER IF EXISTS purchases_notify_update ON purchases;
+CREATE TRIGGER purchases_notify_update
+    AFTER UPDATE ON purchases REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION purchases_notify();
+
+DROP TRIGGER IF EXISTS purchases_notify_delete ON purchases;
+CREATE TRIGGER purchases_notify_delete
+    AFTER DELETE ON purchases REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION purchases_notify();
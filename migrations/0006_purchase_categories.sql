@@ -0,0 +1,46 @@
+-- Словарь категорий: пара (category, subcategory) хранится один раз на
+-- пользователя, purchases ссылается на неё целым category_id (categories.py).
+-- NULL — без категории и подкатегории; пустая пара в словарь не попадает.
+-- Записи словаря не меняются и не удаляются: воркеры кэшируют карту
+-- код -> подписи и перечитывают её, только встретив незнакомый код.
+CREATE TABLE IF NOT EXISTS purchase_categories (
+    id          SERIAL PRIMARY KEY,
+    user_id     BIGINT NOT NULL,
+    category    TEXT   NOT NULL DEFAULT '',
+    subcategory TEXT   NOT NULL DEFAULT '',
+    UNIQUE (user_id, category, subcategory)
+);
+
+ALTER TABLE purchases
+    ADD COLUMN IF NOT EXISTS category_id INTEGER REFERENCES purchase_categories (id);
+
+-- Колонки category/subcategory остаются (NULL после 0007) — в них пишут
+-- загрузчики чеков: триггер ниже переносит текст в словарь на лету. Он
+-- создаётся до переноса старых строк (0007), чтобы новые записи уже шли с кодом.
+CREATE OR REPLACE FUNCTION purchases_encode_category() RETURNS trigger AS $$
+DECLARE
+    cat TEXT := btrim(coalesce(NEW.category, ''));
+    sub TEXT := btrim(coalesce(NEW.subcategory, ''));
+BEGIN
+    IF cat = '' AND sub = '' THEN
+        NEW.category_id := NULL;
+    ELSE
+        INSERT INTO purchase_categories (user_id, category, subcategory)
+        VALUES (NEW.user_id, cat, sub)
+        ON CONFLICT (user_id, category, subcategory) DO NOTHING;
+        SELECT id INTO NEW.category_id
+          FROM purchase_categories
+         WHERE user_id = NEW.user_id AND category = cat AND subcategory = sub;
+    END IF;
+    NEW.category := NULL;
+    NEW.subcategory := NULL;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS purchases_encode_category ON purchases;
+CREATE TRIGGER purchases_encode_category
+    BEFORE INSERT OR UPDATE OF category, subcategory ON purchases
+    FOR EACH ROW
+    WHEN (NEW.category IS NOT NULL OR NEW.subcategory IS NOT NULL)
+    EXECUTE FUNCTION purchases_encode_category();
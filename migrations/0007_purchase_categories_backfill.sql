@@ -0,0 +1,46 @@
+-- migrate: no-transaction
+-- Перенос текста категорий purchases в словарь (0006) пачками по id, каждая —
+-- своя транзакция: миграция идёт из ExecStartPre каждого воркера, и одна
+-- транзакция на всю таблицу держала бы загрузчики чеков всё время переноса.
+-- Версии строк не повышаем (значения для пользователя не меняются), и
+-- уведомления о записи (0005) не шлём: purchases_bump_version и
+-- purchases_notify_update выключаются внутри транзакции пачки и включаются
+-- до её коммита — другие сеансы их выключенными не видят, а их запись ждёт
+-- не дольше одной пачки. Прерванный перенос продолжается со следующего
+-- запуска: строки с текстом ещё не перенесены.
+DO $$
+DECLARE
+    batch CONSTANT BIGINT := 50000;
+    lo    BIGINT;
+    hi    BIGINT;
+BEGIN
+    INSERT INTO purchase_categories (user_id, category, subcategory)
+    SELECT DISTINCT user_id, btrim(coalesce(category, '')), btrim(coalesce(subcategory, ''))
+      FROM purchases
+     WHERE btrim(coalesce(category, '')) <> '' OR btrim(coalesce(subcategory, '')) <> ''
+    ON CONFLICT (user_id, category, subcategory) DO NOTHING;
+    COMMIT;
+
+    SELECT min(id), max(id) INTO lo, hi
+      FROM purchases
+     WHERE category IS NOT NULL OR subcategory IS NOT NULL;
+    WHILE lo <= hi LOOP
+        ALTER TABLE purchases DISABLE TRIGGER purchases_bump_version;
+        ALTER TABLE purchases DISABLE TRIGGER purchases_notify_update;
+        UPDATE purchases AS p
+           SET category_id = c.id, category = NULL, subcategory = NULL
+          FROM purchase_categories AS c
+         WHERE p.id >= lo AND p.id < lo + batch
+           AND c.user_id = p.user_id
+           AND c.category = btrim(coalesce(p.category, ''))
+           AND c.subcategory = btrim(coalesce(p.subcategory, ''));
+        UPDATE purchases SET category = NULL, subcategory = NULL   -- одни пробелы
+         WHERE id >= lo AND id < lo + batch
+           AND (category IS NOT NULL OR subcategory IS NOT NULL);
+        ALTER TABLE purchases ENABLE TRIGGER purchases_bump_version;
+        ALTER TABLE purchases ENABLE TRIGGER purchases_notify_update;
+        COMMIT;
+        lo := lo + batch;
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,3 @@
+-- migrate: no-transaction
+-- Индекс 0003 заменён purchases_user_ts_category_idx (0008).
+DROP INDEX CONCURRENTLY IF EXISTS purchases_user_ts_idx;
@@ -0,0 +1,64 @@
+-- Помесячные итоги для записей в обход приложения: загрузчики чеков пишут в
+-- purchases напрямую, и без этого их покупки не попадали в purchase_monthly
+-- (страница аналитики). Записи приложения (dash.origin задан, см. 0005)
+-- триггер пропускает — их итоги правит rollups.py в той же транзакции.
+-- Триггеры на оператор с таблицами переходов: импорт в 100k строк — один
+-- INSERT ... SELECT с группировкой, а не 100k upsert'ов. Группировка — как в
+-- rollups._grouped: по коду категории, подписи из словаря (0006) к группам.
+-- Итоги, разошедшиеся до триггеров, пересобирает 0011 — уже после коммита
+-- этой миграции, по одному пользователю.
+CREATE OR REPLACE FUNCTION purchases_rollup() RETURNS trigger AS $$
+BEGIN
+    IF coalesce(current_setting('dash.origin', true), '') <> '' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO purchase_monthly (user_id, month, category, subcategory, total, purchases)
+        SELECT g.user_id, g.month, COALESCE(c.category, ''), COALESCE(c.subcategory, ''), -g.total, -g.purchases
+          FROM (SELECT user_id, date_trunc('month', ts) AS month, category_id,
+                       COALESCE(sum(price), 0) AS total, count(*) AS purchases
+                  FROM old_rows
+                 WHERE ts IS NOT NULL
+                 GROUP BY 1, 2, 3) AS g
+          LEFT JOIN purchase_categories AS c ON c.id = g.category_id
+        ON CONFLICT (user_id, month, category, subcategory) DO UPDATE
+           SET total     = purchase_monthly.total + excluded.total,
+               purchases = purchase_monthly.purchases + excluded.purchases;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO purchase_monthly (user_id, month, category, subcategory, total, purchases)
+        SELECT g.user_id, g.month, COALESCE(c.category, ''), COALESCE(c.subcategory, ''), g.total, g.purchases
+          FROM (SELECT user_id, date_trunc('month', ts) AS month, category_id,
+                       COALESCE(sum(price), 0) AS total, count(*) AS purchases
+                  FROM new_rows
+                 WHERE ts IS NOT NULL
+                 GROUP BY 1, 2, 3) AS g
+          LEFT JOIN purchase_categories AS c ON c.id = g.category_id
+        ON CONFLICT (user_id, month, category, subcategory) DO UPDATE
+           SET total     = purchase_monthly.total + excluded.total,
+               purchases = purchase_monthly.purchases + excluded.purchases;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM purchase_monthly AS m
+         USING (SELECT DISTINCT user_id FROM old_rows) AS u
+         WHERE m.user_id = u.user_id AND m.purchases <= 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS purchases_rollup_insert ON purchases;
+CREATE TRIGGER purchases_rollup_insert
+    AFTER INSERT ON purchases REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION purchases_rollup();
+
+DROP TRIGGER IF EXISTS purchases_rollup_update ON purchases;
+CREATE TRIGGER purchases_rollup_update
+    AFTER UPDATE ON purchases REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION purchases_rollup();
+
+DROP TRIGGER IF EXISTS purchases_rollup_delete ON purchases;
+CREATE TRIGGER purchases_rollup_delete
+    AFTER DELETE ON purchases REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION purchases_rollup();
+
@@ -0,0 +1,31 @@
+-- migrate: no-transaction
+-- Итоги, разошедшиеся из-за записей загрузчиков до триггеров 0010, — заново,
+-- по одному пользователю в своей транзакции: запись в purchases не ждёт
+-- пересборку всей таблицы. Триггеры 0010 уже закоммичены, а SHARE ROW
+-- EXCLUSIVE на purchase_monthly ждёт незавершённые записи итогов и держит
+-- новые до коммита пользователя — они ложатся поверх пересобранных строк,
+-- поэтому между пересборкой и триггером ничего не теряется. Строки purchases
+-- не переписываются. Прерванная пересборка безопасно повторяется с начала
+-- (python -m rollups rebuild делает то же одной транзакцией).
+DO $$
+DECLARE
+    uids BIGINT[];
+    uid  BIGINT;
+BEGIN
+    SELECT coalesce(array_agg(u.user_id ORDER BY u.user_id), '{}') INTO uids
+      FROM (SELECT user_id FROM purchases UNION SELECT user_id FROM purchase_monthly) AS u;
+    FOREACH uid IN ARRAY uids LOOP
+        LOCK TABLE purchase_monthly IN SHARE ROW EXCLUSIVE MODE;
+        DELETE FROM purchase_monthly WHERE user_id = uid;
+        INSERT INTO purchase_monthly (user_id, month, category, subcategory, total, purchases)
+        SELECT g.user_id, g.month, COALESCE(c.category, ''), COALESCE(c.subcategory, ''), g.total, g.purchases
+          FROM (SELECT user_id, date_trunc('month', ts) AS month, category_id,
+                       COALESCE(sum(price), 0) AS total, count(*) AS purchases
+                  FROM purchases
+                 WHERE user_id = uid AND ts IS NOT NULL
+                 GROUP BY 1, 2, 3) AS g
+          LEFT JOIN purchase_categories AS c ON c.id = g.category_id;
+        COMMIT;
+    END LOOP;
+END;
+$$;
@@ -1,44 +1,62 @@
-import pandas as pd
-import numpy as np
 import altair as alt
 import streamlit as st
 
-@st.cache_data
-def get_data():
-    df = pd.DataFrame({
-        "region": np.random.choice(["A", "B", "C"], size=1000),
-        "value": np.random.randn(1000),
-    })
-    return df
-
-df = get_data()
-df_group = (
-    df.groupby("region")["value"]
-      .sum()
-      .reset_index()  # 👉 важно! чтобы region стала колонкой
-)
+from analytics import load_aggregate
+from db import get_engine
+
+if "uid" not in st.session_state:
+    st.error("UID не найден. Сначала перейдите на главную страницу.")
+    st.stop()
+uid = st.session_state["uid"]
+engine = get_engine()  # общий пул на процесс, см. db.py
+
+# ─── Период ───────────────────────────────────────────────────────────────────
+dates = st.date_input("Период", value=(), format="DD.MM.YYYY")
+date_from = dates[0] if len(dates) > 0 else None
+date_to = dates[1] if len(dates) > 1 else None
+
+# ─── Суммы по категориям: GROUP BY в БД, в браузер — только итоги ─────────────
+by_category = load_aggregate(engine, uid, ['category'], date_from, date_to)
+if by_category.empty:
+    st.info("За выбранный период покупок нет.")
+    st.stop()
 
-sel = alt.selection_single(fields=["region"], empty="all")
+sel = alt.selection_point(fields=["category"], name="category_sel")
 
 base = (
-    alt.Chart(df_group)
+    alt.Chart(by_category)
     .mark_bar()
     .encode(
-        x="region:N",  # явно указываем nominal
-        y="value:Q",   # quantitative
-        color=alt.condition(sel, alt.Color("region:N"), alt.value("lightgray"))
+        x=alt.X("category:N", title="Категория", sort="-y"),  # явно указываем nominal
+        y=alt.Y("total:Q", title="Сумма"),                    # quantitative
+        color=alt.condition(sel, alt.Color("category:N", legend=None), alt.value("lightgray")),
+        tooltip=["category:N", "total:Q", "purchases:Q"],
     )
-    .add_selection(sel)
+    .add_params(sel)
 )
+event = st.altair_chart(base, use_container_width=True, on_select="rerun", key="category_chart")
+
+# ─── Drill-down: из БД запрашиваем только выбранный срез ──────────────────────
+selected = [p["category"] for p in event.selection.get("category_sel", []) if "category" in p]
+
+if selected:
+    category = selected[0]
+    detail = load_aggregate(engine, uid, ['month', 'subcategory'], date_from, date_to, category=category)
+    st.subheader(f"{category}: по месяцам и подкатегориям")
+    color = "subcategory:N"
+else:
+    detail = load_aggregate(engine, uid, ['month', 'category'], date_from, date_to)
+    st.subheader("По месяцам")
+    color = "category:N"
 
 details = (
-    alt.Chart(df)
-    .mark_point()
+    alt.Chart(detail)
+    .mark_bar()
     .encode(
-        x="value:Q",
-        y="count()",
+        x=alt.X("yearmonth(month):T", title="Месяц"),
+        y=alt.Y("sum(total):Q", title="Сумма"),
+        color=alt.Color(color, title=None),
+        tooltip=[color, "yearmonth(month):T", "total:Q", "purchases:Q"],
     )
-    .transform_filter(sel)
 )
-
-st.altair_chart(base & details, use_container_width=True)
+st.altair_chart(details, use_container_width=True)
@@ -0,0 +1,50 @@
+import streamlit as st
+
+from analytics import get_analytics_cache
+from db import get_engine
+from importer import COLUMN_ALIASES, import_purchases
+from pagination import get_page_cache
+
+if "uid" not in st.session_state:
+    st.error("UID не найден. Сначала перейдите на главную страницу.")
+    st.stop()
+uid = st.session_state["uid"]
+engine = get_engine()  # общий пул на процесс, см. db.py
+
+# ─── Файл выгрузки ────────────────────────────────────────────────────────────
+st.write("Загрузите выгрузку банка или ФНС: CSV (разделитель ; или ,) или Excel.")
+with st.expander("Какие колонки нужны"):
+    st.markdown("\n".join(
+        f"- **{col}**: {', '.join(aliases[1:])}" for col, aliases in COLUMN_ALIASES.items()
+    ))
+    st.caption("Обязательны цена и дата; строки, которые уже есть в базе, пропускаются.")
+
+uploaded = st.file_uploader("Файл покупок", type=["csv", "txt", "xlsx"])
+
+# ─── Импорт: куски по IMPORT_CHUNK_ROWS строк, COPY через временную таблицу ──
+if uploaded is not None and st.button("📤 Импортировать"):
+    bar = st.progress(0.0, text="Чтение файла…")
+
+    def show_progress(stats):
+        text = f"Прочитано строк: {stats.read:,} · {stats.rows_per_second:,.0f} строк/с"
+        bar.progress(stats.fraction if stats.fraction is not None else 0.0, text=text)
+
+    try:
+        stats = import_purchases(engine, uid, uploaded, uploaded.name, progress=show_progress)
+    except ValueError as exc:
+        bar.empty()
+        st.error(f"❌ Импорт не выполнен: {exc}")
+        st.stop()
+
+    # Страницы и итоги пользователя — сбрасываем
+    get_page_cache().invalidate(uid)
+    get_analytics_cache().invalidate(uid)
+
+    bar.progress(1.0, text=f"Готово за {stats.seconds:.1f} с · {stats.rows_per_second:,.0f} строк/с")
+    col_ins, col_dup, col_rej = st.columns(3)
+    col_ins.metric("Добавлено", f"{stats.inserted:,}")
+    col_dup.metric("Уже были", f"{stats.duplicates:,}")
+    col_rej.metric("Отброшено", f"{stats.rejected:,}")
+    if stats.samples:
+        st.caption("Примеры отброшенных строк (нет цены или даты):")
+        st.dataframe(stats.samples, hide_index=True)
@@ -1,178 +1,220 @@
-import streamlit as st
-from itsdangerous import URLSafeSerializer, BadSignature
 import os
-from dotenv import load_dotenv
-from streamlit.components.v1 import html, iframe as components_iframe
+import time
+from dataclasses import replace
+from functools import partial
+
 import pandas as pd
-from sqlalchemy import create_engine, text
-import locale
-import warnings
-import logging
-import page_main, page_detail
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+
+import metrics
+from categories import add_category, load_categories
+from changeset import compute_changeset, merge_changesets
+from db import get_engine
+from editor_view import EDITOR_COLUMNS, conflicts_view, from_editor, invalid_dates, to_editor
+from pagination import PAGE_SIZES, SORT_COLUMNS, PageQuery, filter_options, load_count, load_page
+from persist import save_changes
+from write_queue import STATUS_LABELS, get_write_queue
+
+# Страница открывается только через app.py: токен проверен, uid в сессии
+uid = st.session_state["uid"]
+token = st.session_state.auth_token
 
+# ─── Подключение к БД ─────────────────────────────────────────────────────────
+engine = get_engine()  # общий пул на процесс, см. db.py
 
-# Убираем меню, хедер и футер через CSS
-st.markdown(
-    """
-    <style>
-      /* Скрываем тулбар (Deploy‑кнопку и гамбургер‑меню) */
-      .stAppToolbar,
-      [data-testid="stToolbar"],
-      [data-testid="stAppDeployButton"] {
-        display: none !important;
-        visibility: hidden !important;
-        height: 0 !important;
-        margin: 0 !important;
-        padding: 0 !important;
-      }
-
-      /* Остальные правила — по вашему усмотрению */
-      iframe.stIFrame {
-        display: none !important;
-        height: 0 !important;
-        visibility: hidden !important;
-      }
-      #MainMenu, header, footer {
-        visibility: hidden !important;
-      }
-      .reportview-container .main .block-container,
-      .stApp .main .block-container,
-      section.stMain .block-container,
-      div[data-testid="stMainBlockContainer"] {
-        padding-top: 0 !important;
-        margin-top: 0 !important;
-      }
-      section[data-testid="stSidebar"] > div:first-child {
-        top: 0 !important;
-        height: 100vh !important;
-      }
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
-
-# ─── Подключение к БД и локаль ────────────────────────────────────────────────
-engine = create_engine(os.getenv("DATABASE_URL"))
-
-if "uid" not in st.session_state:
-        st.error("UID не найден. Сначала перейдите на главную страницу.")
-uid = st.session_state["uid"]
-st.write("UID из session_state:", uid)
-
-try:
-    locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
-except locale.Error:
-    pass  # если локаль недоступна
-
-# ─── Загрузка данных и подготовка для редактирования ──────────────────────────
-df = pd.read_sql(
-    text("""
-        SELECT id,
-               category,
-               subcategory,
-               price,
-               ts
-        FROM purchases
-        WHERE user_id = :uid
-    """),
-    engine,
-    params={"uid": uid}
-)
-
-# Конвертация и локальное форматирование даты
-df['ts'] = pd.to_datetime(df['ts'], errors='coerce')
-df['Дата'] = df['ts'].dt.strftime('%-d %B %Y')
-
-# Оставляем только видимые пользователю столбцы
-df = df[['id', 'category', 'subcategory', 'price', 'Дата']]
-df.columns = ['id', 'Категория', 'Подкатегория', 'Цена', 'Дата']
-
-# Сохраняем оригинал в сессии для диффа
-if 'orig_df' not in st.session_state:
-    st.session_state.orig_df = df.copy()
-
-st.write("Отредактируйте любое поле и нажмите 💾 под таблицей")
-edited = st.data_editor(
-    df.drop(columns=['id']),               # id скрываем, но он в orig_df
-    use_container_width=True,
-    key='data_editor'
-)
-# Привяжем id обратно к отредактированному df
-edited['id'] = st.session_state.orig_df['id']
-
-# ─── Сохранение изменений в БД (диффовый алгоритм) ───────────────────────────
-if st.button("💾 Сохранить изменения"):
-    # Подготовка новых и оригинальных табличек
-    new = edited.rename(columns={
-        "Категория": "category",
-        "Подкатегория": "subcategory",
-        "Цена": "price",
-        "Дата": "ts"
-    }).copy()
-    new['ts'] = pd.to_datetime(new['ts'], format='%d %B %Y', errors='coerce')
-    new['user_id'] = uid
-
-    orig = st.session_state.orig_df.rename(columns={
-        "Категория": "category",
-        "Подкатегория": "subcategory",
-        "Цена": "price",
-        "Дата": "ts"
-    }).copy()
-    orig['ts'] = pd.to_datetime(orig['ts'], format='%d %B %Y', errors='coerce')
-    orig['user_id'] = uid
-
-    key = ['id']
-
-    # 1) Новые строки (id == NaN или не в orig)
-    new_rows = new[~new['id'].isin(orig['id'])]
-    # 2) Удалённые (были в orig, нет в new)
-    deleted_ids = orig.loc[~orig['id'].isin(new['id']), 'id'].tolist()
-    # 3) Изменённые: общие id, но есть расхождения
-    common_ids = set(orig['id']).intersection(new['id'])
-    diffs = []
-    for idx in common_ids:
-        o = orig.set_index('id').loc[idx]
-        n = new.set_index('id').loc[idx]
-        if not o[['category','subcategory','price','ts']].equals(n[['category','subcategory','price','ts']]):
-            diffs.append(idx)
-    updated_rows = new.set_index('id').loc[diffs].reset_index()
-
-    # Запись в БД
-    with engine.begin() as conn:
-        # удаляем
-        if deleted_ids:
-            conn.execute(
-                text("DELETE FROM purchases WHERE id = ANY(:ids)"),
-                {"ids": deleted_ids}
-            )
-        # обновляем
-        for _, row in updated_rows.iterrows():
-            conn.execute(
-                text("""
-                    UPDATE purchases
-                       SET category    = :category,
-                           subcategory = :subcategory,
-                           price       = :price,
-                           ts          = :ts
-                     WHERE id = :id
-                """),
-                {
-                    "category": row["category"],
-                    "subcategory": row["subcategory"],
-                    "price": row["price"],
-                    "ts": row["ts"],
-                    "id": row["id"],
-                }
-            )
-        # вставляем новые
-        if not new_rows.empty:
-            new_rows.drop(columns=['id']).to_sql(
-                "purchases", conn, if_exists="append", index=False
-            )
+# ─── Таблица: фильтры, страница, редактор и сохранение ───────────────────────
+# Всё, что меняет пользователь, — во фрагменте: правка ячейки, смена
+# страницы или фильтра и сохранение перезапускают только его. CSS, iframe,
+# проверка токена и подключение выше выполняются при открытии страницы.
+SAVE_POLL_SECONDS = 0.25
+
+
+def rerun_editor():
+    """Перезапуск одной таблицы; из полного прогона scope="fragment" нельзя — тогда всей страницы."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        metrics.finish_rerun()
+        st.rerun()
 
-    st.success("✅ Изменения успешно применены в базе!")
-    # Обновляем orig_df
-    st.session_state.orig_df = edited.copy()
 
-if st.button("Перейти на детальную"):
-        st.switch_page("page_detail")
\ No newline at end of file
+def wait_for_save(job):
+    """Статус фоновой записи до её конца, затем таблица — из обновлённых данных.
+
+    Ждём в этом же прогоне, а не таймером run_every: опрос не стоит
+    перезапусков. Вызовы st.* в цикле — точки, где Streamlit прервёт
+    прогон, если пользователь тем временем что-то нажал.
+    """
+    status = st.empty()
+    while not job.finished:
+        merged = f", объединено сохранений: {job.merged}" if job.merged > 1 else ""
+        status.info(f"⏳ Сохранение: {STATUS_LABELS[job.status]}{merged}")
+        time.sleep(SAVE_POLL_SECONDS)
+    rerun_editor()
+
+
+def render_editor():
+    # ─── Результат фонового сохранения ───────────────────────────────────────
+    save_job = st.session_state.get('save_job')
+    if save_job is not None and save_job.finished:
+        del st.session_state['save_job']
+        if save_job.status == 'done':
+            # Правки и редакторы пересоздаём из обновлённых данных,
+            # иначе добавленные строки без id попали бы в следующий дифф ещё раз
+            st.session_state.pop('page_edits', None)
+            st.session_state.editor_epoch = st.session_state.get('editor_epoch', 0) + 1
+            st.session_state.save_message = "✅ Изменения успешно применены в базе!"
+            if len(save_job.result):
+                # Остальное записано; эти строки с момента чтения изменили или удалили
+                st.session_state.save_message = "✅ Остальные изменения применены в базе."
+                st.session_state.save_conflicts = conflicts_view(save_job.result)
+        else:
+            # Правки остаются в page_edits — можно исправить и сохранить ещё раз
+            st.session_state.save_error = f"❌ Изменения не сохранены: {save_job.error}"
+        save_job = None
+    saving = save_job is not None
+
+    # ─── Фильтры, сортировка и страница (всё уходит в SQL) ───────────────────
+    with metrics.stage('load'):
+        options = filter_options(engine, uid)
+    with st.expander("Фильтры и сортировка"):
+        col_cat, col_sub = st.columns(2)
+        categories = col_cat.multiselect("Категория", options['category'].dropna().unique())
+        sub_options = options[options['category'].isin(categories)] if categories else options
+        subcategories = col_sub.multiselect("Подкатегория", sub_options['subcategory'].dropna().unique())
+        dates = st.date_input("Период", value=(), format="DD.MM.YYYY")
+        col_sort, col_dir, col_size = st.columns(3)
+        sort = col_sort.selectbox("Сортировка", list(SORT_COLUMNS), format_func=SORT_COLUMNS.get)
+        descending = col_dir.toggle("По убыванию", value=True)
+        page_size = col_size.selectbox("Строк на странице", PAGE_SIZES, index=1)
+
+    query = PageQuery(
+        page_size=page_size,
+        sort=sort,
+        descending=descending,
+        categories=tuple(categories),
+        subcategories=tuple(subcategories),
+        date_from=dates[0] if len(dates) > 0 else None,
+        date_to=dates[1] if len(dates) > 1 else None,
+    )
+    with metrics.stage('load'):
+        total = load_count(engine, uid, query)
+    pages = max(1, -(-total // page_size))
+    page = st.number_input(f"Страница (из {pages}, всего строк: {total})", 1, pages, 1) - 1
+    query = replace(query, page=page)
+
+    # ─── Загрузка страницы и подготовка для редактирования ───────────────────
+    with metrics.stage('load') as s:
+        page_df = load_page(engine, uid, query)
+        s.rows = len(page_df)
+        # После страницы: её незнакомые коды уже перечитали словарь в кэше
+        categories = load_categories(engine, uid)
+
+    # Правки копятся по страницам: orig — кадр страницы при первом показе (для
+    # диффа, ссылка на кэш без копии), base — с чем создан текущий виджет
+    # редактора, edited — последнее состояние
+    page_edits = st.session_state.setdefault('page_edits', {})
+    editor_key = f"data_editor_{st.session_state.get('editor_epoch', 0)}_{abs(hash(query))}"
+
+    # Вид для редактора с форматированной датой (кэшированный кадр не меняем);
+    # строится при показе страницы, а правки ячеек берут его из сессии
+    view = st.session_state.get('editor_view')
+    if view is not None and view[0] == editor_key and view[1] is page_df:
+        df = view[2]
+    else:
+        with metrics.stage('transform') as s:
+            df = to_editor(page_df)
+            s.rows = len(df)
+        st.session_state.editor_view = (editor_key, page_df, df)
+
+    if 'save_message' in st.session_state:
+        st.success(st.session_state.pop('save_message'))
+    if 'save_error' in st.session_state:
+        st.error(st.session_state.pop('save_error'))
+    if 'save_conflicts' in st.session_state:
+        st.warning("⚠️ Эти строки изменили в другой вкладке или загрузчике чеков — "
+                   "ваши правки к ним не записаны. Таблица уже показывает данные из базы.")
+        st.dataframe(st.session_state.pop('save_conflicts'), hide_index=True)
+
+    entry = page_edits.get(query) or {'orig': page_df, 'base': df, 'edited': df}
+    if editor_key not in st.session_state:
+        entry['base'] = entry['edited']
+
+    st.write("Отредактируйте любое поле и нажмите 📥 под таблицей")
+    with metrics.stage('render') as s:
+        edited = st.data_editor(
+            entry['base'].drop(columns=['id']),    # id скрываем, но он в base
+            use_container_width=True,
+            disabled=saving,                       # пока идёт запись, правки не принимаем
+            column_config={                        # выбор из словаря категорий пользователя
+                EDITOR_COLUMNS['category']: st.column_config.SelectboxColumn(
+                    options=categories.categories.tolist()),
+                EDITOR_COLUMNS['subcategory']: st.column_config.SelectboxColumn(
+                    options=categories.subcategories.tolist()),
+            },
+            key=editor_key
+        )
+        s.rows = len(edited)
+    # Привяжем id обратно к отредактированному df
+    edited['id'] = entry['base']['id']
+    entry['edited'] = edited
+    if query in page_edits or not edited.drop(columns=['id']).equals(entry['base'].drop(columns=['id'])):
+        page_edits[query] = entry
+
+    if page_edits:
+        st.caption(f"Несохранённые правки на страницах: {len(page_edits)}")
+
+    # ─── Новая категория для списков выбора ──────────────────────────────────
+    with st.expander("➕ Новая категория"):
+        col_new_cat, col_new_sub = st.columns(2)
+        new_category = col_new_cat.text_input("Категория", key="new_category").strip()
+        new_subcategory = col_new_sub.text_input("Подкатегория", key="new_subcategory").strip()
+        if st.button("Добавить в списки", disabled=saving or not (new_category or new_subcategory)):
+            add_category(engine, uid, new_category, new_subcategory)
+            # Новый виджет с новыми списками; правки переходят в него из page_edits
+            st.session_state.editor_epoch = st.session_state.get('editor_epoch', 0) + 1
+            rerun_editor()
+
+    # ─── Сохранение изменений в БД (диффовый алгоритм, в фоне) ───────────────
+    if saving:
+        wait_for_save(save_job)
+    elif st.button("📥 Сохранить изменения", disabled=not page_edits):
+        # Нераспознанная дата не пишется как NULL: сохранение целиком откладываем
+        bad = [invalid_dates(e['edited']) for e in page_edits.values()]
+        bad = [b for b in bad if len(b)]
+        if bad:
+            st.error("❌ Изменения не сохранены: не распознаны даты (формат ДД.ММ.ГГГГ). Исправьте строки:")
+            st.dataframe(pd.concat(bad).drop(columns=['id']), hide_index=True)
+            return
+        # Дифф каждой страницы против её первого показа, затем один общий changeset
+        with metrics.stage('diff') as s:
+            changes = merge_changesets(
+                compute_changeset(e['orig'], from_editor(e['edited'], e['orig'], uid))
+                for e in page_edits.values()
+            )
+            s.rows = len(changes)
+        # Запись — в фоновом пуле, одной транзакцией (см. persist.save_changes);
+        # здесь — только постановка в очередь, сама запись меряется в persist
+        with metrics.stage('write') as s:
+            st.session_state.save_job = get_write_queue().submit(uid, changes, partial(save_changes, engine, uid))
+            s.rows = len(changes)
+        rerun_editor()  # следующий прогон — с заблокированным редактором и статусом записи
+
+
+@st.fragment
+def editor_section():
+    debug = metrics.debug_requested(st.query_params)
+    with metrics.fragment('editor', force=debug) as fragment_rerun:
+        render_editor()
+        if fragment_rerun is not None and debug:
+            metrics.debug_panel(fragment_rerun, engine)
+
+
+editor_section()
+
+# ─── Выгрузка всей истории (потоком через export_server.py) ──────────────────
+export_url = os.getenv("EXPORT_URL", "/export")
+col_csv, col_parquet = st.columns(2)
+col_csv.link_button("⬇️ Скачать CSV", f"{export_url}/purchases.csv?auth={token}")
+col_parquet.link_button("⬇️ Скачать Parquet", f"{export_url}/purchases.parquet?auth={token}")
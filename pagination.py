@@ -0,0 +1,214 @@
+import os
+from dataclasses import dataclass, replace
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sqlalchemy import Integer, bindparam, text
+
+from arrow_load import read_arrow
+from categories import category_map, decode_table
+from frame_cache import FrameCache
+from schema import purchases_from_arrow
+
+# Колонки, по которым разрешена сортировка (ts и price попадают в SQL как есть)
+SORT_COLUMNS = {
+    'ts': 'Дата',
+    'price': 'Цена',
+    'category': 'Категория',
+    'subcategory': 'Подкатегория',
+}
+PAGE_SIZES = [100, 500, 1000]
+# В purchases — только код категории: сортировка по подписи идёт через словарь
+_SORT_SQL = {
+    'category': "NULLIF(c.category, '')",
+    'subcategory': "NULLIF(c.subcategory, '')",
+}
+
+
+@dataclass(frozen=True)
+class PageQuery:
+    """Страница редактора: фильтры, сортировка и окно LIMIT/OFFSET."""
+    page: int = 0
+    page_size: int = 500
+    sort: str = 'ts'
+    descending: bool = True
+    categories: tuple = ()
+    subcategories: tuple = ()
+    date_from: date = None
+    date_to: date = None
+
+    def filters(self):
+        # Тот же запрос без окна — ключ для count и списка страниц
+        return (self.categories, self.subcategories, self.date_from, self.date_to)
+
+
+@st.cache_resource
+def get_page_cache():
+    # Страницы, счётчики и списки фильтров по ключу (uid, ...)
+    return FrameCache(
+        max_bytes=int(os.getenv("PAGE_CACHE_MB", "128")) * 1024 * 1024,
+        ttl=int(os.getenv("PURCHASES_CACHE_TTL", "600")),
+    )
+
+
+def _where(conn, uid, query):
+    clauses = ["p.user_id = :uid"]
+    params = {"uid": uid}
+    binds = []
+    if query.categories or query.subcategories:
+        # Фильтр по подписям -> по кодам словаря: без join, по индексу
+        clauses.append("p.category_id IN :category_ids")
+        params["category_ids"] = category_map(conn, uid).ids_for(query.categories, query.subcategories)
+        # Тип явно: ADBC и connectorx подставляют параметры литералами (arrow_load)
+        binds.append(bindparam("category_ids", expanding=True, type_=Integer))
+    if query.date_from:
+        clauses.append("p.ts >= :date_from")
+        params["date_from"] = query.date_from
+    if query.date_to:
+        clauses.append("p.ts < :date_to")
+        params["date_to"] = query.date_to + timedelta(days=1)
+    return " AND ".join(clauses), params, binds
+
+
+def fetch_page(conn, uid, query):
+    if query.sort not in SORT_COLUMNS:
+        raise ValueError(f"Недопустимая сортировка: {query.sort}")
+    where, params, binds = _where(conn, uid, query)
+    direction = "DESC" if query.descending else "ASC"
+    join = "LEFT JOIN purchase_categories AS c ON c.id = p.category_id" if query.sort in _SORT_SQL else ""
+    stmt = text(f"""
+        SELECT p.id,
+               p.category_id,
+               CAST(p.price AS DOUBLE PRECISION) AS price,  -- float, не Decimal: в кадре всё равно float32
+               p.ts,
+               p.version
+        FROM purchases AS p {join}
+        WHERE {where}
+        ORDER BY {_SORT_SQL.get(query.sort, f'p.{query.sort}')} {direction}, p.id {direction}
+        LIMIT :limit OFFSET :offset
+    """).bindparams(*binds)
+    params.update(limit=query.page_size, offset=query.page * query.page_size)
+    return purchases_from_arrow(decode_table(conn, uid, read_arrow(conn, stmt, params)))
+
+
+def _month_start(day, next_if_partial=False):
+    # Первое число месяца day; с next_if_partial — следующего, если day не первое
+    start = day.replace(day=1)
+    if next_if_partial and start != day:
+        start = (start + timedelta(days=32)).replace(day=1)
+    return start
+
+
+def _count_purchases(conn, uid, query, date_from=None, date_to=None, undated=False):
+    # Точный count по purchases за [date_from, date_to) или только строк без ts
+    # — по индексу (user_id, ts, id), без прохода по остальной истории
+    day = timedelta(days=1)
+    where, params, binds = _where(conn, uid, replace(query, date_from=date_from,
+                                                     date_to=date_to - day if date_to else None))
+    if undated:
+        where += " AND p.ts IS NULL"
+    stmt = text(f"SELECT count(*) FROM purchases AS p WHERE {where}").bindparams(*binds)
+    return int(conn.execute(stmt, params).scalar())
+
+
+def _count_monthly(conn, uid, query, month_from, month_to):
+    # Покупки целых месяцев [month_from, month_to) из итогов purchase_monthly
+    clauses = ["user_id = :uid"]
+    params = {"uid": uid}
+    binds = []
+    for column, labels in (('category', query.categories), ('subcategory', query.subcategories)):
+        if labels:
+            clauses.append(f"{column} IN :{column}")
+            params[column] = list(labels)
+            binds.append(bindparam(column, expanding=True))
+    if month_from:
+        clauses.append("month >= :month_from")
+        params["month_from"] = month_from
+    if month_to:
+        clauses.append("month < :month_to")
+        params["month_to"] = month_to
+    stmt = text(f"""
+        SELECT COALESCE(sum(purchases), 0) FROM purchase_monthly WHERE {" AND ".join(clauses)}
+    """).bindparams(*binds)
+    return int(conn.execute(stmt, params).scalar())
+
+
+def count_rows(conn, uid, query):
+    """Сколько строк под фильтрами запроса (без окна страницы).
+
+    Целые месяцы периода — из итогов purchase_monthly (сотни строк на
+    пользователя), по purchases считаются только неполные месяцы на краях
+    периода и покупки без ts (в итоги они не попадают). Стоимость — от
+    размера краёв, а не от всей истории.
+    """
+    day = timedelta(days=1)
+    date_from = query.date_from
+    date_to = query.date_to + day if query.date_to else None   # не включая
+    month_from = _month_start(date_from, next_if_partial=True) if date_from else None
+    month_to = _month_start(date_to) if date_to else None
+    if month_from and month_to and month_from >= month_to:
+        # Период внутри одного-двух месяцев: целых среди них нет
+        return _count_purchases(conn, uid, query, date_from, date_to)
+    total = 0
+    if date_from is None and date_to is None:
+        total += _count_purchases(conn, uid, query, undated=True)
+    if date_from and date_from < month_from:
+        total += _count_purchases(conn, uid, query, date_from, month_from)
+    if date_to and month_to < date_to:
+        total += _count_purchases(conn, uid, query, month_to, date_to)
+    return total + _count_monthly(conn, uid, query, month_from, month_to)
+
+
+def load_page(engine, uid, query):
+    cache = get_page_cache()
+    page = cache.get((uid, 'page', query))
+    if page is None:
+        with engine.connect() as conn:
+            page = cache.put((uid, 'page', query), fetch_page(conn, uid, query))
+    return page
+
+
+def load_count(engine, uid, query):
+    """Сколько строк под фильтрами запроса (без учёта окна страницы)."""
+    cache = get_page_cache()
+    total = cache.get((uid, 'count', query.filters()))
+    if total is None:
+        with engine.connect() as conn:
+            total = cache.put((uid, 'count', query.filters()),
+                              pd.DataFrame({'n': [count_rows(conn, uid, query)]}))
+    return int(total['n'].iloc[0])
+
+
+def fetch_options(conn, uid):
+    """Пары (category, subcategory), которые есть в покупках uid.
+
+    Из итогов purchase_monthly и покупок без ts (по индексу), а не DISTINCT
+    по всей истории.
+    """
+    pairs = pd.DataFrame(conn.execute(
+        text("""
+            SELECT category, subcategory
+              FROM purchase_monthly
+             WHERE user_id = :uid AND purchases > 0
+            UNION
+            SELECT COALESCE(c.category, ''), COALESCE(c.subcategory, '')
+              FROM purchases AS p
+              LEFT JOIN purchase_categories AS c ON c.id = p.category_id
+             WHERE p.user_id = :uid AND p.ts IS NULL
+        """),
+        {"uid": uid},
+    ).all(), columns=['category', 'subcategory'], dtype=object)
+    pairs = pairs.replace('', np.nan)   # пустые подписи — NaN, как пропуски в редакторе
+    return pairs.sort_values(['category', 'subcategory'], na_position='last').reset_index(drop=True)
+
+
+def filter_options(engine, uid):
+    """Пары (category, subcategory) пользователя для фильтров."""
+    cache = get_page_cache()
+    options = cache.get((uid, 'options'))
+    if options is None:
+        with engine.connect() as conn:
+            options = cache.put((uid, 'options'), fetch_options(conn, uid))
+    return options
@@ -0,0 +1,43 @@
+import time
+
+import pandas as pd
+
+import metrics
+from analytics import get_analytics_cache
+from bulk_write import fetch_rows, lock_user
+from invalidation import mark_origin
+from pagination import get_page_cache
+from rollups import apply_changeset_with_rollups
+
+
+def conflict_report(conn, uid, changes, ids):
+    """Строки, не записанные из-за конфликта версий, и их текущее состояние в БД.
+
+    action — что пытались сделать ('update'/'delete'), state — что со строкой
+    сейчас ('changed' — изменена другим, 'deleted' — удалена); значения колонок
+    берутся из БД (у удалённых — пустые).
+    """
+    current = fetch_rows(conn, uid, ids).set_index('id').reindex(pd.Index(ids, name='id'))
+    deletes = set(changes.deletes)
+    return current.reset_index().assign(
+        action=['delete' if i in deletes else 'update' for i in ids],
+        state=current['version'].isna().map({True: 'deleted', False: 'changed'}).to_numpy(),
+    )
+
+
+def save_changes(engine, uid, changes):
+    """Записывает Changeset одной транзакцией и сбрасывает кэши пользователя.
+
+    Возвращает отчёт о конфликтах (conflict_report); пустой — записано всё.
+    """
+    # Запись в БД: DELETE по массиву id, один UPDATE на все изменения, COPY новых
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        lock_user(conn, uid)   # сохранения uid из других воркеров ждут здесь
+        mark_origin(conn)      # свои кэши сбрасываем сами, уведомление триггера пропускаем
+        conflicts = apply_changeset_with_rollups(conn, uid, changes)  # + помесячные итоги
+        report = conflict_report(conn, uid, changes, conflicts)
+    metrics.observe('write', time.perf_counter() - start, rows=len(changes))
+    get_page_cache().invalidate(uid)
+    get_analytics_cache().invalidate(uid)
+    return report
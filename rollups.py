@@ -0,0 +1,167 @@
+"""Помесячные итоги purchase_monthly (см. migrations/0001_purchase_monthly.sql).
+
+При сохранении итоги правятся в той же транзакции: строки до изменения
+вычитаются, после — прибавляются. Записи в обход приложения (загрузчики
+чеков, без dash.origin) учитывает триггер purchases_rollup из
+migrations/0010. Пересборка с нуля:
+
+    python -m rollups rebuild [--uid UID]
+"""
+import argparse
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from bulk_write import apply_changeset, lock_rows
+
+# Начало месяца в SQL; SQLite — только как стенд для бенчмарков
+MONTH_SQL = {
+    'postgresql': "date_trunc('month', ts)",
+    'sqlite': "strftime('%Y-%m-01', ts)",
+}
+
+_UPSERT_TAIL = """
+    ON CONFLICT (user_id, month, category, subcategory) DO UPDATE
+       SET total     = purchase_monthly.total + excluded.total,
+           purchases = purchase_monthly.purchases + excluded.purchases
+"""
+
+
+def month_sql(conn):
+    return MONTH_SQL.get(conn.dialect.name, MONTH_SQL['postgresql'])
+
+
+def _grouped(conn, source, where, sign=1):
+    # SELECT итогов для purchase_monthly: группировка по коду категории,
+    # подписи из словаря — уже к сотням групп, а не к каждой покупке.
+    # WHERE true — иначе SQLite примет ON CONFLICT за условие join
+    return f"""
+        SELECT g.user_id, g.month, COALESCE(c.category, ''), COALESCE(c.subcategory, ''), g.total, g.purchases
+          FROM (SELECT user_id,
+                       {month_sql(conn)} AS month,
+                       category_id,
+                       {sign} * COALESCE(sum(price), 0) AS total,
+                       {sign} * count(*) AS purchases
+                  FROM {source}
+                 WHERE {where}
+                 GROUP BY 1, 2, 3) AS g
+          LEFT JOIN purchase_categories AS c ON c.id = g.category_id
+         WHERE true
+    """
+
+
+def _add_from_purchases(conn, uid, ids, sign):
+    # Итоги строк purchases с данными id (как они сейчас в БД) со знаком sign
+    ids = [int(i) for i in ids]
+    if not ids:
+        return
+    if conn.dialect.name == 'postgresql':
+        # join с unnest, а не id = ANY(...): иначе при больших списках (импорт)
+        # планировщик идёт по индексу user_id и проверяет массив для каждой строки
+        source, id_filter, binds = (
+            "purchases JOIN unnest(CAST(:ids AS bigint[])) AS a(id) USING (id)", "true", [])
+    else:
+        source, id_filter, binds = "purchases", "id IN :ids", [bindparam('ids', expanding=True)]
+    conn.execute(
+        text(f"""
+            INSERT INTO purchase_monthly (user_id, month, category, subcategory, total, purchases)
+            {_grouped(conn, source, f"user_id = :uid AND {id_filter} AND ts IS NOT NULL", sign)}
+            {_UPSERT_TAIL}
+        """).bindparams(*binds),
+        {"uid": uid, "ids": ids},
+    )
+
+
+def add_purchases(conn, uid, ids):
+    """Прибавляет к итогам уже вставленные строки purchases (импорт)."""
+    _add_from_purchases(conn, uid, ids, sign=1)
+
+
+def monthly_groups(rows):
+    """Итоги кадра покупок по (month, category, subcategory) на стороне клиента."""
+    rows = rows.loc[rows['ts'].notna()]
+    return (
+        rows.assign(
+            month=rows['ts'].dt.to_period('M').dt.start_time.dt.date,
+            category=rows['category'].astype(object).fillna(''),
+            subcategory=rows['subcategory'].astype(object).fillna(''),
+            price=pd.to_numeric(rows['price'], errors='coerce').fillna(0).astype('float64').round(2),
+        )
+        .groupby(['month', 'category', 'subcategory'], as_index=False)
+        .agg(total=('price', 'sum'), purchases=('price', 'size'))
+    )
+
+
+def _add_frame(conn, uid, rows):
+    groups = monthly_groups(rows)
+    if groups.empty:
+        return
+    conn.execute(
+        text(f"""
+            INSERT INTO purchase_monthly (user_id, month, category, subcategory, total, purchases)
+            VALUES (:user_id, :month, :category, :subcategory, :total, :purchases)
+            {_UPSERT_TAIL}
+        """),
+        [{"user_id": uid, **row} for row in groups.to_dict('records')],
+    )
+
+
+def _drop_empty(conn, uid):
+    conn.execute(
+        text("DELETE FROM purchase_monthly WHERE user_id = :uid AND purchases <= 0"),
+        {"uid": uid},
+    )
+
+
+def apply_changeset_with_rollups(conn, uid, changes):
+    """bulk_write.apply_changeset плюс инкрементальная правка purchase_monthly.
+
+    Старые значения изменённых и удалённых строк берутся из БД в той же
+    транзакции под блокировкой строк, поэтому устаревший снимок в сессии итоги
+    не портит. Возвращает id конфликтов (см. bulk_write.apply_changeset).
+    """
+    updated = changes.updates['id'].tolist()
+    touched = [*changes.deletes, *updated]
+    lock_rows(conn, uid, touched)
+    _add_from_purchases(conn, uid, touched, sign=-1)
+    conflicts = apply_changeset(conn, uid, changes)
+    # Изменённые строки и не записанные из-за конфликта — обратно, как они теперь в БД
+    _add_from_purchases(conn, uid, list(dict.fromkeys([*updated, *conflicts])), sign=1)
+    _add_frame(conn, uid, changes.inserts)
+    _drop_empty(conn, uid)
+    return conflicts
+
+
+def rebuild(conn, uid=None):
+    """Пересчитывает purchase_monthly из purchases (для одного uid или для всех)."""
+    where = "AND user_id = :uid" if uid is not None else ""
+    params = {"uid": uid} if uid is not None else {}
+    conn.execute(text(f"DELETE FROM purchase_monthly WHERE true {where}"), params)
+    return conn.execute(
+        text(f"""
+            INSERT INTO purchase_monthly (user_id, month, category, subcategory, total, purchases)
+            {_grouped(conn, "purchases", f"ts IS NOT NULL {where}")}
+        """),
+        params,
+    ).rowcount
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    from db import create_pooled_engine
+
+    parser = argparse.ArgumentParser(prog="python -m rollups", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = commands.add_parser("rebuild", help="пересобрать purchase_monthly из purchases")
+    rebuild_cmd.add_argument("--uid", type=int, help="только для одного пользователя")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    with create_pooled_engine().begin() as conn:
+        rows = rebuild(conn, args.uid)
+    print(f"purchase_monthly: {rows} строк")
+
+
+if __name__ == '__main__':
+    main()
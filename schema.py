@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Copy-on-Write: срезы и assign делят память с кэшированным кадром, а не копируют его
+# (в pandas >= 3 он включён всегда)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+CATEGORY_COLUMNS = ['category', 'subcategory']
+PURCHASE_COLUMNS = ['id', 'category', 'subcategory', 'price', 'ts', 'version']
+
+# Текст для редактора: строки на pyarrow, пропуск — NaN (в pandas 3 — тип 'str')
+try:
+    TEXT = pd.StringDtype('pyarrow', na_value=np.nan)
+except TypeError:  # pandas < 2.3
+    TEXT = pd.StringDtype('pyarrow_numpy')
+
+
+def compact_price(price):
+    """float32, если он без потерь хранит цену с точностью до копейки."""
+    price = pd.to_numeric(price, errors='coerce').astype('float64')
+    narrow = price.astype('float32')
+    # Точное совпадение в копейках: isclose с относительным допуском пропускал
+    # 199999.99 -> 199999.98 (float32 хранит ~7 значащих цифр)
+    cents = np.round(np.asarray(price, dtype='float64') * 100)
+    narrow_cents = np.round(np.asarray(narrow, dtype='float64') * 100)
+    lossless = (cents == narrow_cents) | (np.isnan(cents) & np.isnan(narrow_cents))
+    return narrow if lossless.all() else price
+
+
+def compact_purchases(df):
+    """Компактное представление purchases для кэша и сессий.
+
+    category/subcategory — категориальные, price — float32 где возможно,
+    id и version — int64, дата одна: ts (datetime64). Строковая дата для
+    редактора строится только при отрисовке.
+    """
+    out = df.assign(
+        id=df['id'].astype('int64'),
+        version=df['version'].astype('int64'),
+        price=compact_price(df['price']),
+        ts=pd.to_datetime(df['ts'], errors='coerce'),
+        **{col: df[col].astype('category') for col in CATEGORY_COLUMNS},
+    )
+    return out[[*PURCHASE_COLUMNS, *[c for c in out.columns if c not in PURCHASE_COLUMNS]]]
+
+
+def purchases_from_arrow(table):
+    """compact_purchases для pyarrow.Table из arrow_load.read_arrow.
+
+    Категории кодируются словарём ещё в Arrow и приходят в pandas
+    категориальными, без промежуточных object-строк; числа и ts переходят
+    без разбора значений.
+    """
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if name in CATEGORY_COLUMNS:
+            if not pa.types.is_dictionary(column.type):
+                column = pc.dictionary_encode(column.cast(pa.string()))
+        elif name == 'price':
+            column = column.cast(pa.float64())   # NUMERIC приходит как decimal128
+        elif name == 'ts' and (pa.types.is_temporal(column.type) or pa.types.is_null(column.type)):
+            # Строки дат (SQLite) разберёт pd.to_datetime в compact_purchases
+            column = column.cast(pa.timestamp('us'))
+        columns[name] = column
+    return compact_purchases(pa.table(columns).to_pandas(split_blocks=True, self_destruct=True))
+
+
+def text_column(series):
+    """Колонка как TEXT; категориальная раскрывается по словарю в Arrow."""
+    array = pa.array(series, from_pandas=True)
+    if pa.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+    return pd.Series(pd.array(array, dtype=TEXT), index=series.index, name=series.name)
+
+
+def memory_report(frames):
+    """Байты по колонкам (deep) для набора именованных кадров."""
+    return pd.DataFrame({
+        name: frame.memory_usage(index=True, deep=True) for name, frame in frames.items()
+    }).fillna(0).astype('int64')
@@ -0,0 +1,85 @@
+import sys
+import threading
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import arrow_load
+import pagination
+from arrow_load import _literal_sql
+from pagination import PageQuery, fetch_page
+
+# ADBC и connectorx не нужны: достаточно SQL, который им был бы передан
+PG = SimpleNamespace(dialect=postgresql.psycopg2.dialect())
+
+
+class _Compiled(Exception):
+    pass
+
+
+@pytest.fixture
+def page_sql(monkeypatch):
+    def read_arrow(conn, stmt, params):
+        raise _Compiled(_literal_sql(conn, stmt, params))
+
+    def compile_page(query, ids):
+        categories = SimpleNamespace(ids_for=lambda categories, subcategories: ids)
+        monkeypatch.setattr(pagination, 'category_map', lambda conn, uid, codes=None: categories)
+        with pytest.raises(_Compiled) as compiled:
+            fetch_page(PG, 7, query)
+        return str(compiled.value)
+
+    monkeypatch.setattr(pagination, 'read_arrow', read_arrow)
+    return compile_page
+
+
+def test_filtered_page_compiles_to_literal_sql(page_sql):
+    sql = page_sql(PageQuery(categories=('Еда',), subcategories=('Кафе',),
+                             date_from=date(2024, 1, 1), date_to=date(2024, 1, 31)), [1, 2])
+    assert 'p.user_id = 7' in sql
+    assert 'p.category_id IN (1, 2)' in sql
+    assert "p.ts >= '2024-01-01' AND p.ts < '2024-02-01'" in sql
+    assert 'LIMIT 500 OFFSET 0' in sql
+
+
+def test_filter_without_matching_codes_compiles(page_sql):
+    sql = page_sql(PageQuery(categories=('Нет такой',)), [])
+    assert 'p.category_id IN (SELECT' in sql and '1!=1' in sql
+
+
+def test_adbc_connections_are_bounded(monkeypatch):
+    opened, active = [], []
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def connect(url, autocommit):
+        opened.append(SimpleNamespace(close=lambda: None))
+        return opened[-1]
+
+    dbapi = SimpleNamespace(connect=connect)
+    monkeypatch.setitem(sys.modules, 'adbc_driver_postgresql', SimpleNamespace(dbapi=dbapi))
+    monkeypatch.setitem(sys.modules, 'adbc_driver_postgresql.dbapi', dbapi)
+    monkeypatch.setattr(arrow_load, '_own_slots', threading.BoundedSemaphore(2))
+    monkeypatch.setattr(arrow_load, '_adbc_idle', {})
+
+    def load():
+        with arrow_load._adbc_connection('postgresql://test') as connection:
+            with lock:
+                active.append(connection)
+            release.wait(5)
+            with lock:
+                active.remove(connection)
+
+    threads = [threading.Thread(target=load) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    assert len(active) == 2                      # остальные загрузки ждут места
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(opened) == 2                      # новые — только когда простаивающих нет
+    assert len(arrow_load._adbc_idle['postgresql://test']) == 2
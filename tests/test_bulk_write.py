@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from bench.synthetic import create_purchases, make_purchases
+from bulk_write import apply_changeset, fetch_rows
+from changeset import compute_changeset
+from pagination import PageQuery, fetch_page
+
+UID = 1
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/purchases.db")
+    create_purchases(engine, make_purchases(20, uid=UID))
+    return engine
+
+
+def _read(engine):
+    # Как редактор: страница из БД вместе с версиями строк
+    with engine.connect() as conn:
+        return fetch_page(conn, UID, PageQuery())
+
+
+def _edited(orig, prices=None, drop=()):
+    new = orig.drop(columns=['version']).loc[~orig['id'].isin(drop)]
+    for row_id, price in (prices or {}).items():
+        new.loc[new['id'] == row_id, 'price'] = price
+    return new
+
+
+def test_fresh_changeset_is_written_and_bumps_versions(engine):
+    orig = _read(engine)
+    changes = compute_changeset(orig, _edited(orig, {3: 333.0}, drop=[4]))
+    with engine.begin() as conn:
+        assert apply_changeset(conn, UID, changes) == []
+        rows = fetch_rows(conn, UID, [3, 4]).set_index('id')
+    assert rows.index.tolist() == [3]
+    assert float(rows.loc[3, 'price']) == 333.0
+    assert rows.loc[3, 'version'] == 2
+
+
+def test_stale_versions_are_reported_and_not_written(engine):
+    stale = _read(engine)
+    # Другая вкладка успела изменить строку 3 и удалить строку 4
+    with engine.begin() as conn:
+        assert apply_changeset(conn, UID, compute_changeset(stale, _edited(stale, {3: 30.0}, drop=[4]))) == []
+
+    changes = compute_changeset(stale, _edited(stale, {3: 31.0, 4: 41.0, 5: 51.0}, drop=[6]))
+    with engine.begin() as conn:
+        conflicts = apply_changeset(conn, UID, changes)
+        rows = fetch_rows(conn, UID, [3, 5, 6]).set_index('id')
+    assert sorted(conflicts) == [3, 4]
+    assert float(rows.loc[3, 'price']) == 30.0          # правка другой вкладки не затёрта
+    assert float(rows.loc[5, 'price']) == 51.0          # остальное записано
+    assert 6 not in rows.index
+
+
+def test_stale_delete_is_a_conflict(engine):
+    stale = _read(engine)
+    with engine.begin() as conn:
+        apply_changeset(conn, UID, compute_changeset(stale, _edited(stale, {7: 70.0})))
+    with engine.begin() as conn:
+        conflicts = apply_changeset(conn, UID, compute_changeset(stale, _edited(stale, drop=[7])))
+        remaining = conn.execute(text("SELECT count(*) FROM purchases WHERE id = 7")).scalar()
+    assert conflicts == [7]
+    assert remaining == 1
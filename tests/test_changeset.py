@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from changeset import compute_changeset, merge_changesets
+from schema import compact_price
+
+
+def _orig():
+    return pd.DataFrame({
+        'id': [1, 2, 3, 4],
+        'category': ['a', 'a', None, 'b'],
+        'subcategory': ['x', 'y', None, None],
+        'price': [10.0, 20.0, np.nan, 40.0],
+        'ts': pd.to_datetime(['2024-01-01', '2024-01-02', None, '2024-01-04']),
+        'version': [1, 3, 1, 2],
+    })
+
+
+def test_compute_changeset_splits_inserts_deletes_updates():
+    orig = _orig()
+    new = orig.drop(columns=['version']).drop(index=1)           # id 2 удалён
+    new.loc[new['id'] == 4, 'price'] = 41.0                      # id 4 изменён
+    new = pd.concat([new, pd.DataFrame({'id': [np.nan], 'category': ['c'], 'subcategory': ['z'],
+                                        'price': [5.0], 'ts': pd.to_datetime(['2024-02-01'])})],
+                    ignore_index=True)
+    changes = compute_changeset(orig, new)
+    assert changes.deletes == [2]
+    assert changes.updates['id'].tolist() == [4]
+    assert changes.updates['price'].tolist() == [41.0]
+    assert changes.inserts['category'].tolist() == ['c'] and 'id' not in changes.inserts
+    assert changes.versions == {2: 3, 4: 2}
+    assert len(changes) == 3
+
+
+def test_compute_changeset_treats_missing_values_as_equal():
+    orig = _orig()
+    # NaN/NaT/None с обеих сторон — не правка, в т.ч. после to_editor/from_editor
+    new = orig.drop(columns=['version']).assign(category=orig['category'].astype(object))
+    assert compute_changeset(orig, new).empty
+
+
+def test_kopeck_edit_of_large_price_is_detected():
+    orig = pd.DataFrame({
+        'id': [1, 2],
+        'category': ['a', 'a'],
+        'subcategory': ['b', 'b'],
+        'price': compact_price(pd.Series([99999.99, 12.34])),
+        'ts': pd.to_datetime(['2024-01-01', '2024-01-02']),
+    })
+    assert orig['price'].dtype == 'float32'
+    new = orig.assign(price=np.array([99999.98, 12.34]))  # float64, как из редактора
+    changes = compute_changeset(orig, new)
+    assert changes.updates['id'].tolist() == [1]
+
+
+def test_merge_changesets_keeps_last_update_and_first_version():
+    orig = _orig()
+    first = compute_changeset(orig, orig.assign(price=orig['price'].where(orig['id'] != 1, 11.0)))
+    reread = orig.assign(version=orig['version'].where(orig['id'] != 1, 5))
+    second = compute_changeset(reread, reread.assign(price=reread['price'].where(reread['id'] != 1, 12.0)))
+    merged = merge_changesets([first, second])
+    assert merged.updates['price'].tolist() == [12.0]
+    assert merged.versions == {1: 1}
+
+
+def test_merge_changesets_delete_wins_and_inserts_add_up():
+    orig = _orig()
+    edit = compute_changeset(orig, orig.assign(price=orig['price'].where(orig['id'] != 4, 1.0)))
+    drop = compute_changeset(orig, orig.loc[orig['id'] != 4])
+    add = compute_changeset(orig, pd.concat([orig, orig.iloc[[0]].assign(id=np.nan)], ignore_index=True))
+    merged = merge_changesets([edit, drop, add, add])
+    assert merged.deletes == [4]
+    assert merged.updates.empty
+    assert len(merged.inserts) == 2
+    assert merged.versions == {4: 2}
+
+
+def test_merge_changesets_of_nothing_is_empty():
+    merged = merge_changesets([])
+    assert merged.empty and len(merged) == 0
@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+from datecodec import format_dates, parse_dates, restore_time, unparsed_dates
+from editor_view import EDITOR_COLUMNS, from_editor, invalid_dates
+
+
+def test_unparsed_dates_flags_only_nonempty_garbage():
+    values = pd.Series(['14.06.2025', '31.02.2025', '', None, '  ', 'вчера', '14 июня 2025'])
+    assert unparsed_dates(values).tolist() == [False, True, False, False, False, True, False]
+    assert parse_dates(values).isna().tolist() == [False, True, True, True, True, True, False]
+
+
+def _editor_frame(dates):
+    return pd.DataFrame({
+        'id': [1.0, 2.0],
+        EDITOR_COLUMNS['category']: ['a', 'a'],
+        EDITOR_COLUMNS['subcategory']: ['b', 'b'],
+        EDITOR_COLUMNS['price']: [1.0, 2.0],
+        EDITOR_COLUMNS['ts']: dates,
+    })
+
+
+def test_from_editor_rejects_unparseable_date():
+    orig = pd.DataFrame({'id': [1, 2], 'ts': pd.to_datetime(['2025-06-14 10:30', '2025-06-15 00:00'])})
+    edited = _editor_frame(['14.06.2025', '31.02.2025'])
+    assert invalid_dates(edited)['id'].tolist() == [2.0]
+    with pytest.raises(ValueError, match='31.02.2025'):
+        from_editor(edited, orig, uid=1)
+
+
+def test_from_editor_keeps_empty_date_and_time_of_day():
+    orig = pd.DataFrame({'id': [1, 2], 'ts': pd.to_datetime(['2025-06-14 10:30', '2025-06-15 00:00'])})
+    new = from_editor(_editor_frame(['14.06.2025', '']), orig, uid=1)
+    assert new['ts'].iloc[0] == pd.Timestamp('2025-06-14 10:30')
+    assert pd.isna(new['ts'].iloc[1])
+
+
+def test_format_parse_round_trip_both_styles():
+    ts = pd.Series(pd.to_datetime(['2025-06-14', '2024-02-29', None, '2025-01-01'])).astype('datetime64[ns]')
+    for style in ('short', 'long'):
+        labels = format_dates(ts, style)
+        pd.testing.assert_series_equal(parse_dates(labels), ts)
+    assert format_dates(ts, 'short').tolist()[:2] == ['14.06.2025', '29.02.2024']
+    assert format_dates(ts, 'long').tolist()[0] == '14 июня 2025'
+    assert pd.isna(format_dates(ts).iloc[2])
+
+
+def test_parse_dates_accepts_iso_and_variants():
+    values = pd.Series(['2025-06-14', '2025-06-14 10:30:00', '14/06/2025', '14 июн. 2025 г.', '14 ИЮНЯ 2025'])
+    assert (parse_dates(values) == pd.Timestamp('2025-06-14')).all()
+
+
+def test_restore_time_keeps_time_of_day_for_unchanged_dates():
+    original = pd.Series(pd.to_datetime(['2025-06-14 10:30', '2025-06-15 08:00']))
+    parsed = parse_dates(pd.Series(['14.06.2025', '16.06.2025']))
+    restored = restore_time(parsed, original)
+    assert restored.tolist() == [pd.Timestamp('2025-06-14 10:30'), pd.Timestamp('2025-06-16')]
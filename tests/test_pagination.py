@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from bench.synthetic import create_purchase_monthly, create_purchases, make_purchases
+from pagination import PageQuery, count_rows, fetch_options
+
+UID = 1
+
+
+@pytest.fixture(scope='module')
+def purchases():
+    df = make_purchases(2000, uid=UID)
+    df.loc[df.index[::50], 'ts'] = pd.NaT                              # без даты — мимо итогов
+    df.loc[df.index[::70], ['category', 'subcategory']] = None         # без категории
+    other = make_purchases(300, seed=5, uid=2).assign(id=lambda d: d['id'] + len(df))
+    return pd.concat([df, other], ignore_index=True)
+
+
+@pytest.fixture(scope='module')
+def engine(purchases, tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('db')}/purchases.db")
+    create_purchases(engine, purchases)
+    create_purchase_monthly(engine)
+    return engine
+
+
+def _expected(purchases, query):
+    rows = purchases.loc[purchases['user_id'] == UID]
+    if query.categories:
+        rows = rows.loc[rows['category'].isin(query.categories)]
+    if query.subcategories:
+        rows = rows.loc[rows['subcategory'].isin(query.subcategories)]
+    if query.date_from:
+        rows = rows.loc[rows['ts'] >= pd.Timestamp(query.date_from)]
+    if query.date_to:
+        rows = rows.loc[rows['ts'] < pd.Timestamp(query.date_to + timedelta(days=1))]
+    return len(rows)
+
+
+@pytest.mark.parametrize('query', [
+    PageQuery(),
+    PageQuery(categories=('Дом', 'Транспорт')),
+    PageQuery(subcategories=('Кафе',)),
+    PageQuery(date_from=date(2021, 3, 1)),                              # с начала месяца
+    PageQuery(date_from=date(2021, 3, 17)),                             # край — часть месяца
+    PageQuery(date_to=date(2023, 8, 31)),
+    PageQuery(date_to=date(2023, 8, 5)),
+    PageQuery(date_from=date(2021, 3, 17), date_to=date(2023, 8, 5), categories=('Продукты',)),
+    PageQuery(date_from=date(2022, 2, 3), date_to=date(2022, 2, 20)),   # внутри месяца
+    PageQuery(date_from=date(2022, 2, 3), date_to=date(2022, 3, 4)),    # два неполных месяца
+    PageQuery(date_from=date(2030, 1, 1)),
+])
+def test_count_rows_matches_history(engine, purchases, query):
+    with engine.connect() as conn:
+        assert count_rows(conn, UID, query) == _expected(purchases, query)
+
+
+def test_fetch_options_lists_pairs_in_use(engine, purchases):
+    rows = purchases.loc[purchases['user_id'] == UID, ['category', 'subcategory']]
+    expected = rows.drop_duplicates().replace({None: np.nan})
+    expected = expected.sort_values(['category', 'subcategory'], na_position='last')
+    with engine.connect() as conn:
+        options = fetch_options(conn, UID)
+    assert options.values.tolist() == expected.values.tolist()
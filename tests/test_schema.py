@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+from bulk_write import _values
+from schema import compact_price
+
+
+def test_compact_price_keeps_float32_for_exact_kopecks():
+    price = compact_price(pd.Series([100, 250.5, 12.34, 99999.99, None]))
+    assert price.dtype == 'float32'
+    assert _values(price) == [100.0, 250.5, 12.34, 99999.99, None]
+
+
+def test_compact_price_widens_when_float32_loses_kopecks():
+    prices = [100, 250.5, 199999.99, 1234567.89, 12345678.91]
+    price = compact_price(pd.Series(prices))
+    assert price.dtype == 'float64'
+    assert _values(price) == prices
+
+
+def test_compact_price_accepts_lists_and_strings():
+    assert compact_price([1.5, 'abc']).dtype == 'float32'
+    assert np.isnan(compact_price(['abc'])[0])
+
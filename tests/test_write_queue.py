@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pandas as pd
+
+from changeset import compute_changeset
+from write_queue import WriteQueue
+
+ORIG = pd.DataFrame({
+    'id': [1, 2, 3],
+    'category': ['a', 'a', 'a'],
+    'subcategory': ['b', 'b', 'b'],
+    'price': [10.0, 20.0, 30.0],
+    'ts': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03']),
+    'version': [1, 1, 1],
+})
+
+
+def _edit(row_id, price):
+    return compute_changeset(ORIG, ORIG.assign(price=ORIG['price'].where(ORIG['id'] != row_id, price)))
+
+
+def _run(*changesets):
+    """Первая задача держит запись, пока остальные встают в очередь."""
+    started, release, written = threading.Event(), threading.Event(), []
+
+    def write(changes):
+        started.set()
+        release.wait(5)
+        written.append(changes)
+        return changes
+
+    queue = WriteQueue(workers=1)
+    jobs = [queue.submit(7, changesets[0], write)]
+    started.wait(5)
+    jobs += [queue.submit(7, c, write) for c in changesets[1:]]
+    release.set()
+    deadline = time.monotonic() + 5
+    while not all(job.finished for job in jobs) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return jobs, written
+
+
+def test_pending_saves_of_different_rows_are_merged():
+    jobs, written = _run(_edit(1, 11.0), _edit(2, 21.0), _edit(3, 31.0))
+    assert jobs[1] is jobs[2] and jobs[1].merged == 2
+    assert [sorted(w.updates['id']) for w in written] == [[1], [2, 3]]
+
+
+def test_pending_saves_of_the_same_row_are_not_merged():
+    # Две вкладки правят строку 2: вторая правка не должна молча затереть первую
+    jobs, written = _run(_edit(1, 11.0), _edit(2, 21.0), _edit(2, 22.0))
+    assert jobs[1] is not jobs[2]
+    assert [w.updates['price'].tolist() for w in written] == [[11.0], [21.0], [22.0]]
+    assert written[2].versions == {2: 1}
@@ -0,0 +1,101 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from changeset import merge_changesets, touched_ids
+
+logger = logging.getLogger(__name__)
+
+STATUS_LABELS = {
+    'queued': 'в очереди',
+    'running': 'выполняется',
+    'done': 'готово',
+    'failed': 'ошибка',
+}
+
+
+class SaveJob:
+    """Сохранение одного пользователя; общее для всех вкладок, чьи правки в него слиты."""
+
+    def __init__(self, uid, changes, write):
+        self.uid = uid
+        self.changes = changes
+        self.write = write           # write(changes) — одна транзакция
+        self.status = 'queued'
+        self.error = None
+        self.result = None           # что вернул write (отчёт о конфликтах)
+        self.merged = 1              # сколько сохранений слито в задачу
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+
+class WriteQueue:
+    """Фоновый пул записи: по одной задаче на uid за раз, ожидающие сливаются.
+
+    Пока задача пользователя ждёт запуска, новое сохранение того же uid
+    объединяется с последней ожидающей через merge_changesets, если они не
+    трогают общих строк. Общие id (одну строку правили в двух вкладках) не
+    сливаются: слияние оставило бы правку последней вкладки и молча затёрло
+    первую. Такое сохранение встаёт в очередь отдельной задачей и после
+    записи первой получает свою строку как конфликт версии.
+    """
+
+    def __init__(self, workers):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='save')
+        self._lock = threading.Lock()
+        self._pending = {}   # uid -> deque[SaveJob], ещё не начаты
+        self._active = {}    # uid -> SaveJob, выполняется
+
+    def submit(self, uid, changes, write):
+        with self._lock:
+            jobs = self._pending.setdefault(uid, deque())
+            if jobs and not touched_ids(jobs[-1].changes) & touched_ids(changes):
+                job = jobs[-1]
+                job.changes = merge_changesets([job.changes, changes])
+                job.merged += 1
+                return job
+            job = SaveJob(uid, changes, write)
+            jobs.append(job)
+            if len(jobs) == 1 and uid not in self._active:
+                self._executor.submit(self._drain, uid)
+            return job
+
+    def _drain(self, uid):
+        with self._lock:
+            jobs = self._pending[uid]
+            job = self._active[uid] = jobs.popleft()
+            if not jobs:
+                del self._pending[uid]
+        job.status = 'running'
+        try:
+            job.result = job.write(job.changes)
+            job.status = 'done'
+        except Exception as exc:
+            logger.exception("Сохранение uid=%s не удалось", uid)
+            job.error = f"{type(exc).__name__}: {exc}"
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                del self._active[uid]
+                if uid in self._pending:
+                    self._executor.submit(self._drain, uid)
+
+    def stats(self):
+        with self._lock:
+            return {"pending": sum(map(len, self._pending.values())), "active": len(self._active)}
+
+
+@st.cache_resource
+def get_write_queue():
+    # Один пул на процесс; SAVE_WORKERS — число параллельных транзакций записи
+    return WriteQueue(workers=int(os.getenv("SAVE_WORKERS", "4")))